@@ -1,6 +1,6 @@
 from datetime import timedelta, datetime
 from zoneinfo import ZoneInfo
-from flask import Flask, render_template, request, redirect, url_for, make_response, jsonify, Response
+from flask import Flask, render_template, request, redirect, url_for, make_response, jsonify, Response, stream_with_context, g, has_request_context
 import firebase_admin
 from firebase_admin import credentials, auth, firestore
 from flask_cors import CORS
@@ -12,14 +12,32 @@ from email.mime.multipart import MIMEMultipart
 # from twilio.rest import Client
 import os
 import uuid
+import hashlib
+import hmac
+import base64
+import zlib
 from dotenv import load_dotenv
 import random
 import threading
+import collections
+import socket
+import atexit
+import heapq
+import itertools
+import bisect
+import array
+import mmap
+import struct
+import sys
+import concurrent.futures
 import schedule
 import time
 import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import csv
+import click
 import re
 import google.generativeai as genai
 import logging
@@ -49,6 +67,31 @@ def require_user_auth(f):
     """Decorator for user authentication (simplified version)"""
     return f
 
+# ===== SHARED HTTP SESSION =====
+# All outbound HTTP (weather, geocoding, places/events APIs, scraping, web push)
+# goes through one pooled requests.Session, so connections to the same host are
+# kept alive and reused across requests and threads. Idempotent requests are
+# retried on connection errors and 429/5xx with exponential backoff (honoring
+# Retry-After); POSTs are never retried.
+HTTP_POOL_SIZE = 20
+HTTP_RETRY = Retry(
+    total=2,
+    backoff_factor=0.3,
+    status_forcelist=(429, 500, 502, 503, 504),
+    allowed_methods=frozenset(['GET', 'HEAD']),
+    raise_on_status=False
+)
+
+def build_http_session():
+    """Create the shared pooled, retrying session for outbound HTTP calls"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE, max_retries=HTTP_RETRY)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+http_session = build_http_session()
+
 # ===== CACHING SYSTEM FOR API OPTIMIZATION =====
 # In-memory cache for Places API results (prevents expensive repeated calls)
 places_cache = {}
@@ -264,6 +307,22 @@ SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
 SMTP_USERNAME = os.getenv('SMTP_USERNAME')
 SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
 
+# Notification Delivery Configuration
+# Deliveries are dispatched through a bounded pool so one slow SMTP server or push
+# endpoint can't stall every other user's reminder inside the 5-minute cron window
+NOTIFICATION_WORKERS = int(os.getenv('NOTIFICATION_WORKERS', 8))  # Max concurrent deliveries overall
+NOTIFICATION_CHANNEL_LIMITS = {
+    'email': int(os.getenv('NOTIFICATION_EMAIL_WORKERS', 4)),
+    'push': int(os.getenv('NOTIFICATION_PUSH_WORKERS', 8))
+}
+NOTIFICATION_DELIVERY_TIMEOUT = float(os.getenv('NOTIFICATION_DELIVERY_TIMEOUT', 15))  # Seconds per email/push
+NOTIFICATION_RUN_TIMEOUT = float(os.getenv('NOTIFICATION_RUN_TIMEOUT', 240))  # Seconds per cron run
+
+# SMTP Connection Pool Configuration
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', NOTIFICATION_CHANNEL_LIMITS['email']))  # Max open SMTP sessions
+SMTP_IDLE_TIMEOUT = float(os.getenv('SMTP_IDLE_TIMEOUT', 60))  # Seconds before an idle session is discarded
+SMTP_BATCH_SIZE = int(os.getenv('SMTP_BATCH_SIZE', 25))  # Max emails sent per session checkout
+
 # Web Push Notifications Configuration (VAPID)
 VAPID_PUBLIC_KEY = os.getenv('VAPID_PUBLIC_KEY')
 VAPID_PRIVATE_KEY = os.getenv('VAPID_PRIVATE_KEY')
@@ -308,6 +367,80 @@ else:
 SESSION_COOKIE_NAME = "fb_session"
 SESSION_MAX_AGE = timedelta(days=5)
 
+# ===== VERIFIED SESSION CACHE =====
+# auth.verify_session_cookie(check_revoked=True) makes a network call to Firebase
+# Auth on every request. Verified cookies are cached per worker in a bounded LRU
+# keyed by a hash of the cookie (the cookie itself is never stored). An entry lives
+# until the cookie's exp or SESSION_CACHE_TTL, whichever comes first, and its
+# revocation status is rechecked at most every SESSION_REVOCATION_CHECK_INTERVAL.
+SESSION_CACHE_TTL = int(os.getenv('SESSION_CACHE_TTL', '900'))  # seconds
+SESSION_REVOCATION_CHECK_INTERVAL = int(os.getenv('SESSION_REVOCATION_CHECK_INTERVAL', '60'))  # seconds
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv('SESSION_CACHE_MAX_ENTRIES', '10000'))
+
+verified_sessions = collections.OrderedDict()  # cookie hash -> {'claims', 'expires_at', 'checked_at'}
+verified_sessions_lock = threading.Lock()
+
+def session_cache_key(session_cookie):
+    """Hash a session cookie for use as a cache key"""
+    return hashlib.sha256(session_cookie.encode('utf-8')).hexdigest()
+
+def verify_session(session_cookie):
+    """
+    Verify a session cookie, using the verified-session cache when possible.
+
+    Drop-in replacement for auth.verify_session_cookie(session_cookie, check_revoked=True).
+
+    Args:
+        session_cookie (str): The session cookie from the request
+
+    Returns:
+        dict: Decoded session claims
+
+    Raises:
+        The firebase_admin auth errors raised by verify_session_cookie
+    """
+    cache_key = session_cache_key(session_cookie)
+    now = time.time()
+
+    with verified_sessions_lock:
+        entry = verified_sessions.get(cache_key)
+        if entry is not None:
+            if now >= entry['expires_at']:
+                del verified_sessions[cache_key]
+                entry = None
+            else:
+                verified_sessions.move_to_end(cache_key)
+    
+    if entry is not None and now - entry['checked_at'] < SESSION_REVOCATION_CHECK_INTERVAL:
+        return entry['claims']
+
+    try:
+        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+    except Exception:
+        invalidate_session(session_cookie)
+        raise
+
+    expires_at = now + SESSION_CACHE_TTL
+    if decoded_claims.get('exp'):
+        expires_at = min(expires_at, decoded_claims['exp'])
+
+    with verified_sessions_lock:
+        verified_sessions[cache_key] = {
+            'claims': decoded_claims,
+            'expires_at': expires_at,
+            'checked_at': now
+        }
+        verified_sessions.move_to_end(cache_key)
+        while len(verified_sessions) > SESSION_CACHE_MAX_ENTRIES:
+            verified_sessions.popitem(last=False)
+
+    return decoded_claims
+
+def invalidate_session(session_cookie):
+    """Drop a session cookie from the verified-session cache (e.g. on logout)"""
+    with verified_sessions_lock:
+        verified_sessions.pop(session_cache_key(session_cookie), None)
+
 # Inspirational messages
 INSPIRATIONAL_MESSAGES = [
     "🌟 You're doing amazing! Keep up the great work!",
@@ -322,18 +455,214 @@ INSPIRATIONAL_MESSAGES = [
     "⭐ You're a task-conquering superstar!"
 ]
 
-def send_email(recipient_email, subject, body):
+def build_email_message(recipient_email, subject, body):
+    """
+    Build the styled HTML email used for all notifications.
+
+    Args:
+        recipient_email (str): Email address of recipient
+        subject (str): Email subject line
+        body (str): Email content (will be wrapped in the HTML template)
+
+    Returns:
+        MIMEMultipart: Message ready to send
+    """
+    msg = MIMEMultipart('alternative')
+    msg['From'] = SMTP_USERNAME  # Use the configured email
+    msg['To'] = recipient_email
+    msg['Subject'] = subject
+    
+    # Create HTML version
+    html_body = f"""
+    <html>
+      <head>
+        <style>
+          body {{ font-family: 'Segoe UI', Arial, sans-serif; background-color: #f5f5f5; margin: 0; padding: 20px; }}
+          .container {{ max-width: 600px; margin: 0 auto; background: white; border-radius: 15px; overflow: hidden; box-shadow: 0 10px 30px rgba(0,0,0,0.1); }}
+          .header {{ background: linear-gradient(135deg, #1abc9c, #16a085); color: white; padding: 30px; text-align: center; }}
+          .header h2 {{ margin: 0; font-size: 24px; }}
+          .content {{ padding: 30px; }}
+          .task {{ background: #f8f9fa; padding: 20px; margin: 15px 0; border-radius: 10px; border-left: 4px solid #1abc9c; }}
+          .task strong {{ color: #2c3e50; }}
+          .inspiration {{ background: linear-gradient(135deg, #e8f5e8, #d5f4e6); padding: 25px; margin: 20px 0; border-radius: 12px; text-align: center; border: 2px solid #1abc9c20; }}
+          .footer {{ text-align: center; padding: 20px; color: #666; font-size: 14px; }}
+          .btn {{ display: inline-block; padding: 12px 24px; background: #1abc9c; color: white; text-decoration: none; border-radius: 8px; margin: 10px; }}
+        </style>
+      </head>
+      <body>
+        <div class="container">
+          {body}
+          <div class="footer">
+            <p>This message was sent from your Daily Planner app</p>
+            <p>Stay productive and keep achieving your goals!</p>
+          </div>
+        </div>
+      </body>
+    </html>
+    """
+    
+    part = MIMEText(html_body, 'html')
+    msg.attach(part)
+    return msg
+
+# ===== SMTP CONNECTION POOL =====
+# Authenticated SMTP sessions are reused across messages instead of doing a TCP
+# connect, STARTTLS handshake and LOGIN for every email. Idle sessions are closed
+# after SMTP_IDLE_TIMEOUT since providers drop them server-side anyway.
+smtp_idle_connections = []  # (server, last_used) pairs, most recently used last
+smtp_pool_lock = threading.Lock()
+smtp_pool_slots = threading.BoundedSemaphore(SMTP_POOL_SIZE)
+
+def open_smtp_connection(timeout=None):
+    """Open a new authenticated SMTP session (connect, STARTTLS, LOGIN)"""
+    server = smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=timeout or NOTIFICATION_DELIVERY_TIMEOUT)
+    try:
+        server.starttls()
+        server.login(SMTP_USERNAME, SMTP_PASSWORD)
+    except Exception:
+        close_smtp_connection(server)
+        raise
+    return server
+
+def close_smtp_connection(server):
+    """Close an SMTP session, ignoring errors from already-dropped connections"""
+    try:
+        server.quit()
+    except Exception:
+        try:
+            server.close()
+        except Exception:
+            pass
+
+def acquire_smtp_connection(timeout=None):
+    """Take the most recently used idle session from the pool, or open a new one"""
+    now = time.monotonic()
+    expired = []
+    server = None
+
+    with smtp_pool_lock:
+        while smtp_idle_connections:
+            candidate, last_used = smtp_idle_connections.pop()
+            if now - last_used > SMTP_IDLE_TIMEOUT:
+                expired.append(candidate)
+            else:
+                server = candidate
+                break
+
+    for candidate in expired:
+        close_smtp_connection(candidate)
+
+    if server is None:
+        return open_smtp_connection(timeout)
+
+    if timeout and server.sock:
+        server.sock.settimeout(timeout)
+    return server
+
+def release_smtp_connection(server):
+    """Return a healthy session to the pool (closing it if the pool is already full)"""
+    with smtp_pool_lock:
+        if len(smtp_idle_connections) < SMTP_POOL_SIZE:
+            smtp_idle_connections.append((server, time.monotonic()))
+            return
+    close_smtp_connection(server)
+
+def send_email_batch(messages, timeout=None, latencies=None):
+    """
+    Send many HTML emails over a single pooled SMTP session.
+
+    A session dropped mid-send is reconnected and the message retried once.
+    If connecting (including STARTTLS/LOGIN) fails or the retry drops again,
+    the remaining messages are failed immediately instead of each paying a
+    connect timeout or repeating a rejected login.
+
+    Args:
+        messages (list): (recipient_email, subject, body) tuples
+        timeout (float): Socket timeout in seconds (defaults to NOTIFICATION_DELIVERY_TIMEOUT)
+        latencies (list): Optional list that receives the seconds each message took
+
+    Returns:
+        list: One bool per message, True if it was accepted by the SMTP server
+    """
+    if not SMTP_USERNAME or not SMTP_PASSWORD:
+        print("❌ Email credentials not configured")
+        return [False] * len(messages)
+
+    results = []
+    server = None
+    connection_failed = False
+
+    with smtp_pool_slots:
+        try:
+            for recipient_email, subject, body in messages:
+                started = time.monotonic()
+                sent = False
+
+                if not connection_failed:
+                    for attempt in range(2):
+                        if server is None:
+                            try:
+                                server = acquire_smtp_connection(timeout)
+                            except (smtplib.SMTPException, OSError) as e:
+                                # Connect, STARTTLS or LOGIN failed - the rest of the batch would too
+                                print(f"Email connection error: {e}")
+                                connection_failed = True
+                                break
+                        try:
+                            server.send_message(build_email_message(recipient_email, subject, body))
+                            sent = True
+                            print(f"Email sent successfully to {recipient_email}")
+                            break
+                        except smtplib.SMTPServerDisconnected as e:
+                            # Session dropped - reconnect and retry once
+                            close_smtp_connection(server)
+                            server = None
+                            if attempt:
+                                print(f"Email error: {e}")
+                                connection_failed = True
+                        except smtplib.SMTPException as e:
+                            # Message rejected (recipient, content) - session may still be usable.
+                            # Must come before OSError, which SMTPException subclasses.
+                            print(f"Email error: {e}")
+                            try:
+                                server.rset()
+                            except Exception:
+                                close_smtp_connection(server)
+                                server = None
+                            break
+                        except OSError as e:
+                            # Socket error - treat like a dropped session
+                            close_smtp_connection(server)
+                            server = None
+                            if attempt:
+                                print(f"Email error: {e}")
+                                connection_failed = True
+                        except Exception as e:
+                            print(f"Email error: {e}")
+                            break
+
+                results.append(sent)
+                if latencies is not None:
+                    latencies.append(time.monotonic() - started)
+        finally:
+            if server is not None:
+                release_smtp_connection(server)
+
+    return results
+
+def send_email(recipient_email, subject, body, timeout=None):
     """
     Send HTML email notification with professional styling.
     
     This function sends beautifully formatted emails for task reminders,
-    daily summaries, and other notifications. Includes fallback to plain text
-    and comprehensive error handling.
+    daily summaries, and other notifications over a pooled SMTP session.
+    Includes comprehensive error handling.
     
     Args:
         recipient_email (str): Email address of recipient
         subject (str): Email subject line
         body (str): Email content (plain text, will be HTML formatted)
+        timeout (float): Socket timeout in seconds (defaults to NOTIFICATION_DELIVERY_TIMEOUT)
         
     Returns:
         bool: True if email sent successfully, False otherwise
@@ -341,76 +670,106 @@ def send_email(recipient_email, subject, body):
     Raises:
         None: All exceptions are caught and logged for graceful degradation
     """
-    if not SMTP_USERNAME or not SMTP_PASSWORD:
-        print("❌ Email credentials not configured")
-        return False
-        
-    try:
-        msg = MIMEMultipart('alternative')
-        msg['From'] = SMTP_USERNAME  # Use the configured email
-        msg['To'] = recipient_email
-        msg['Subject'] = subject
-        
-        # Create HTML version
-        html_body = f"""
-        <html>
-          <head>
-            <style>
-              body {{ font-family: 'Segoe UI', Arial, sans-serif; background-color: #f5f5f5; margin: 0; padding: 20px; }}
-              .container {{ max-width: 600px; margin: 0 auto; background: white; border-radius: 15px; overflow: hidden; box-shadow: 0 10px 30px rgba(0,0,0,0.1); }}
-              .header {{ background: linear-gradient(135deg, #1abc9c, #16a085); color: white; padding: 30px; text-align: center; }}
-              .header h2 {{ margin: 0; font-size: 24px; }}
-              .content {{ padding: 30px; }}
-              .task {{ background: #f8f9fa; padding: 20px; margin: 15px 0; border-radius: 10px; border-left: 4px solid #1abc9c; }}
-              .task strong {{ color: #2c3e50; }}
-              .inspiration {{ background: linear-gradient(135deg, #e8f5e8, #d5f4e6); padding: 25px; margin: 20px 0; border-radius: 12px; text-align: center; border: 2px solid #1abc9c20; }}
-              .footer {{ text-align: center; padding: 20px; color: #666; font-size: 14px; }}
-              .btn {{ display: inline-block; padding: 12px 24px; background: #1abc9c; color: white; text-decoration: none; border-radius: 8px; margin: 10px; }}
-            </style>
-          </head>
-          <body>
-            <div class="container">
-              {body}
-              <div class="footer">
-                <p>This message was sent from your Daily Planner app</p>
-                <p>Stay productive and keep achieving your goals!</p>
-              </div>
-            </div>
-          </body>
-        </html>
-        """
-        
-        part = MIMEText(html_body, 'html')
-        msg.attach(part)
-        
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.send_message(msg)
-        
-        print(f"Email sent successfully to {recipient_email}")
-        return True
-    except Exception as e:
-        print(f"Email error: {e}")
-        return False
+    return send_email_batch([(recipient_email, subject, body)], timeout=timeout)[0]
 
 # SMS functionality removed - Twilio requires business verification
 # Replaced with push notifications which are free and don't require verification
 
-def send_push_notification(user_id, title, message):
+# ===== PUSH SUBSCRIPTION CACHE =====
+# Users can subscribe several browsers/devices. Subscriptions are stored in the
+# push_subscriptions map on the user document keyed by a hash of the endpoint
+# (the legacy single push_subscription field is still read). Notification jobs pass
+# the subscriptions from the user document they already loaded; other callers hit a
+# short TTL cache that the /api/push-subscription handlers invalidate.
+PUSH_SUBSCRIPTION_CACHE_TTL = 300  # seconds
+push_subscription_cache = {}  # user_id -> (subscriptions, cached_at)
+push_subscription_cache_lock = threading.Lock()
+
+def push_subscription_id(endpoint):
+    """Stable Firestore-safe key for a push subscription endpoint"""
+    return hashlib.sha256(endpoint.encode('utf-8')).hexdigest()[:32]
+
+def extract_push_subscriptions(user_data):
+    """Get all of a user's push subscriptions from their user document, deduplicated by endpoint"""
+    user_data = user_data or {}
+    subscriptions = list((user_data.get('push_subscriptions') or {}).values())
+    legacy_subscription = user_data.get('push_subscription')
+    if legacy_subscription:
+        subscriptions.append(legacy_subscription)
+
+    unique = {}
+    for subscription in subscriptions:
+        if isinstance(subscription, dict) and subscription.get('endpoint'):
+            unique.setdefault(subscription['endpoint'], subscription)
+    return list(unique.values())
+
+def get_push_subscriptions(user_id, user_data=None):
+    """
+    Get a user's push subscriptions, avoiding a Firestore read when possible.
+
+    Args:
+        user_id (str): The user's unique ID
+        user_data (dict): The user's document if the caller already loaded it
+
+    Returns:
+        list: Push subscription dicts (empty if the user has none)
+    """
+    if user_data is not None:
+        subscriptions = extract_push_subscriptions(user_data)
+        with push_subscription_cache_lock:
+            push_subscription_cache[user_id] = (subscriptions, time.monotonic())
+        return subscriptions
+
+    with push_subscription_cache_lock:
+        cached = push_subscription_cache.get(user_id)
+    if cached and time.monotonic() - cached[1] < PUSH_SUBSCRIPTION_CACHE_TTL:
+        return cached[0]
+
+    if not db:
+        return []
+
+    user_doc = db.collection('users').document(user_id).get()
+    if not user_doc.exists:
+        print(f"⚠️ User {user_id} not found")
+        return []
+    return get_push_subscriptions(user_id, user_doc.to_dict() or {})
+
+def invalidate_push_subscription_cache(user_id):
+    """Drop a user's cached push subscriptions after they change"""
+    with push_subscription_cache_lock:
+        push_subscription_cache.pop(user_id, None)
+
+def remove_push_subscription(user_id, endpoint):
+    """Remove one push subscription (e.g. after the push service returns 410 Gone)"""
+    user_ref = db.collection('users').document(user_id)
+    user_ref.update({
+        f"push_subscriptions.{push_subscription_id(endpoint)}": firestore.DELETE_FIELD
+    })
+    forget_request_docs(user_ref)
+    legacy_subscription = (load_user_data(user_id).get('push_subscription') or {})
+    if legacy_subscription.get('endpoint') == endpoint:
+        user_ref.update({
+            'push_subscription': firestore.DELETE_FIELD
+        })
+    invalidate_push_subscription_cache(user_id)
+
+def send_push_notification(user_id, title, message, timeout=None, subscriptions=None):
     """
     Send push notification to user's browser using Web Push Protocol.
     
     Uses Web Push API to send notifications that appear even when the app is closed.
     Requires user to have granted notification permission in their browser.
+    The notification is sent to every device the user has subscribed.
     
     Args:
         user_id (str): The user's unique ID
         title (str): Notification title
         message (str): Notification message body
+        timeout (float): Request timeout in seconds (defaults to NOTIFICATION_DELIVERY_TIMEOUT)
+        subscriptions (list): Preloaded push subscriptions; looked up (cached) when None
     
     Returns:
-        bool: True if notification was sent successfully, False otherwise
+        bool: True if notification was sent to at least one device, False otherwise
     """
     try:
         # Check if VAPID keys are configured
@@ -430,22 +789,14 @@ def send_push_notification(user_id, title, message):
             print("⚠️ pywebpush not installed. Run: pip install pywebpush")
             return False
         
-        # Get user's push subscription from Firestore
-        user_ref = db.collection('users').document(user_id)
-        user_doc = user_ref.get()
-        
-        if not user_doc.exists:
-            print(f"⚠️ User {user_id} not found")
-            return False
-            
-        user_data = user_doc.to_dict()
+        # Get user's push subscriptions (preloaded by the caller or from the cache)
+        if subscriptions is None:
+            subscriptions = get_push_subscriptions(user_id)
         
-        if not user_data or 'push_subscription' not in user_data:
+        if not subscriptions:
             print(f"⚠️ No push subscription found for user {user_id}")
             return False
         
-        push_subscription = user_data['push_subscription']
-        
         # Prepare notification payload
         notification_data = {
             "title": title,
@@ -460,32 +811,34 @@ def send_push_notification(user_id, title, message):
             }
         }
         
-        # Send the push notification
-        try:
-            response = webpush(
-                subscription_info=push_subscription,
-                data=json.dumps(notification_data),
-                vapid_private_key=VAPID_PRIVATE_KEY,
-                vapid_claims={
-                    "sub": VAPID_EMAIL
-                }
-            )
-            
-            print(f"🔔 Push notification sent to user {user_id}: {title}")
-            print(f"   Response: {response.status_code}")
-            return True
-            
-        except WebPushException as e:
-            print(f"❌ WebPush error for user {user_id}: {e}")
-            
-            # If subscription is invalid (410 Gone), remove it from database
-            if e.response and e.response.status_code == 410:
-                print(f"   Removing invalid subscription for user {user_id}")
-                user_ref.update({
-                    'push_subscription': firestore.DELETE_FIELD
-                })
-            
-            return False
+        # Send the push notification to each subscribed device
+        sent_any = False
+        for push_subscription in subscriptions:
+            try:
+                response = webpush(
+                    subscription_info=push_subscription,
+                    data=json.dumps(notification_data),
+                    vapid_private_key=VAPID_PRIVATE_KEY,
+                    vapid_claims={
+                        "sub": VAPID_EMAIL
+                    },
+                    timeout=timeout or NOTIFICATION_DELIVERY_TIMEOUT,
+                    requests_session=http_session
+                )
+                
+                print(f"🔔 Push notification sent to user {user_id}: {title}")
+                print(f"   Response: {response.status_code}")
+                sent_any = True
+                
+            except WebPushException as e:
+                print(f"❌ WebPush error for user {user_id}: {e}")
+                
+                # If subscription is invalid (410 Gone), remove it from database
+                if e.response is not None and e.response.status_code == 410:
+                    print(f"   Removing invalid subscription for user {user_id}")
+                    remove_push_subscription(user_id, push_subscription.get('endpoint', ''))
+        
+        return sent_any
         
     except Exception as e:
         print(f"❌ Push notification error: {e}")
@@ -538,8 +891,186 @@ if False:  # Legacy SMS code preserved for reference
     """
     pass  # SMS functionality disabled - see function docstring above
 
-# Global variable to track sent notifications (prevents duplicates)
-sent_notifications = {}
+# ===== NOTIFICATION DELIVERY STAGE =====
+# Notification jobs first collect everything that is due, then hand the deliveries to
+# dispatch_notifications(). Each channel gets its own bounded pool and all channels
+# share a global concurrency limit, so slow SMTP servers don't starve push delivery.
+notification_executors = {}
+notification_executors_lock = threading.Lock()
+notification_slots = threading.BoundedSemaphore(NOTIFICATION_WORKERS)
+notification_delivery_stats = {}  # Latest run statistics per job, reported by the cron endpoints
+
+def get_notification_executor(channel):
+    """Get (or lazily create) the bounded thread pool for a delivery channel"""
+    with notification_executors_lock:
+        executor = notification_executors.get(channel)
+        if executor is None:
+            workers = max(1, min(NOTIFICATION_CHANNEL_LIMITS.get(channel, 1), NOTIFICATION_WORKERS))
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"notify-{channel}")
+            notification_executors[channel] = executor
+        return executor
+
+def deliver_notifications(channel, deliveries):
+    """
+    Send a unit of collected notifications through one channel.
+
+    Emails in a unit share one pooled SMTP session; push units hold a single delivery.
+
+    Args:
+        channel (str): 'email' or 'push'
+        deliveries (list): Delivery dicts {'channel', 'user_id', 'recipient', 'title', 'body', 'key'}
+
+    Returns:
+        list: (sent successfully, latency in seconds) per delivery
+    """
+    with notification_slots:
+        if channel == 'email':
+            latencies = []
+            sent = send_email_batch(
+                [(delivery['recipient'], delivery['title'], delivery['body']) for delivery in deliveries],
+                timeout=NOTIFICATION_DELIVERY_TIMEOUT,
+                latencies=latencies
+            )
+            return list(zip(sent, latencies))
+
+        results = []
+        for delivery in deliveries:
+            started = time.monotonic()
+            try:
+                if channel == 'push':
+                    sent = send_push_notification(delivery['user_id'], delivery['title'], delivery['body'], timeout=NOTIFICATION_DELIVERY_TIMEOUT, subscriptions=delivery.get('subscriptions'))
+                else:
+                    print(f"⚠️ Unknown notification channel: {channel}")
+                    sent = False
+            except Exception as e:
+                print(f"❌ {channel} delivery error for {delivery.get('key')}: {e}")
+                sent = False
+            results.append((sent, time.monotonic() - started))
+        return results
+
+def split_delivery_units(deliveries):
+    """
+    Group deliveries into units of work for the channel pools.
+
+    Emails are chunked so each email worker gets a share of the batch over its own
+    SMTP session (at most SMTP_BATCH_SIZE per chunk); every push is its own unit.
+
+    Returns:
+        list: (channel, [delivery indexes]) tuples
+    """
+    indexes_by_channel = {}
+    for index, delivery in enumerate(deliveries):
+        indexes_by_channel.setdefault(delivery['channel'], []).append(index)
+
+    units = []
+    for channel, indexes in indexes_by_channel.items():
+        if channel == 'email':
+            workers = max(1, min(NOTIFICATION_CHANNEL_LIMITS.get('email', 1), NOTIFICATION_WORKERS))
+            chunk_size = max(1, min(SMTP_BATCH_SIZE, -(-len(indexes) // workers)))
+        else:
+            chunk_size = 1
+        for start in range(0, len(indexes), chunk_size):
+            units.append((channel, indexes[start:start + chunk_size]))
+    return units
+
+def latency_percentile(latencies, percentile):
+    """Nearest-rank percentile of a list of latencies, in milliseconds"""
+    if not latencies:
+        return 0
+    ordered = sorted(latencies)
+    rank = max(0, -(-percentile * len(ordered) // 100) - 1)  # ceil(p/100 * n) - 1
+    return round(ordered[rank] * 1000, 1)
+
+def record_late_deliveries(future, unit_deliveries, run_name, on_late_delivery):
+    """Done-callback for a unit that was still running when its run timed out"""
+    try:
+        delivered_keys = get_delivered_keys(unit_deliveries, [sent for sent, _ in future.result()])
+        if delivered_keys:
+            on_late_delivery(delivered_keys)
+            print(f"📨 {run_name}: recorded {len(delivered_keys)} late deliveries")
+    except Exception as e:
+        print(f"❌ {run_name}: failed to record late deliveries: {e}")
+
+def dispatch_notifications(deliveries, run_name, on_late_delivery=None, timeout=None):
+    """
+    Deliver collected notifications concurrently through the bounded channel pools.
+
+    Each email/push call has a socket timeout of NOTIFICATION_DELIVERY_TIMEOUT and the
+    whole run is capped at NOTIFICATION_RUN_TIMEOUT. When the run times out, units that
+    haven't started are cancelled and reported as failed so the next cron run retries
+    them. Units already sending can't be cancelled; they are reported as failed too but
+    keep running, and on_late_delivery receives the keys they deliver once they finish
+    so callers can still record them as sent.
+
+    Args:
+        deliveries (list): Delivery dicts (see deliver_notifications)
+        run_name (str): Name used for logging and notification_delivery_stats
+        on_late_delivery (callable): Called with the set of delivered keys of each unit
+            that finishes after the run timed out (from a pool thread); must be idempotent
+        timeout (float): Seconds before the run times out (defaults to NOTIFICATION_RUN_TIMEOUT)
+
+    Returns:
+        tuple: (list of bools aligned with deliveries, run statistics dict)
+    """
+    started = time.monotonic()
+    results = [False] * len(deliveries)
+    latencies = []
+    timed_out = 0
+    still_running = 0
+
+    futures = {
+        get_notification_executor(channel).submit(deliver_notifications, channel, [deliveries[index] for index in indexes]): indexes
+        for channel, indexes in split_delivery_units(deliveries)
+    }
+
+    if futures:
+        done, not_done = concurrent.futures.wait(futures, timeout=NOTIFICATION_RUN_TIMEOUT if timeout is None else timeout)
+        for future in done:
+            for index, (sent, latency) in zip(futures[future], future.result()):
+                results[index] = sent
+                latencies.append(latency)
+        for future in not_done:
+            if future.cancel():
+                timed_out += len(futures[future])
+                continue
+            still_running += len(futures[future])
+            if on_late_delivery:
+                unit_deliveries = [deliveries[index] for index in futures[future]]
+                future.add_done_callback(
+                    lambda future, unit_deliveries=unit_deliveries: record_late_deliveries(future, unit_deliveries, run_name, on_late_delivery))
+
+    elapsed = time.monotonic() - started
+    delivered = sum(1 for sent in results if sent)
+    stats = {
+        'deliveries': len(deliveries),
+        'delivered': delivered,
+        'failed': len(deliveries) - delivered - timed_out - still_running,
+        'timed_out': timed_out,
+        'still_running': still_running,
+        'by_channel': {
+            channel: sum(1 for delivery in deliveries if delivery['channel'] == channel)
+            for channel in sorted({delivery['channel'] for delivery in deliveries})
+        },
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_per_second': round(len(latencies) / elapsed, 2) if elapsed > 0 else 0,
+        'latency_p50_ms': latency_percentile(latencies, 50),
+        'latency_p95_ms': latency_percentile(latencies, 95),
+        'latency_p99_ms': latency_percentile(latencies, 99),
+        'latency_max_ms': round(max(latencies) * 1000, 1) if latencies else 0,
+        'finished_at': datetime.now().isoformat()
+    }
+    notification_delivery_stats[run_name] = stats
+
+    if deliveries:
+        print(f"📨 {run_name}: delivered {delivered}/{len(deliveries)} in {stats['elapsed_seconds']}s "
+              f"({stats['throughput_per_second']}/s, p50 {stats['latency_p50_ms']}ms, p95 {stats['latency_p95_ms']}ms, "
+              f"p99 {stats['latency_p99_ms']}ms, timed out {timed_out}, still running {still_running})")
+
+    return results, stats
+
+def get_delivered_keys(deliveries, results):
+    """Keys of notifications that reached the user through at least one channel"""
+    return {delivery['key'] for delivery, sent in zip(deliveries, results) if sent}
 
 def format_time_12hour(time_str):
     """
@@ -599,134 +1130,232 @@ def get_user_current_time(user_timezone=None):
         print(f"⚠️ Invalid timezone '{user_timezone}', falling back to UTC: {e}")
         return datetime.now(ZoneInfo('UTC'))
 
-def cleanup_sent_notifications():
+# ===== NOTIFICATION DEDUPE TRACKING =====
+# Sent notification keys are kept in memory in hourly buckets so expiring old entries
+# drops whole buckets instead of scanning every key, and the total is capped.
+# Firestore (notification_tracking) persists them across serverless invocations:
+# a run prefetches all of its candidate keys with one get_all and records its sends
+# with batched writes at the end.
+#
+# Expiry never runs on the notification path. Bucket start times sit in a min-heap
+# so expired buckets are popped in O(log n) as new keys are recorded. Tracking and
+# reminder_index docs carry an expires_at field, which a Firestore TTL policy can
+# delete on its own. sweep_expired_notification_tracking deletes them in batches
+# of 500 from a low-priority hourly job.
+SENT_NOTIFICATION_TTL = timedelta(hours=24)
+SENT_NOTIFICATION_BUCKET_SECONDS = 3600
+SENT_NOTIFICATION_MAX_KEYS = int(os.getenv('SENT_NOTIFICATION_MAX_KEYS', '50000'))
+EXPIRY_SWEEP_BATCH_SIZE = 500  # Firestore WriteBatch limit
+EXPIRY_SWEEP_MAX_BATCHES = int(os.getenv('EXPIRY_SWEEP_MAX_BATCHES', '20'))  # per collection per sweep
+EXPIRY_SWEEP_BATCH_PAUSE = float(os.getenv('EXPIRY_SWEEP_BATCH_PAUSE', '0.25'))  # seconds between batches
+
+sent_notifications = {}  # notification key -> bucket start (epoch seconds)
+sent_notification_buckets = {}  # bucket start -> set of notification keys
+sent_notification_expiry_heap = []  # bucket starts, oldest first
+sent_notifications_lock = threading.Lock()
+
+def sent_notification_bucket(sent_at):
+    """Start of the hourly bucket a send time falls into (epoch seconds)"""
+    timestamp = int(sent_at.timestamp())
+    return timestamp - timestamp % SENT_NOTIFICATION_BUCKET_SECONDS
+
+def remember_sent_notification(notification_key, sent_at):
+    """Record a sent notification key in the in-memory cache"""
+    bucket = sent_notification_bucket(sent_at)
+    with sent_notifications_lock:
+        previous_bucket = sent_notifications.get(notification_key)
+        if previous_bucket is not None:
+            if previous_bucket >= bucket:
+                return
+            sent_notification_buckets[previous_bucket].discard(notification_key)
+
+        if bucket not in sent_notification_buckets:
+            sent_notification_buckets[bucket] = set()
+            heapq.heappush(sent_notification_expiry_heap, bucket)
+        sent_notifications[notification_key] = bucket
+        sent_notification_buckets[bucket].add(notification_key)
+
+        # Expire old buckets, then stay bounded by evicting the oldest remaining ones
+        expire_sent_notifications_locked()
+        while len(sent_notifications) > SENT_NOTIFICATION_MAX_KEYS and sent_notification_expiry_heap:
+            drop_sent_notification_bucket(heapq.heappop(sent_notification_expiry_heap))
+
+def expire_sent_notifications_locked(now=None):
+    """Pop buckets past the TTL off the expiry heap (caller holds sent_notifications_lock)"""
+    cutoff = (now or datetime.now(ZoneInfo('UTC'))) - SENT_NOTIFICATION_TTL
+    removed_count = 0
+    while (sent_notification_expiry_heap and
+           sent_notification_expiry_heap[0] + SENT_NOTIFICATION_BUCKET_SECONDS <= cutoff.timestamp()):
+        bucket = heapq.heappop(sent_notification_expiry_heap)
+        removed_count += len(sent_notification_buckets.get(bucket, ()))
+        drop_sent_notification_bucket(bucket)
+    return removed_count
+
+def drop_sent_notification_bucket(bucket):
+    """Forget every key in a bucket (caller holds sent_notifications_lock)"""
+    for notification_key in sent_notification_buckets.pop(bucket, ()):
+        sent_notifications.pop(notification_key, None)
+
+def is_notification_cached(notification_key):
+    """True if the key was sent within the TTL according to the in-memory cache"""
+    cutoff = datetime.now(ZoneInfo('UTC')) - SENT_NOTIFICATION_TTL
+    with sent_notifications_lock:
+        bucket = sent_notifications.get(notification_key)
+    return bucket is not None and bucket + SENT_NOTIFICATION_BUCKET_SECONDS > cutoff.timestamp()
+
+def get_tracking_sent_at(tracking_doc):
+    """sent_at of a notification_tracking doc if it is still within the TTL"""
+    if not tracking_doc.exists:
+        return None
+    tracking_data = tracking_doc.to_dict() or {}
+    sent_at = tracking_data.get('sent_at')
+    if not isinstance(sent_at, datetime):
+        return None
+    if sent_at.tzinfo is None:
+        sent_at = sent_at.replace(tzinfo=ZoneInfo('UTC'))
+    now_utc = datetime.now(ZoneInfo('UTC'))
+    expires_at = tracking_data.get('expires_at')
+    if isinstance(expires_at, datetime):
+        if expires_at.tzinfo is None:
+            expires_at = expires_at.replace(tzinfo=ZoneInfo('UTC'))
+        if expires_at <= now_utc:
+            return None
+    elif now_utc - sent_at >= SENT_NOTIFICATION_TTL:
+        return None
+    return sent_at
+
+def sweep_expired_docs(query_factory):
     """
-    Clean up old notification tracking entries to prevent memory leaks and duplicates.
-    
-    For Vercel/serverless deployments, this also syncs with Firestore to maintain
-    notification state across function invocations.
+    Delete the documents matched by a query in WriteBatch-sized pages.
+
+    Args:
+        query_factory (callable): Returns a fresh query for expired docs; it is re-run
+                                  after every page since deleted docs drop out of it
+
+    Returns:
+        int: Number of documents deleted
+    """
+    deleted_count = 0
+    for batch_number in range(EXPIRY_SWEEP_MAX_BATCHES):
+        expired_docs = list(query_factory().limit(EXPIRY_SWEEP_BATCH_SIZE).stream())
+        if not expired_docs:
+            break
+        deleted_count += commit_batched_writes([('delete', doc.reference, None) for doc in expired_docs])
+        if len(expired_docs) < EXPIRY_SWEEP_BATCH_SIZE:
+            break
+        time.sleep(EXPIRY_SWEEP_BATCH_PAUSE)  # low priority: leave room for request traffic
+    return deleted_count
+
+def sweep_expired_notification_tracking():
+    """
+    Remove expired notification tracking and reminder index entries.
     
-    Removes notification tracking entries older than 24 hours to maintain
-    optimal performance and prevent duplicate notifications while keeping
-    memory usage under control.
+    Runs off the notification path (hourly scheduler job or cron endpoint). In memory,
+    expired buckets are popped off the expiry heap. In Firestore, docs whose
+    expires_at has passed are deleted in batches of 500. Legacy tracking docs written
+    before expires_at existed are matched by sent_at. A Firestore TTL policy on
+    expires_at makes this a backstop rather than the only cleanup.
     
-    Notes:
-        - Removes in-memory entries older than 24 hours
-        - Syncs with Firestore for serverless persistence
-        - Handles invalid timestamp formats gracefully
-        - Logs cleanup statistics for monitoring
+    Returns:
+        dict: Number of entries removed per store
     """
-    try:
-        current_time = datetime.now()
-        cutoff_time = current_time - timedelta(hours=24)
-        
-        # Clean up in-memory cache
-        keys_to_remove = []
-        for key, sent_time_str in sent_notifications.items():
-            try:
-                sent_time = datetime.fromisoformat(sent_time_str)
-                if sent_time < cutoff_time:
-                    keys_to_remove.append(key)
-            except (ValueError, TypeError):
-                # Invalid timestamp, remove it
-                keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            del sent_notifications[key]
-        
-        if keys_to_remove:
-            print(f"🧹 Cleaned up {len(keys_to_remove)} old in-memory notification entries")
-        
-        # For serverless: Clean up Firestore tracking collection
-        if db:
-            try:
-                tracking_ref = db.collection('notification_tracking')
-                old_docs = tracking_ref.where(filter=firestore.FieldFilter('sent_at', '<', cutoff_time)).limit(100).stream()
-                
-                deleted_count = 0
-                for doc in old_docs:
-                    doc.reference.delete()
-                    deleted_count += 1
-                
-                if deleted_count > 0:
-                    print(f"🧹 Cleaned up {deleted_count} old Firestore notification tracking entries")
-            except Exception as e:
-                print(f"⚠️  Error cleaning Firestore notification tracking: {e}")
-                
-    except Exception as e:
-        print(f"⚠️ Error during notification cleanup: {e}")
+    current_time = datetime.now(ZoneInfo('UTC'))
+    cutoff_time = current_time - SENT_NOTIFICATION_TTL
+    swept = {'memory': 0, 'notification_tracking': 0, 'reminder_index': 0}
+    
+    with sent_notifications_lock:
+        swept['memory'] = expire_sent_notifications_locked(current_time)
+    
+    if db:
+        tracking_ref = db.collection('notification_tracking')
+        reminder_index_ref = db.collection(REMINDER_INDEX_COLLECTION)
+        try:
+            swept['notification_tracking'] = sweep_expired_docs(
+                lambda: tracking_ref.where(filter=firestore.FieldFilter('expires_at', '<=', current_time))
+            ) + sweep_expired_docs(
+                lambda: tracking_ref.where(filter=firestore.FieldFilter('sent_at', '<', cutoff_time))
+            )
+            swept['reminder_index'] = sweep_expired_docs(
+                lambda: reminder_index_ref.where(filter=firestore.FieldFilter('expires_at', '<=', current_time))
+            )
+        except Exception as e:
+            print(f"⚠️  Error sweeping expired notification tracking: {e}")
+    
+    if any(swept.values()):
+        print(f"🧹 Swept expired notification entries: {swept}")
+    return swept
 
 
-def check_notification_sent(notification_key):
+def prefetch_sent_notifications(notification_keys):
     """
-    Check if a notification has already been sent (with Firestore persistence for serverless).
+    Find which of a run's candidate notifications were already sent.
     
-    This function checks both in-memory cache and Firestore to prevent duplicate
-    notifications across serverless function invocations.
+    Keys not in the in-memory cache are looked up in Firestore with a single
+    batched get_all instead of one read per key.
     
     Args:
-        notification_key: Unique identifier for the notification
+        notification_keys: Iterable of notification keys the run may send
         
     Returns:
-        bool: True if notification was already sent, False otherwise
+        set: The keys that were already sent within the last 24 hours
     """
-    # Check in-memory cache first (fastest)
-    if notification_key in sent_notifications:
-        return True
+    already_sent = set()
+    uncached_keys = []
+    for notification_key in dict.fromkeys(notification_keys):
+        if is_notification_cached(notification_key):
+            already_sent.add(notification_key)
+        else:
+            uncached_keys.append(notification_key)
     
-    # For serverless: Check Firestore for persistence across invocations
-    if db:
+    if db and uncached_keys:
         try:
-            doc_ref = db.collection('notification_tracking').document(notification_key)
-            doc = doc_ref.get()
-            
-            if doc.exists:
-                doc_data = doc.to_dict()
-                sent_at = doc_data.get('sent_at')
-                
-                # Check if it's recent (within 24 hours)
-                if isinstance(sent_at, datetime):
-                    if (datetime.now() - sent_at).total_seconds() < 86400:  # 24 hours
-                        # Cache it in memory for this invocation
-                        sent_notifications[notification_key] = sent_at.isoformat()
-                        return True
-                    else:
-                        # Old entry, delete it
-                        doc_ref.delete()
-                        return False
+            tracking_ref = db.collection('notification_tracking')
+            tracking_docs = db.get_all([tracking_ref.document(key) for key in uncached_keys])
+            for tracking_doc in tracking_docs:
+                sent_at = get_tracking_sent_at(tracking_doc)
+                if sent_at:
+                    remember_sent_notification(tracking_doc.id, sent_at)
+                    already_sent.add(tracking_doc.id)
         except Exception as e:
-            print(f"⚠️  Error checking Firestore notification tracking: {e}")
+            print(f"⚠️  Error prefetching Firestore notification tracking: {e}")
     
-    return False
+    return already_sent
 
 
-def mark_notification_sent(notification_key):
+def mark_notifications_sent(notification_keys):
     """
-    Mark a notification as sent (with Firestore persistence for serverless).
+    Mark notifications as sent (with Firestore persistence for serverless).
     
-    This function records the notification in both in-memory cache and Firestore
-    to prevent duplicates across serverless function invocations.
+    Records every key in the in-memory cache and writes the Firestore tracking docs
+    in batched commits, so a run costs one write batch instead of one write per send.
     
     Args:
-        notification_key: Unique identifier for the notification
+        notification_keys: Iterable of notification keys that were delivered
     """
-    current_time = datetime.now()
+    current_time = datetime.now(ZoneInfo('UTC'))
+    notification_keys = list(notification_keys)
     
     # Store in memory cache
-    sent_notifications[notification_key] = current_time.isoformat()
+    for notification_key in notification_keys:
+        remember_sent_notification(notification_key, current_time)
     
     # For serverless: Store in Firestore for persistence
-    if db:
+    if db and notification_keys:
         try:
-            doc_ref = db.collection('notification_tracking').document(notification_key)
-            doc_ref.set({
-                'notification_key': notification_key,
-                'sent_at': current_time,
-                'created_at': current_time
-            })
+            tracking_ref = db.collection('notification_tracking')
+            commit_batched_writes([
+                ('set', tracking_ref.document(notification_key), {
+                    'notification_key': notification_key,
+                    'sent_at': current_time,
+                    'created_at': current_time,
+                    'expires_at': current_time + SENT_NOTIFICATION_TTL
+                })
+                for notification_key in notification_keys
+            ])
         except Exception as e:
             print(f"⚠️  Error storing notification tracking in Firestore: {e}")
 
+
 def get_automatic_notification_times(tasks, current_time):
     """
     Automatically determine optimal notification times based on user's task patterns.
@@ -768,233 +1397,1041 @@ def get_automatic_notification_times(tasks, current_time):
     
     return notification_times
 
-def check_and_send_notifications():
+# ===== BATCHED FIRESTORE WRITES =====
+FIRESTORE_BATCH_LIMIT = 500  # Firestore rejects WriteBatch commits with more than 500 operations
+BULK_WRITE_WORKERS = 4  # Concurrent batch commits for bulk operations
+
+def commit_batched_writes(writes):
     """
-    Check for upcoming tasks and send notifications based on user's custom reminder times.
-    This function is designed for serverless environments (Vercel) and is triggered by cron jobs.
+    Commit a list of write operations using Firestore WriteBatch chunks.
+
+    Args:
+        writes (list): Tuples of ('set' | 'update' | 'delete', document_ref, data)
+                       where data is ignored for deletes
+
+    Returns:
+        int: Number of operations committed
     """
-    if not db:
-        print("⚠️ Database not available for notifications")
-        return
-    
-    # Clean up old notification tracking entries
-    cleanup_sent_notifications()
-        
-    try:
-        print("🔔 Checking for task notifications based on user's custom reminder times...")
-        users_ref = db.collection('users')
-        users = users_ref.where(filter=firestore.FieldFilter('notifications_enabled', '==', True)).stream()
+    if not db or not writes:
+        return 0
 
-        notifications_sent = 0
+    committed = 0
+    for start in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+        batch = db.batch()
+        chunk = writes[start:start + FIRESTORE_BATCH_LIMIT]
+        for operation, doc_ref, data in chunk:
+            if operation == 'set':
+                batch.set(doc_ref, data)
+            elif operation == 'update':
+                batch.update(doc_ref, data)
+            elif operation == 'delete':
+                batch.delete(doc_ref)
+        batch.commit()
+        committed += len(chunk)
+
+    return committed
+
+def commit_write_groups(write_groups, max_workers=BULK_WRITE_WORKERS):
+    """
+    Commit groups of write operations in WriteBatch chunks, several chunks at a time.
 
-        for user in users:
-            user_data = user.to_dict()
-            user_id = user.id
-            user_email = user_data.get('email', 'Unknown')
+    Groups are packed into chunks of up to FIRESTORE_BATCH_LIMIT operations without
+    being split, so each group (e.g. a task delete and its tombstone) lands in one
+    atomic batch.
 
-            # Get user's timezone (default to America/New_York if not set)
-            user_timezone = user_data.get('timezone', 'America/New_York')
+    Args:
+        write_groups (list): Lists of ('set' | 'update' | 'delete', document_ref, data) tuples
+        max_workers (int): Maximum number of concurrent batch commits
 
-            # Get current time in user's timezone
-            current_time = get_user_current_time(user_timezone)
-            today = current_time.strftime('%Y-%m-%d')
-            current_day = current_time.strftime('%A').lower()
+    Returns:
+        list: Per group, True if its batch committed
+    """
+    chunks = []  # (group indexes, writes)
+    for index, group in enumerate(write_groups):
+        if not chunks or len(chunks[-1][1]) + len(group) > FIRESTORE_BATCH_LIMIT:
+            chunks.append(([], []))
+        chunks[-1][0].append(index)
+        chunks[-1][1].extend(group)
+
+    committed = [False] * len(write_groups)
+    if not db or not chunks:
+        return committed
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(chunks))),
+                                               thread_name_prefix="firestore-batch") as executor:
+        futures = {executor.submit(commit_batched_writes, writes): indexes for indexes, writes in chunks}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"⚠️ Error committing write batch of {len(futures[future])} groups: {e}")
+                continue
+            for index in futures[future]:
+                committed[index] = True
+    return committed
+
+# ===== REQUEST-SCOPED DOCUMENT LOADER =====
+# Helpers called in one request often read the same user-level documents
+# (users/{uid}, users/{uid}/preferences/main): update_task and delete_task check
+# privacyMode and load the user doc for reminders, the assistant reads both through
+# get_user_preferences and again through load_user_data. Inside a request each
+# document is read at most once and memoized on flask.g, and documents needed
+# together come from one db.get_all. Outside a request (scheduler and delivery
+# threads) every call reads Firestore. With FIRESTORE_READS_HEADER (or in
+# development) responses report the documents read through the loader and counted
+# queries before the response was built in X-Firestore-Reads.
+FIRESTORE_READS_HEADER = os.getenv('FIRESTORE_READS_HEADER', '').lower() in ('1', 'true', 'yes')
+
+def note_firestore_reads(count=1):
+    """Add to the current request's Firestore read count"""
+    if has_request_context():
+        g.firestore_reads = g.get('firestore_reads', 0) + count
+
+def counted_stream(query):
+    """Stream a query's documents, counting them toward the request's reads"""
+    for doc in query.stream():
+        note_firestore_reads()
+        yield doc
+
+def user_doc_ref(uid):
+    """Reference to users/{uid}"""
+    return db.collection('users').document(uid)
+
+def user_preferences_ref(uid):
+    """Reference to users/{uid}/preferences/main"""
+    return user_doc_ref(uid).collection('preferences').document('main')
+
+def is_valid_document_id(doc_id):
+    """Whether doc_id can name a Firestore document (no '/', not '.' or '..', not __reserved__)"""
+    return (isinstance(doc_id, str) and 0 < len(doc_id.encode('utf-8')) <= 1500
+            and '/' not in doc_id and doc_id not in ('.', '..')
+            and not (doc_id.startswith('__') and doc_id.endswith('__')))
+
+def get_request_docs(*doc_refs):
+    """
+    Get document snapshots, reading each at most once per request.
 
-            print(f"🔍 Checking notifications for user: {user_email} (timezone: {user_timezone}, local time: {current_time.strftime('%I:%M %p')})")
-            
-            # Get user's custom reminder times (in minutes before task)
-            # Support both custom_reminder_times and reminder_times field names
-            user_reminder_times = user_data.get('custom_reminder_times') or user_data.get('reminder_times', [300, 60, 30])
-            
-            if not user_reminder_times or not isinstance(user_reminder_times, list):
-                user_reminder_times = [300, 60, 30]  # Default: 5 hours, 1 hour, 30 minutes
-                
-            print(f"📅 User's reminder times: {user_reminder_times} minutes before tasks")
-            
-            # Get notification method
-            notification_methods = user_data.get('notification_methods', [])
-            if not notification_methods:
-                # Fallback to single notification_method
-                notification_methods = [user_data.get('notification_method', 'email')]
+    Documents not yet loaded in this request are fetched together with one
+    db.get_all (or a plain get for a single document).
+
+    Returns:
+        list: Snapshots in the order of doc_refs
+    """
+    memo = g.setdefault('request_docs', {}) if has_request_context() else {}
+    missing = list({doc_ref.path: doc_ref for doc_ref in doc_refs if doc_ref.path not in memo}.values())
+    if len(missing) == 1:
+        memo[missing[0].path] = missing[0].get()
+    elif missing:
+        for snapshot in db.get_all(missing):
+            memo[snapshot.reference.path] = snapshot
+    note_firestore_reads(len(missing))
+    return [memo[doc_ref.path] for doc_ref in doc_refs]
+
+def forget_request_docs(*doc_refs):
+    """Drop memoized documents after this request writes them"""
+    if has_request_context():
+        memo = g.get('request_docs', {})
+        for doc_ref in doc_refs:
+            memo.pop(doc_ref.path, None)
+
+@app.after_request
+def add_firestore_reads_header(response):
+    """Report the request's counted Firestore reads (debug aid)"""
+    if FIRESTORE_READS_HEADER or app.config['DEBUG']:
+        response.headers['X-Firestore-Reads'] = str(g.get('firestore_reads', 0))
+    return response
+
+# ===== NOTIFICATION SHARDING =====
+# Notification sweeps can be split across processes/nodes by user. Every uid hashes
+# to one of USER_SHARD_SLOTS slots (crc32), and shard n of m owns a contiguous
+# slot range. User documents, the reminder index and the summary schedule store
+# the slot (shard_slot) so a shard's queries only read its own range. A shard is
+# passed around as an (index, count) tuple. None means all users.
+USER_SHARD_SLOTS = 1024
+
+def user_shard_slot(uid):
+    """Stable hash slot for a user (0 .. USER_SHARD_SLOTS - 1)"""
+    return zlib.crc32(uid.encode('utf-8')) % USER_SHARD_SLOTS
+
+def shard_slot_range(shard):
+    """Half-open [start, end) slot range owned by a shard"""
+    shard_index, shard_count = shard
+    return (shard_index * USER_SHARD_SLOTS // shard_count,
+            (shard_index + 1) * USER_SHARD_SLOTS // shard_count)
+
+def shard_slot_query(query, shard):
+    """Restrict a query to a shard's shard_slot range (unchanged when not sharded)"""
+    if shard is None:
+        return query
+    slot_start, slot_end = shard_slot_range(shard)
+    return query.where(
+        filter=firestore.FieldFilter('shard_slot', '>=', slot_start)
+    ).where(
+        filter=firestore.FieldFilter('shard_slot', '<', slot_end)
+    )
+
+def backfill_user_shard_slots():
+    """
+    Store shard_slot on user documents that don't have it yet (one-off after
+    deploying sharded sweeps; login and settings saves keep it set afterwards).
+
+    Returns:
+        int: Number of user documents updated
+    """
+    if not db:
+        return 0
+
+    writes = [
+        ('update', user.reference, {'shard_slot': user_shard_slot(user.id)})
+        for user in db.collection('users').stream()
+        if (user.to_dict() or {}).get('shard_slot') != user_shard_slot(user.id)
+    ]
+    commit_batched_writes(writes)
+    print(f"🗂️ User shard slot backfill complete: {len(writes)} users updated")
+    return len(writes)
+
+def parse_shard(shard_index, shard_count):
+    """
+    Validate shard parameters.
+
+    Args:
+        shard_index: Shard number (0-based), or None to run every shard
+        shard_count: Total number of shards, or None for an unsharded run
+
+    Returns:
+        tuple: (shard_index or None, shard_count or None)
+
+    Raises:
+        ValueError: If the parameters are not a valid shard of USER_SHARD_SLOTS
+    """
+    if shard_count in (None, ''):
+        if shard_index not in (None, ''):
+            raise ValueError("shard requires shards")
+        return None, None
+
+    shard_count = int(shard_count)
+    if not 1 <= shard_count <= USER_SHARD_SLOTS:
+        raise ValueError(f"shards must be between 1 and {USER_SHARD_SLOTS}")
+    if shard_index in (None, ''):
+        return None, shard_count
+
+    shard_index = int(shard_index)
+    if not 0 <= shard_index < shard_count:
+        raise ValueError("shard must be between 0 and shards - 1")
+    return shard_index, shard_count
+
+def shard_run_name(run_name, shard):
+    """Run name used for delivery stats, e.g. task_reminders[2/4]"""
+    if shard is None:
+        return run_name
+    return f"{run_name}[{shard[0]}/{shard[1]}]"
+
+def run_notification_job_shards(job, run_name, shard_index=None, shard_count=None):
+    """
+    Run a notification job for one shard, every shard (concurrently) or unsharded.
+
+    Args:
+        job (callable): Notification job accepting shard=(index, count) or None
+        run_name (str): Base run name used for delivery stats
+        shard_index (int): Shard to run, or None to run all shard_count shards
+        shard_count (int): Number of shards, or None for an unsharded run
+
+    Returns:
+        tuple: (total notifications sent, list of per-shard reports)
+    """
+    if shard_count is None:
+        shards = [None]
+    elif shard_index is None:
+        shards = [(index, shard_count) for index in range(shard_count)]
+    else:
+        shards = [(shard_index, shard_count)]
+
+    def run_shard(shard):
+        started = time.monotonic()
+        report = {
+            'shard': shard[0] if shard else None,
+            'shards': shard[1] if shard else None,
+            'completed': False,
+            'sent': 0
+        }
+        try:
+            report['sent'] = job(shard=shard) or 0
+            report['completed'] = True
+        except Exception as e:
+            print(f"❌ {shard_run_name(run_name, shard)} failed: {e}")
+            report['error'] = str(e)
+        report['elapsed_seconds'] = round(time.monotonic() - started, 3)
+        report['delivery'] = notification_delivery_stats.get(shard_run_name(run_name, shard))
+        if shard_run_name(run_name, shard) in notification_pipeline_stats:
+            report['pipeline'] = notification_pipeline_stats[shard_run_name(run_name, shard)]
+        return report
+
+    if len(shards) == 1:
+        reports = [run_shard(shards[0])]
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(shards), NOTIFICATION_WORKERS),
+                                                   thread_name_prefix=f"{run_name}-shard") as executor:
+            reports = list(executor.map(run_shard, shards))
+
+    return sum(report['sent'] for report in reports), reports
+
+# ===== REMINDER DUE-AT INDEX =====
+# Every pending task reminder is stored as its own document in the reminder_index
+# collection, keyed by the absolute UTC time it should fire. The notification cron
+# then only reads reminders that are due instead of streaming every task of every user.
+# Entries are maintained by the task routes and rebuilt when reminder settings change.
+REMINDER_INDEX_COLLECTION = 'reminder_index'
+DEFAULT_REMINDER_TIMES = [300, 60, 30]  # 5 hours, 1 hour, 30 minutes
+REMINDER_WINDOW_MINUTES = 10.0  # Send a reminder if the cron runs within +/- 10 minutes of it
+REMINDER_INDEX_RETENTION = timedelta(days=1)  # Undelivered entries expire this long after the task starts
+WEEKDAY_NAMES = ['sunday', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday']
+
+def get_user_timezone(user_data):
+    """Return the user's ZoneInfo, falling back to America/New_York for missing/invalid values"""
+    try:
+        return ZoneInfo((user_data or {}).get('timezone') or 'America/New_York')
+    except Exception:
+        return ZoneInfo('America/New_York')
+
+def get_user_reminder_times(user_data):
+    """
+    Get the user's reminder offsets in minutes before each task.
+
+    Supports both the custom_reminder_times and legacy reminder_times field names.
+    """
+    user_data = user_data or {}
+    reminder_times = user_data.get('custom_reminder_times') or user_data.get('reminder_times', DEFAULT_REMINDER_TIMES)
+
+    if not reminder_times or not isinstance(reminder_times, list):
+        return list(DEFAULT_REMINDER_TIMES)
+
+    minutes = []
+    for value in reminder_times:
+        try:
+            minutes.append(int(value))
+        except (ValueError, TypeError):
+            continue
+    return minutes or list(DEFAULT_REMINDER_TIMES)
+
+def get_task_start_time_str(task_data):
+    """Get a task's start time as 'HH:MM' from startTime, time ('09:00-10:00') or endTime"""
+    if task_data.get('startTime'):
+        return task_data.get('startTime')
+    elif task_data.get('time'):
+        # Handle format like "09:00-10:00" or just "09:00"
+        time_range = task_data.get('time', '')
+        if '-' in time_range:
+            return time_range.split('-')[0].strip()
+        return time_range.strip()
+    elif task_data.get('endTime'):
+        return task_data.get('endTime')
+    return None
+
+def parse_task_date(value):
+    """Parse a 'YYYY-MM-DD' task date, returning None for anything else"""
+    if isinstance(value, str) and re.match(r'^\d{4}-\d{2}-\d{2}$', value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            return None
+    return None
+
+def resolve_task_date(task_data, reference_time):
+    """
+    Resolve the calendar date a task is scheduled for.
+
+    Tasks are stored with a weekday name and a weekOffset relative to the week
+    (Sunday-Saturday) they were created in, matching the planner UI. Class tasks
+    pin an absoluteDate. The normalized 'date' field is derived from these, so it
+    is only used when the task has no weekday.
+
+    Args:
+        task_data (dict): Task document
+        reference_time (datetime): Time in the user's timezone the weekOffset is relative to
+
+    Returns:
+        date: The scheduled date, or None if the task has no usable day
+    """
+    absolute_date = parse_task_date(task_data.get('absoluteDate'))
+    if absolute_date:
+        return absolute_date
+
+    task_day = (task_data.get('day') or '').lower()
+    if task_day not in WEEKDAY_NAMES:
+        task_date = parse_task_date(task_data.get('date'))
+        if task_date:
+            return task_date
+    if task_day in ('', 'today'):
+        return reference_time.date()
+    if task_day not in WEEKDAY_NAMES:
+        return None
+
+    try:
+        week_offset = int(task_data.get('weekOffset', 0) or 0)
+    except (ValueError, TypeError):
+        week_offset = 0
+
+    # Python weekday(): Monday=0 ... Sunday=6, planner weeks start on Sunday
+    week_start = reference_time.date() - timedelta(days=(reference_time.weekday() + 1) % 7)
+    return week_start + timedelta(days=WEEKDAY_NAMES.index(task_day) + 7 * week_offset)
+
+def get_task_reference_time(task_data, user_tz):
+    """Get the time a task's weekOffset is relative to (its creation time in the user's timezone)"""
+    created_at = task_data.get('created_at')
+    if isinstance(created_at, datetime):
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=ZoneInfo('UTC'))
+        return created_at.astimezone(user_tz)
+    return datetime.now(user_tz)
+
+def get_task_start_minute(task_data):
+    """Minutes after midnight a task starts, or None if it has no valid start time"""
+    task_time_str = get_task_start_time_str(task_data)
+    try:
+        task_time = datetime.strptime(task_time_str.strip(), '%H:%M')
+    except (ValueError, AttributeError):
+        return None
+    return task_time.hour * 60 + task_time.minute
+
+def build_task_index_fields(task_data, user_data):
+    """
+    Normalized, indexable fields stored on every task document.
+
+    Lets the notification jobs query where('date', '==', today) instead of
+    streaming whole task collections and filtering day/weekOffset in Python.
+
+    Returns:
+        dict: {'date': 'YYYY-MM-DD' or None, 'start_minute': int or None, 'completed': bool}
+    """
+    user_tz = get_user_timezone(user_data)
+    task_date = resolve_task_date(task_data, get_task_reference_time(task_data, user_tz))
+    return {
+        'date': task_date.isoformat() if task_date else None,
+        'start_minute': get_task_start_minute(task_data),
+        'completed': bool(task_data.get('completed', False))
+    }
+
+def reminder_index_doc_id(uid, task_id, reminder_minutes):
+    """Deterministic reminder_index document ID so entries can be replaced without a query"""
+    return f"{uid}_{task_id}_{reminder_minutes}"
+
+def build_task_reminder_entries(uid, task_id, task_data, user_data, now_utc=None):
+    """
+    Compute the reminder_index entries for a task.
+
+    Completed tasks, tasks without a start time and reminders whose send window
+    has already passed produce no entries.
+
+    Returns:
+        list: (doc_id, entry) tuples
+    """
+    if task_data.get('completed', False):
+        return []
+
+    task_time_str = get_task_start_time_str(task_data)
+    if not task_time_str:
+        return []
+
+    user_tz = get_user_timezone(user_data)
+    task_date = resolve_task_date(task_data, get_task_reference_time(task_data, user_tz))
+    if not task_date:
+        return []
+
+    try:
+        task_start_local = datetime.strptime(f"{task_date.isoformat()} {task_time_str.strip()}", '%Y-%m-%d %H:%M').replace(tzinfo=user_tz)
+    except ValueError:
+        return []
+
+    task_start_utc = task_start_local.astimezone(ZoneInfo('UTC'))
+    now_utc = now_utc or datetime.now(ZoneInfo('UTC'))
+    earliest_fire_at = now_utc - timedelta(minutes=REMINDER_WINDOW_MINUTES)
+
+    entries = []
+    for reminder_minutes in get_user_reminder_times(user_data):
+        fire_at = task_start_utc - timedelta(minutes=reminder_minutes)
+        if fire_at < earliest_fire_at or task_start_utc < now_utc:
+            continue
+        entries.append((reminder_index_doc_id(uid, task_id, reminder_minutes), {
+            'uid': uid,
+            'task_id': task_id,
+            'reminder_minutes': reminder_minutes,
+            'shard_slot': user_shard_slot(uid),
+            'fire_at': fire_at,
+            'task_start': task_start_utc,
+            'expires_at': task_start_utc + REMINDER_INDEX_RETENTION,
+            'local_date': task_date.isoformat(),
+            'task_time': task_time_str,
+            'title': task_data.get('title', 'Untitled Task'),
+            'priority': task_data.get('priority', 'medium'),
+            'description': task_data.get('description', ''),
+            'day': task_data.get('day', 'Today')
+        }))
+
+    return entries
+
+def reminder_notification_key(reminder):
+    """Dedupe key for a reminder index entry (one per task, reminder time and local date)"""
+    return f"{reminder['uid']}_task_{reminder['task_id']}_reminder_{reminder['reminder_minutes']}_{reminder['local_date']}"
+
+def build_task_reminder_writes(uid, task_id, task_data, user_data):
+    """Build the writes that replace a task's reminder_index entries with its current state"""
+    index_ref = db.collection(REMINDER_INDEX_COLLECTION)
+    entries = build_task_reminder_entries(uid, task_id, task_data, user_data)
+    wanted_ids = {doc_id for doc_id, _ in entries}
+
+    writes = [
+        ('delete', index_ref.document(reminder_index_doc_id(uid, task_id, minutes)), None)
+        for minutes in get_user_reminder_times(user_data)
+        if reminder_index_doc_id(uid, task_id, minutes) not in wanted_ids
+    ]
+    writes.extend(('set', index_ref.document(doc_id), entry) for doc_id, entry in entries)
+    return writes
+
+def build_reminder_delete_writes(uid, task_ids, user_data):
+    """Build the writes that remove every reminder_index entry for the given tasks"""
+    index_ref = db.collection(REMINDER_INDEX_COLLECTION)
+    return [
+        ('delete', index_ref.document(reminder_index_doc_id(uid, task_id, minutes)), None)
+        for task_id in task_ids
+        for minutes in get_user_reminder_times(user_data)
+    ]
+
+def load_user_data(uid):
+    """Read a user's document (once per request), returning an empty dict if it does not exist"""
+    user_doc = get_request_docs(user_doc_ref(uid))[0]
+    if not user_doc.exists:
+        return {}
+    return user_doc.to_dict() or {}
+
+def sync_task_reminders(uid, task_id, task_data, user_data=None):
+    """
+    Update the reminder_index entries for a single task after it is saved or updated.
+
+    Errors are logged and swallowed so index maintenance never fails the task write.
+    """
+    if not db:
+        return
+
+    try:
+        if user_data is None:
+            user_data = load_user_data(uid)
+        commit_batched_writes(build_task_reminder_writes(uid, task_id, task_data, user_data))
+    except Exception as e:
+        print(f"⚠️ Error updating reminder index for task {task_id}: {e}")
+
+def remove_task_reminders(uid, task_ids, user_data=None):
+    """Remove the reminder_index entries for deleted tasks"""
+    if not db or not task_ids:
+        return
+
+    try:
+        if user_data is None:
+            user_data = load_user_data(uid)
+        commit_batched_writes(build_reminder_delete_writes(uid, task_ids, user_data))
+    except Exception as e:
+        print(f"⚠️ Error removing reminder index entries for user {uid}: {e}")
+
+def rebuild_user_reminder_index(uid, user_data=None):
+    """
+    Rebuild all reminder_index entries for one user.
+
+    Used when the user's reminder times or timezone change, since every
+    fire time for their tasks shifts.
+
+    Returns:
+        int: Number of reminder entries written
+    """
+    if not db:
+        return 0
+
+    try:
+        if user_data is None:
+            user_data = load_user_data(uid)
+
+        index_ref = db.collection(REMINDER_INDEX_COLLECTION)
+        writes = [
+            ('delete', doc.reference, None)
+            for doc in index_ref.where(filter=firestore.FieldFilter('uid', '==', uid)).stream()
+        ]
+
+        entry_count = 0
+        tasks_ref = db.collection('users').document(uid).collection('tasks')
+        for task_doc in tasks_ref.stream():
+            for doc_id, entry in build_task_reminder_entries(uid, task_doc.id, task_doc.to_dict(), user_data):
+                writes.append(('set', index_ref.document(doc_id), entry))
+                entry_count += 1
+
+        commit_batched_writes(writes)
+        print(f"🗂️ Rebuilt reminder index for user {uid}: {entry_count} pending reminders")
+        return entry_count
+    except Exception as e:
+        print(f"⚠️ Error rebuilding reminder index for user {uid}: {e}")
+        return 0
+
+def rebuild_reminder_index():
+    """
+    Backfill the reminder_index for every user.
+
+    Run once after deploying the index (via /api/cron/rebuild-indexes) so tasks
+    created before it existed still get reminders.
+
+    Returns:
+        int: Number of reminder entries written
+    """
+    if not db:
+        return 0
+
+    entry_count = 0
+    for user in db.collection('users').stream():
+        entry_count += rebuild_user_reminder_index(user.id, user.to_dict() or {})
+    print(f"🗂️ Reminder index backfill complete: {entry_count} pending reminders")
+    return entry_count
+
+def get_tasks_for_date(uid, date_str):
+    """Read a user's tasks scheduled on a date ('YYYY-MM-DD') via the normalized date field"""
+    tasks_ref = db.collection('users').document(uid).collection('tasks')
+    return [
+        task_doc.to_dict()
+        for task_doc in tasks_ref.where(filter=firestore.FieldFilter('date', '==', date_str)).stream()
+    ]
+
+def backfill_user_task_fields(uid, user_data=None):
+    """
+    Write the normalized date/start_minute/completed fields on all of a user's tasks.
+
+    Also used when the user's timezone changes, since dates are resolved in it.
+
+    Returns:
+        int: Number of tasks updated
+    """
+    if not db:
+        return 0
+
+    try:
+        if user_data is None:
+            user_data = load_user_data(uid)
+
+        writes = []
+        for task_doc in db.collection('users').document(uid).collection('tasks').stream():
+            task_data = task_doc.to_dict() or {}
+            index_fields = build_task_index_fields(task_data, user_data)
+            if any(task_data.get(field) != value or field not in task_data for field, value in index_fields.items()):
+                writes.append(('update', task_doc.reference, index_fields))
+
+        updated_count = commit_batched_writes(writes)
+        if updated_count:
+            bump_resource_versions(uid, 'tasks')
+        return updated_count
+    except Exception as e:
+        print(f"⚠️ Error backfilling task fields for user {uid}: {e}")
+        return 0
+
+def backfill_task_fields():
+    """
+    Migration: add the normalized task fields to tasks written before they existed.
+
+    Returns:
+        int: Number of tasks updated
+    """
+    if not db:
+        return 0
+
+    updated_count = 0
+    for user in db.collection('users').stream():
+        updated_count += backfill_user_task_fields(user.id, user.to_dict() or {})
+    print(f"🗂️ Task field backfill complete: {updated_count} tasks updated")
+    return updated_count
+
+def get_due_reminders(now_utc, window_minutes=REMINDER_WINDOW_MINUTES, shard=None):
+    """
+    Read the reminder_index entries whose fire time is within the cron window.
+
+    Args:
+        shard (tuple): (index, count) to read only that shard's entries (needs a
+                       composite index on shard_slot + fire_at)
+
+    Returns:
+        list: (document_ref, entry) tuples
+    """
+    query = db.collection(REMINDER_INDEX_COLLECTION).where(
+        filter=firestore.FieldFilter('fire_at', '>=', now_utc - timedelta(minutes=window_minutes))
+    ).where(
+        filter=firestore.FieldFilter('fire_at', '<=', now_utc + timedelta(minutes=window_minutes))
+    )
+    query = shard_slot_query(query, shard)
+    return [(doc.reference, doc.to_dict()) for doc in query.stream()]
+
+# ===== DAILY SUMMARY SCHEDULE INDEX =====
+# Each user with daily summaries enabled has one summary_schedule document holding
+# the UTC minute of day their daily_summary_time falls on (from their timezone), so
+# a summary tick only queries the users due in its window instead of streaming
+# everyone. The UTC minute only moves when the user changes settings or their
+# timezone changes its UTC offset. Each entry records when the current offset stops
+# being valid (the next DST transition) and due entries are recomputed on the next
+# tick without reading the user documents.
+SUMMARY_SCHEDULE_COLLECTION = 'summary_schedule'
+DEFAULT_DAILY_SUMMARY_TIME = '23:30'
+SUMMARY_WINDOW_MINUTES = 5  # Send if the tick runs within +/- 5 minutes of the summary time
+SUMMARY_SCHEDULE_PAGE_SIZE = 100  # Entries per paged schedule read (no stream stays open during delivery)
+MINUTES_PER_DAY = 24 * 60
+UTC_OFFSET_SCAN_DAYS = 400  # How far ahead to look for the next offset change
+
+utc_offset_change_cache = {}  # (timezone name, UTC date) -> next offset change after that date's midnight
+
+def parse_daily_summary_time(daily_summary_time):
+    """Parse an 'HH:MM' summary time, returning (hour, minute) or None if invalid"""
+    try:
+        summary_hour, summary_minute = map(int, str(daily_summary_time).split(':'))
+    except (ValueError, AttributeError):
+        return None
+    if not (0 <= summary_hour < 24 and 0 <= summary_minute < 60):
+        return None
+    return summary_hour, summary_minute
+
+def next_utc_offset_change(user_tz, after_utc):
+    """
+    Find the next time a timezone's UTC offset changes (e.g. a DST transition).
+
+    Scans forward a day at a time from midnight UTC of after_utc's date, then
+    bisects to the minute. Results are cached per timezone and UTC date.
+
+    Returns:
+        datetime: UTC time of the next change (or UTC_OFFSET_SCAN_DAYS ahead if none)
+    """
+    day_start = after_utc.replace(hour=0, minute=0, second=0, microsecond=0)
+    cache_key = (str(user_tz), day_start.date())
+    cached = utc_offset_change_cache.get(cache_key)
+    if cached is not None and cached > after_utc:
+        return cached
+
+    base_offset = day_start.astimezone(user_tz).utcoffset()
+    low = day_start
+    change_at = day_start + timedelta(days=UTC_OFFSET_SCAN_DAYS)
+    for _ in range(UTC_OFFSET_SCAN_DAYS):
+        high = low + timedelta(days=1)
+        if high.astimezone(user_tz).utcoffset() != base_offset:
+            while high - low > timedelta(minutes=1):
+                middle = low + (high - low) / 2
+                if middle.astimezone(user_tz).utcoffset() == base_offset:
+                    low = middle
+                else:
+                    high = middle
+            change_at = high.replace(second=0, microsecond=0)
+            break
+        low = high
+
+    utc_offset_change_cache[cache_key] = change_at
+    if change_at <= after_utc:
+        # Transition earlier on the same UTC day; look past it
+        return next_utc_offset_change(user_tz, change_at + timedelta(days=1))
+    return change_at
+
+def build_summary_schedule_entry(uid, timezone_name, daily_summary_time, now_utc=None):
+    """
+    Compute a user's summary_schedule entry.
+
+    Returns:
+        dict: Entry with fire_minute_utc, or None if the summary time is invalid
+    """
+    summary_time = parse_daily_summary_time(daily_summary_time)
+    if summary_time is None:
+        return None
+
+    now_utc = now_utc or datetime.now(ZoneInfo('UTC'))
+    user_tz = get_user_timezone({'timezone': timezone_name})
+    offset_minutes = int(now_utc.astimezone(user_tz).utcoffset().total_seconds() // 60)
+    summary_hour, summary_minute = summary_time
+
+    return {
+        'uid': uid,
+        'timezone': str(user_tz),
+        'daily_summary_time': daily_summary_time,
+        'fire_minute_utc': (summary_hour * 60 + summary_minute - offset_minutes) % MINUTES_PER_DAY,
+        'utc_offset_minutes': offset_minutes,
+        'offset_valid_until': next_utc_offset_change(user_tz, now_utc),
+        'shard_slot': user_shard_slot(uid)
+    }
+
+def build_user_summary_schedule_write(uid, user_data, now_utc=None):
+    """Write operation that brings a user's summary_schedule entry in line with their settings"""
+    schedule_ref = db.collection(SUMMARY_SCHEDULE_COLLECTION).document(uid)
+    entry = None
+    if user_data.get('notifications_enabled', False) and user_data.get('daily_summary', False):
+        entry = build_summary_schedule_entry(
+            uid,
+            user_data.get('timezone'),
+            user_data.get('daily_summary_time', DEFAULT_DAILY_SUMMARY_TIME),
+            now_utc
+        )
+    if entry is None:
+        return ('delete', schedule_ref, None)
+    return ('set', schedule_ref, entry)
+
+def sync_user_summary_schedule(uid, user_data=None):
+    """Update a user's summary schedule entry after their notification settings change"""
+    if not db:
+        return
+    try:
+        if user_data is None:
+            user_data = load_user_data(uid)
+        commit_batched_writes([build_user_summary_schedule_write(uid, user_data)])
+    except Exception as e:
+        print(f"⚠️ Error syncing summary schedule for user {uid}: {e}")
+
+def rebuild_summary_schedule():
+    """
+    Backfill the summary schedule for every user (one-off after deploying the index).
+
+    Returns:
+        int: Number of users with a scheduled daily summary
+    """
+    if not db:
+        return 0
+
+    now_utc = datetime.now(ZoneInfo('UTC'))
+    writes = [
+        build_user_summary_schedule_write(user.id, user.to_dict() or {}, now_utc)
+        for user in db.collection('users').stream()
+    ]
+    commit_batched_writes(writes)
+    scheduled = sum(1 for operation, _, _ in writes if operation == 'set')
+    print(f"🗂️ Summary schedule backfill complete: {scheduled} users scheduled")
+    return scheduled
+
+def refresh_summary_schedule_offsets(now_utc):
+    """
+    Recompute entries whose timezone changed its UTC offset (DST) since they were built.
+
+    Only entries past their offset_valid_until are read, so on most ticks this is an
+    empty query.
+
+    Returns:
+        int: Number of entries refreshed
+    """
+    stale_docs = db.collection(SUMMARY_SCHEDULE_COLLECTION).where(
+        filter=firestore.FieldFilter('offset_valid_until', '<=', now_utc)
+    ).stream()
+
+    writes = []
+    for doc in stale_docs:
+        entry = doc.to_dict() or {}
+        refreshed = build_summary_schedule_entry(doc.id, entry.get('timezone'), entry.get('daily_summary_time'), now_utc)
+        writes.append(('set', doc.reference, refreshed) if refreshed else ('delete', doc.reference, None))
+
+    if writes:
+        commit_batched_writes(writes)
+        print(f"🕰️ Refreshed {len(writes)} summary schedule entries after a UTC offset change")
+    return len(writes)
+
+def stream_due_summary_entries(now_utc, shard=None, window_minutes=SUMMARY_WINDOW_MINUTES):
+    """
+    Stream the summary_schedule entries whose summary time is within the tick window.
+
+    Entries are read in pages (limit + start_after) rather than one query stream, since
+    the consumer dispatches deliveries between reads and can run up to the run timeout.
+
+    Args:
+        shard (tuple): (index, count) to read only that shard's entries (needs a
+                       composite index on shard_slot + fire_minute_utc)
+
+    Yields:
+        dict: Schedule entries (uid, timezone, daily_summary_time, ...)
+    """
+    refresh_summary_schedule_offsets(now_utc)
+
+    current_minute = now_utc.hour * 60 + now_utc.minute
+    window_start = (current_minute - window_minutes) % MINUTES_PER_DAY
+    window_end = (current_minute + window_minutes) % MINUTES_PER_DAY
+    if window_start <= window_end:
+        minute_ranges = [(window_start, window_end)]
+    else:
+        # Window wraps around midnight UTC
+        minute_ranges = [(window_start, MINUTES_PER_DAY - 1), (0, window_end)]
+
+    for range_start, range_end in minute_ranges:
+        query = db.collection(SUMMARY_SCHEDULE_COLLECTION).where(
+            filter=firestore.FieldFilter('fire_minute_utc', '>=', range_start)
+        ).where(
+            filter=firestore.FieldFilter('fire_minute_utc', '<=', range_end)
+        )
+        query = shard_slot_query(query, shard).order_by('fire_minute_utc').limit(SUMMARY_SCHEDULE_PAGE_SIZE)
+        last_doc = None
+        while True:
+            page = list((query.start_after(last_doc) if last_doc else query).stream())
+            for doc in page:
+                yield {**(doc.to_dict() or {}), 'uid': doc.id}
+            if len(page) < SUMMARY_SCHEDULE_PAGE_SIZE:
+                break
+            last_doc = page[-1]
+
+def check_and_send_notifications(shard=None):
+    """
+    Send task reminders that are due based on each user's custom reminder times.
+
+    Reads only the reminder_index entries whose fire time falls inside the cron
+    window, then loads the owning users' documents in one batched read.
+    This function is designed for serverless environments (Vercel) and is triggered by cron jobs.
+
+    Args:
+        shard (tuple): (index, count) to only handle that shard's users; None for all
+    """
+    if not db:
+        print("⚠️ Database not available for notifications")
+        return
+    
+    try:
+        print("🔔 Checking for task notifications based on user's custom reminder times...")
+        now_utc = datetime.now(ZoneInfo('UTC'))
+        due_reminders = get_due_reminders(now_utc, shard=shard)
+        print(f"🗂️ Found {len(due_reminders)} reminder(s) due within {REMINDER_WINDOW_MINUTES:.0f} minutes")
+
+        # Group due reminders by user, keeping only the closest reminder per task
+        # (only one notification per task per check)
+        reminders_by_user = {}
+        for reminder_ref, reminder in due_reminders:
+            user_tasks = reminders_by_user.setdefault(reminder['uid'], {})
+            current = user_tasks.get(reminder['task_id'])
+            if current is None or abs(reminder['fire_at'] - now_utc) < abs(current[1]['fire_at'] - now_utc):
+                user_tasks[reminder['task_id']] = (reminder_ref, reminder)
+
+        # Look up every candidate's dedupe key in one batched read
+        already_sent = prefetch_sent_notifications(
+            reminder_notification_key(reminder)
+            for user_tasks in reminders_by_user.values()
+            for _, reminder in user_tasks.values()
+        )
+
+        user_refs = [db.collection('users').document(uid) for uid in reminders_by_user]
+        user_docs = db.get_all(user_refs) if user_refs else []
+
+        deliveries = []
+        reminder_refs_by_key = {}
+
+        for user in user_docs:
+            if not user.exists:
+                continue
+
+            user_data = user.to_dict() or {}
+            user_id = user.id
+            user_email = user_data.get('email', 'Unknown')
+
+            if not user_data.get('notifications_enabled', False):
+                continue
+
+            # Get current time in user's timezone
+            user_timezone = user_data.get('timezone', 'America/New_York')
+            current_time = get_user_current_time(user_timezone)
+
+            print(f"🔍 Checking notifications for user: {user_email} (timezone: {user_timezone}, local time: {current_time.strftime('%I:%M %p')})")
+            
+            # Get notification method
+            notification_methods = user_data.get('notification_methods', [])
+            if not notification_methods:
+                # Fallback to single notification_method
+                notification_methods = [user_data.get('notification_method', 'email')]
                 
             print(f"📬 Notification methods: {notification_methods}")
             
-            # Get all user's tasks
-            tasks_ref = db.collection('users').document(user_id).collection('tasks')
-            all_tasks = list(tasks_ref.stream())
-            
-            print(f"📋 Found {len(all_tasks)} total tasks for {user_email}")
-            
-            # Check each task
-            for task_doc in all_tasks:
-                task_data = task_doc.to_dict()
-                
-                # Skip completed tasks
-                if task_data.get('completed', False):
+            for reminder_ref, reminder in reminders_by_user[user_id].values():
+                task_time_str = reminder['task_time']
+                reminder_minutes = reminder['reminder_minutes']
+
+                # Calculate time difference in minutes
+                time_diff_minutes = (reminder['task_start'] - now_utc).total_seconds() / 60
+
+                # Skip if task is in the past
+                if time_diff_minutes < 0:
                     continue
+
+                print(f"   ⏰ Task: '{reminder.get('title')}' at {task_time_str} ({time_diff_minutes:.1f} min from now, reminder: {reminder_minutes} min)")
                 
-                # Get task time
-                task_time_str = None
-                if task_data.get('startTime'):
-                    task_time_str = task_data.get('startTime')
-                elif task_data.get('time'):
-                    # Handle format like "09:00-10:00" or just "09:00"
-                    time_range = task_data.get('time', '')
-                    if '-' in time_range:
-                        task_time_str = time_range.split('-')[0].strip()
-                    else:
-                        task_time_str = time_range.strip()
-                elif task_data.get('endTime'):
-                    task_time_str = task_data.get('endTime')
+                # Create unique notification key to prevent duplicates
+                # Include reminder time to allow multiple notifications per task
+                notification_key = reminder_notification_key(reminder)
                 
-                if not task_time_str:
-                    continue  # Skip tasks without time
+                # Check if already sent
+                if notification_key in already_sent:
+                    print(f"      ⏭️ Already sent this notification")
+                    continue
                 
-                # Check if task is for today
-                task_day = task_data.get('day', '').lower()
-                task_week_offset = task_data.get('weekOffset', 0)
+                # Format notification message
+                task_title = reminder.get('title', 'Untitled Task')
+                formatted_time = format_time_12hour(task_time_str)
                 
-                # Only process tasks for THIS WEEK (weekOffset 0) and TODAY
-                if task_week_offset != 0:
-                    continue  # Skip tasks from other weeks
-                    
-                if task_day not in [current_day, 'today', '']:
-                    continue  # Skip tasks not scheduled for today
+                # Create contextual message based on time
+                if reminder_minutes >= 1440:  # 1 day or more
+                    notification_title = f"📅 Task Tomorrow"
+                    notification_body = f"{task_title} is scheduled for {formatted_time} tomorrow"
+                elif reminder_minutes >= 60:  # 1 hour or more
+                    hours = reminder_minutes // 60
+                    notification_title = f"⏰ Task in {hours} hour{'s' if hours != 1 else ''}"
+                    notification_body = f"{task_title} starts at {formatted_time}"
+                elif reminder_minutes >= 15:  # 15-60 minutes
+                    notification_title = f"⏱️ Task in {reminder_minutes} minutes"
+                    notification_body = f"{task_title} starts at {formatted_time}"
+                else:  # Less than 15 minutes
+                    notification_title = f"🚨 Task Starting Soon!"
+                    notification_body = f"{task_title} starts at {formatted_time}"
                 
-                # Additional check: Skip very old tasks (created more than 7 days ago)
-                task_created_at = task_data.get('created_at')
-                if task_created_at:
-                    if isinstance(task_created_at, datetime):
-                        days_old = (current_time - task_created_at).days
-                        if days_old > 7:
-                            print(f"   ⏭️ Skipping old task from {days_old} days ago: '{task_data.get('title')}'")
-                            continue
+                # Queue delivery via enabled notification methods
+                reminder_refs_by_key[notification_key] = reminder_ref
                 
-                try:
-                    # Parse task time as naive datetime first
-                    task_datetime_str = f"{today} {task_time_str}"
-                    task_time_naive = datetime.strptime(task_datetime_str, '%Y-%m-%d %H:%M')
-
-                    # Make task_time timezone-aware using the same timezone as current_time
-                    task_time = task_time_naive.replace(tzinfo=current_time.tzinfo)
-
-                    # Calculate time difference in minutes
-                    time_diff_minutes = (task_time - current_time).total_seconds() / 60
-                    
-                    # Skip if task is in the past
-                    if time_diff_minutes < 0:
-                        continue
-                    
-                    print(f"   ⏰ Task: '{task_data.get('title')}' at {task_time_str} ({time_diff_minutes:.1f} min from now)")
-                    
-                    # Check if we should send notification for any of the user's reminder times
-                    notification_sent_for_this_task = False
-                    for reminder_minutes in user_reminder_times:
-                        # Wider tolerance window: Check if we're within the 5-minute cron window BEFORE the reminder time
-                        # This ensures we catch notifications even if cron runs early/late
-                        # Example: For 60-min reminder, send if time_diff is between 57.5-62.5 minutes
-                        tolerance = 10.0  # Increased from 2.5 to 5 minutes for better reliability
-                        
-                        # Also send if we're past the reminder time but within the window (catch-up logic)
-                        min_boundary = reminder_minutes - tolerance
-                        max_boundary = reminder_minutes + tolerance
-                        
-                        if min_boundary <= time_diff_minutes <= max_boundary:
-                            # Found a match! Send notification
-                            print(f"      ✅ MATCH! Time diff {time_diff_minutes:.1f} is within reminder window {min_boundary:.1f}-{max_boundary:.1f} min (target: {reminder_minutes} min)")
-                            
-                            # Create unique notification key to prevent duplicates
-                            # Include reminder time to allow multiple notifications per task
-                            notification_key = f"{user_id}_task_{task_doc.id}_reminder_{reminder_minutes}_{today}"
-                            
-                            # Check if already sent
-                            if check_notification_sent(notification_key):
-                                print(f"      ⏭️ Already sent this notification")
-                                break
-                            
-                            # Format notification message
-                            task_title = task_data.get('title', 'Untitled Task')
-                            formatted_time = format_time_12hour(task_time_str)
-                            
-                            # Create contextual message based on time
-                            if reminder_minutes >= 1440:  # 1 day or more
-                                hours = reminder_minutes // 60
-                                notification_title = f"📅 Task Tomorrow"
-                                notification_body = f"{task_title} is scheduled for {formatted_time} tomorrow"
-                            elif reminder_minutes >= 60:  # 1 hour or more
-                                hours = reminder_minutes // 60
-                                notification_title = f"⏰ Task in {hours} hour{'s' if hours != 1 else ''}"
-                                notification_body = f"{task_title} starts at {formatted_time}"
-                            elif reminder_minutes >= 15:  # 15-60 minutes
-                                notification_title = f"⏱️ Task in {reminder_minutes} minutes"
-                                notification_body = f"{task_title} starts at {formatted_time}"
-                            else:  # Less than 15 minutes
-                                notification_title = f"🚨 Task Starting Soon!"
-                                notification_body = f"{task_title} starts at {formatted_time}"
-                            
-                            # Send via enabled notification methods
-                            notification_sent_successfully = False
-                            
-                            if 'push' in notification_methods:
-                                if send_push_notification(user_id, notification_title, notification_body):
-                                    print(f"      ✅ Push notification sent")
-                                    notification_sent_successfully = True
-                                    notifications_sent += 1
-                                else:
-                                    print(f"      ❌ Failed to send push notification")
-                            
-                            if 'email' in notification_methods and user_data.get('email'):
-                                # Create HTML email
-                                priority_color = {
-                                    'high': '#FF6B6B',
-                                    'medium': '#4ECDC4', 
-                                    'low': '#96CEB4'
-                                }.get(task_data.get('priority', 'medium'), '#4ECDC4')
-                                
-                                email_body = f"""
-                                <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                                    <div style="background: linear-gradient(135deg, #1abc9c, #45B7D1); padding: 20px; color: white; text-align: center; border-radius: 10px 10px 0 0;">
-                                        <h2 style="margin: 0;">{notification_title}</h2>
-                                        <p style="margin: 10px 0 0 0;">{notification_body}</p>
-                                    </div>
-                                    <div style="background: #f8f9fa; padding: 20px; border-radius: 0 0 10px 10px;">
-                                        <div style="background: white; padding: 15px; margin: 10px 0; border-radius: 8px; border-left: 4px solid {priority_color};">
-                                            <h3 style="margin: 0 0 5px 0; color: #2c3e50;">{task_title}</h3>
-                                            <p style="margin: 0; color: #666;"><strong>⏰ Time:</strong> {formatted_time}</p>
-                                            <p style="margin: 5px 0 0 0; color: #666;"><strong>📅 Day:</strong> {task_data.get('day', 'Today')}</p>
-                                            {f'<p style="margin: 5px 0 0 0; color: #666;">{task_data.get("description", "")}</p>' if task_data.get('description') else ''}
-                                        </div>
-                                    </div>
-                                    <div style="text-align: center; padding: 15px; color: #666; font-size: 12px;">
-                                        <p>Good luck with your task! 🚀</p>
-                                    </div>
-                                </div>
-                                """
-                                
-                                if send_email(user_data.get('email'), notification_title, email_body):
-                                    print(f"      ✅ Email notification sent")
-                                    notification_sent_successfully = True
-                                    notifications_sent += 1
-                                else:
-                                    print(f"      ❌ Failed to send email notification")
-                            
-                            # Mark as sent if successful
-                            if notification_sent_successfully:
-                                mark_notification_sent(notification_key)
-                                notification_sent_for_this_task = True
-                            
-                            # Only send one notification per check (prevent multiple reminders in same run)
-                            break
+                if 'push' in notification_methods:
+                    deliveries.append({
+                        'channel': 'push',
+                        'user_id': user_id,
+                        'title': notification_title,
+                        'body': notification_body,
+                        'key': notification_key,
+                        'subscriptions': get_push_subscriptions(user_id, user_data)
+                    })
+                
+                if 'email' in notification_methods and user_data.get('email'):
+                    # Create HTML email
+                    priority_color = {
+                        'high': '#FF6B6B',
+                        'medium': '#4ECDC4', 
+                        'low': '#96CEB4'
+                    }.get(reminder.get('priority', 'medium'), '#4ECDC4')
                     
-                    # Debug: Show why notification wasn't sent if we checked reminders
-                    if not notification_sent_for_this_task and len(user_reminder_times) > 0:
-                        closest_reminder = min(user_reminder_times, key=lambda x: abs(x - time_diff_minutes))
-                        diff_from_closest = abs(time_diff_minutes - closest_reminder)
-                        print(f"      ⏭️ No match. Closest reminder: {closest_reminder} min (diff: {diff_from_closest:.1f} min, need ≤5.0 min)")
+                    email_body = f"""
+                    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+                        <div style="background: linear-gradient(135deg, #1abc9c, #45B7D1); padding: 20px; color: white; text-align: center; border-radius: 10px 10px 0 0;">
+                            <h2 style="margin: 0;">{notification_title}</h2>
+                            <p style="margin: 10px 0 0 0;">{notification_body}</p>
+                        </div>
+                        <div style="background: #f8f9fa; padding: 20px; border-radius: 0 0 10px 10px;">
+                            <div style="background: white; padding: 15px; margin: 10px 0; border-radius: 8px; border-left: 4px solid {priority_color};">
+                                <h3 style="margin: 0 0 5px 0; color: #2c3e50;">{task_title}</h3>
+                                <p style="margin: 0; color: #666;"><strong>⏰ Time:</strong> {formatted_time}</p>
+                                <p style="margin: 5px 0 0 0; color: #666;"><strong>📅 Day:</strong> {reminder.get('day', 'Today')}</p>
+                                {f'<p style="margin: 5px 0 0 0; color: #666;">{reminder.get("description", "")}</p>' if reminder.get('description') else ''}
+                            </div>
+                        </div>
+                        <div style="text-align: center; padding: 15px; color: #666; font-size: 12px;">
+                            <p>Good luck with your task! 🚀</p>
+                        </div>
+                    </div>
+                    """
                     
-                except ValueError as e:
-                    print(f"   ⚠️ Could not parse task time '{task_time_str}': {e}")
-                    continue
+                    deliveries.append({
+                        'channel': 'email',
+                        'user_id': user_id,
+                        'recipient': user_data.get('email'),
+                        'title': notification_title,
+                        'body': email_body,
+                        'key': notification_key
+                    })
+
+        def record_delivered(delivered_keys):
+            # Mark as sent if any method succeeded; the index entry is no longer needed
+            mark_notifications_sent(delivered_keys)
+            # Delivered reminders are removed so later ticks in the window don't re-read them
+            commit_batched_writes([('delete', reminder_refs_by_key[key], None) for key in delivered_keys])
+
+        results, _ = dispatch_notifications(deliveries, shard_run_name('task_reminders', shard), on_late_delivery=record_delivered)
+        notifications_sent = sum(1 for sent in results if sent)
+        record_delivered(get_delivered_keys(deliveries, results))
         
         if notifications_sent > 0:
             print(f"🎯 Sent {notifications_sent} task notifications")
@@ -1009,242 +2446,350 @@ def check_and_send_notifications():
         print(f"Full traceback: {traceback.format_exc()}")
         return 0
 
-def send_daily_summary():
-    """Send daily summary of completed tasks"""
-    if not db:
-        print("⚠️ Database not available for daily summary")
-        return
-        
-    try:
-        print("📊 Generating daily summaries...")
-        users_ref = db.collection('users')
-        # Get all users with notifications enabled - we'll check daily_summary individually
-        users = users_ref.where(filter=firestore.FieldFilter('notifications_enabled', '==', True)).stream()
-        user_list = list(users)
-        print(f"📊 Found {len(user_list)} users with notifications enabled")
+# ===== DAILY SUMMARY PIPELINE =====
+# send_daily_summary is a single streaming pass of chained generators:
+#   paged summary_schedule query -> due/dedupe filter -> load users -> load today's tasks -> render -> deliver
+# Entries flow through in chunks so the dedupe check and user loads are one batched
+# read per chunk, and each relevant user document is read exactly once. Each stage
+# bumps a counter (and its time) in the run's stats for benchmarking; the latest
+# stats per run are kept in notification_pipeline_stats.
+SUMMARY_PIPELINE_CHUNK_SIZE = 100
+SUMMARY_DISPATCH_CHUNK_SIZE = SMTP_BATCH_SIZE * NOTIFICATION_CHANNEL_LIMITS['email']  # Rendered deliveries held at once
+DAILY_SUMMARY_STAGES = ['scheduled', 'due', 'already_sent', 'users_loaded', 'disabled', 'tasks_loaded', 'rendered', 'deliveries', 'delivered']
+
+notification_pipeline_stats = {}  # run name -> stage counters of the latest run
+
+def new_pipeline_stats(stages):
+    """Zeroed counters plus per-stage seconds for a pipeline run"""
+    return {'counts': {stage: 0 for stage in stages}, 'seconds': {}}
+
+def record_stage_time(stats, stage, started):
+    """Add the time spent since started (time.monotonic()) to a stage"""
+    stats['seconds'][stage] = stats['seconds'].get(stage, 0.0) + time.monotonic() - started
+
+def chunked(items, size):
+    """Yield lists of up to size items from any iterable without materializing it"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def timed_stream(items, stats, stage):
+    """Pass items through while timing how long the source takes to produce them"""
+    iterator = iter(items)
+    while True:
+        started = time.monotonic()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            record_stage_time(stats, stage, started)
+            return
+        record_stage_time(stats, stage, started)
+        yield item
+
+def filter_due_summaries(entries, stats, now_utc):
+    """
+    Stage: keep schedule entries due now that haven't been sent today.
 
-        for user in user_list:
-            user_data = user.to_dict()
-            # Add explicit logging
-            print(f"Checking {user_data.get('email')}: daily_summary={user_data.get('daily_summary', False)}")
+    The notification key only needs the user's local date, which the schedule entry's
+    timezone gives without reading the user document. Keys are checked a chunk at a
+    time with prefetch_sent_notifications (one batched read per chunk).
 
-        summaries_sent = 0
-        users_checked = 0
+    Yields:
+        tuple: (uid, local time now, notification key)
+    """
+    for chunk in chunked(entries, SUMMARY_PIPELINE_CHUNK_SIZE):
+        started = time.monotonic()
+        candidates = []
+        for entry in chunk:
+            stats['counts']['scheduled'] += 1
+            today = now_utc.astimezone(get_user_timezone(entry))
+            candidates.append((entry['uid'], today, f"{entry['uid']}_daily_summary_{today.strftime('%Y-%m-%d')}"))
+        stats['counts']['due'] += len(candidates)
+
+        already_sent = prefetch_sent_notifications(key for _, _, key in candidates)
+        stats['counts']['already_sent'] += len(already_sent)
+        record_stage_time(stats, 'dedupe', started)
+
+        for candidate in candidates:
+            if candidate[2] not in already_sent:
+                yield candidate
+
+def load_summary_users(candidates, stats):
+    """
+    Stage: load the user documents of due candidates, one get_all per chunk.
 
-        for user in users:
-            users_checked += 1
-            user_data = user.to_dict()
-            user_id = user.id
-            user_email = user_data.get('email', 'Unknown')
+    Users who turned daily summaries or notifications off since the schedule entry
+    was written are dropped.
 
-            # Only send if user has daily_summary enabled (check here instead of in query)
-            if not user_data.get('daily_summary', False):
-                print(f"⏭️ Skipping daily summary for {user_email} - daily summary disabled")
+    Yields:
+        tuple: (uid, user_data, local time now, notification key)
+    """
+    users_ref = db.collection('users')
+    for chunk in chunked(candidates, SUMMARY_PIPELINE_CHUNK_SIZE):
+        started = time.monotonic()
+        user_docs = {doc.id: doc for doc in db.get_all([users_ref.document(uid) for uid, _, _ in chunk])}
+        record_stage_time(stats, 'load_users', started)
+
+        for uid, today, notification_key in chunk:
+            user_doc = user_docs.get(uid)
+            if user_doc is None or not user_doc.exists:
                 continue
+            stats['counts']['users_loaded'] += 1
+            user_data = user_doc.to_dict() or {}
+            if not (user_data.get('notifications_enabled', False) and user_data.get('daily_summary', False)):
+                stats['counts']['disabled'] += 1
+                continue
+            yield uid, user_data, today, notification_key
 
-            # Get user's timezone (default to America/New_York if not set)
-            user_timezone = user_data.get('timezone', 'America/New_York')
-            today = get_user_current_time(user_timezone)
+def load_summary_tasks(users, stats):
+    """
+    Stage: load each user's tasks for today and split them into completed/pending.
 
-            # Get user's preferred daily summary time (default to 23:30 / 11:30 PM)
-            daily_summary_time = user_data.get('daily_summary_time', '23:30')
+    Yields:
+        dict: Summary context (uid, user_data, notification_key, all_today_tasks,
+              completed_tasks, pending_tasks)
+    """
+    for uid, user_data, today, notification_key in users:
+        started = time.monotonic()
 
-            # Parse the user's preferred time
-            try:
-                summary_hour, summary_minute = map(int, daily_summary_time.split(':'))
-                current_hour = today.hour
-                current_minute = today.minute
-
-                # Check if it's within 5 minutes of the user's preferred time
-                # This gives a 10-minute window for the cron job to catch it
-                time_match = (
-                    (current_hour == summary_hour and abs(current_minute - summary_minute) <= 5) or
-                    (current_hour == summary_hour - 1 and current_minute >= 55 and summary_minute <= 5)
-                )
+        completed_tasks = []
+        pending_tasks = []
+        all_today_tasks = []
 
-                if not time_match:
-                    print(f"⏭️ Skipping {user_email} - not their summary time yet (current: {today.strftime('%H:%M')}, preferred: {daily_summary_time})")
-                    continue
+        # Read only the tasks scheduled for today (normalized date field)
+        for task_data in get_tasks_for_date(uid, today.strftime('%Y-%m-%d')):
+            all_today_tasks.append(task_data)
+            if task_data.get('completed', False):
+                completed_tasks.append(task_data)
+            else:
+                pending_tasks.append(task_data)
+
+        stats['counts']['tasks_loaded'] += 1
+        record_stage_time(stats, 'load_tasks', started)
+        yield {
+            'uid': uid,
+            'user_data': user_data,
+            'notification_key': notification_key,
+            'all_today_tasks': all_today_tasks,
+            'completed_tasks': completed_tasks,
+            'pending_tasks': pending_tasks
+        }
 
-                print(f"✅ Time match for {user_email}! Current: {today.strftime('%H:%M')}, Preferred: {daily_summary_time}")
+def render_daily_summary_email(all_today_tasks, completed_tasks, pending_tasks):
+    """Build the daily summary email, returning (subject, html body)"""
+    completed_today = completed_tasks[:10]  # Limit to 10 most recent
+
+    # Calculate productivity stats
+    total_count = len([t for t in all_today_tasks if not t.get('completed', False)]) + len(completed_tasks)
+    completion_rate = (len(completed_tasks) / max(total_count, 1)) * 100 if total_count else 100
+
+    subject = f"📊 Daily Summary - {len(all_today_tasks)} Tasks Today ({len(completed_today)} Completed)"
+
+    # Create beautiful HTML email
+    body = f"""
+    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
+        <div style="background: linear-gradient(135deg, #28a745, #20c997); padding: 20px; color: white; text-align: center; border-radius: 10px 10px 0 0;">
+            <h2 style="margin: 0;">📊 Daily Task Summary</h2>
+            <p style="margin: 10px 0 0 0; font-size: 18px;">Here's how your day went!</p>
+        </div>
+
+        <div style="background: #f8f9fa; padding: 20px;">
+            <div style="background: white; padding: 15px; margin-bottom: 15px; border-radius: 8px; text-align: center;">
+                <h3 style="margin: 0; color: #2c3e50;">📈 Today's Task Overview</h3>
+                <div style="display: flex; justify-content: space-around; margin: 15px 0; text-align: center;">
+                    <div style="flex: 1;">
+                        <p style="margin: 0; font-size: 24px; color: #28a745;"><strong>{len(completed_today)}</strong></p>
+                        <p style="margin: 5px 0 0 0; color: #666; font-size: 14px;">✅ Completed</p>
+                    </div>
+                    <div style="flex: 1;">
+                        <p style="margin: 0; font-size: 24px; color: #ffc107;"><strong>{len(pending_tasks)}</strong></p>
+                        <p style="margin: 5px 0 0 0; color: #666; font-size: 14px;">⏳ Pending</p>
+                    </div>
+                    <div style="flex: 1;">
+                        <p style="margin: 0; font-size: 24px; color: #17a2b8;"><strong>{len(all_today_tasks)}</strong></p>
+                        <p style="margin: 5px 0 0 0; color: #666; font-size: 14px;">📋 Total Today</p>
+                    </div>
+                </div>
+            </div>
+    """
 
-            except (ValueError, AttributeError) as e:
-                print(f"⚠️ Invalid daily_summary_time '{daily_summary_time}' for {user_email}, skipping")
-                continue
+    if completed_today:
+        body += '<h3 style="color: #2c3e50; margin: 15px 0 10px 0;">✅ Recently Completed:</h3>'
+
+        for task in completed_today[:6]:  # Show max 6 tasks
+            priority_color = {
+                'high': '#FF6B6B',
+                'medium': '#4ECDC4', 
+                'low': '#96CEB4'
+            }.get(task.get('priority', 'medium'), '#4ECDC4')
+
+            body += f"""
+            <div style="background: white; padding: 12px; margin: 8px 0; border-radius: 6px; border-left: 4px solid {priority_color};">
+                <strong style="color: #2c3e50;">✅ {task.get('title', 'Untitled Task')}</strong>
+                {f'<p style="margin: 5px 0 0 0; color: #666; font-size: 14px;">{task.get("description", "")}</p>' if task.get('description') else ''}
+                <p style="margin: 5px 0 0 0; color: #999; font-size: 12px;">Day: {task.get('day', 'Today')}</p>
+            </div>
+            """
+
+        if len(completed_today) > 6:
+            body += f'<p style="text-align: center; color: #666;">...and {len(completed_today) - 6} more tasks completed today!</p>'
+
+    # Show pending tasks
+    if pending_tasks:
+        body += '<h3 style="color: #2c3e50; margin: 15px 0 10px 0;">⏳ Still To Do Today:</h3>'
+
+        for task in pending_tasks[:4]:  # Show max 4 pending tasks
+            priority_color = {
+                'high': '#FF6B6B',
+                'medium': '#4ECDC4', 
+                'low': '#96CEB4'
+            }.get(task.get('priority', 'medium'), '#4ECDC4')
+
+            task_time = task.get('startTime') or task.get('time') or task.get('endTime')
+            formatted_task_time = format_time_12hour(task_time) if task_time else ""
+            time_info = f" at {formatted_task_time}" if formatted_task_time else ""
+
+            body += f"""
+            <div style="background: #fff3cd; padding: 12px; margin: 8px 0; border-radius: 6px; border-left: 4px solid {priority_color};">
+                <strong style="color: #2c3e50;">⏳ {task.get('title', 'Untitled Task')}{time_info}</strong>
+                {f'<p style="margin: 5px 0 0 0; color: #666; font-size: 14px;">{task.get("description", "")}</p>' if task.get('description') else ''}
+                <p style="margin: 5px 0 0 0; color: #856404; font-size: 12px;">Priority: {task.get('priority', 'medium').title()}</p>
+            </div>
+            """
+
+        if len(pending_tasks) > 4:
+            body += f'<p style="text-align: center; color: #666;">...and {len(pending_tasks) - 4} more tasks to complete!</p>'
+    elif not completed_today:
+        body += '<div style="background: #e2e3e5; padding: 15px; border-radius: 8px; text-align: center;"><p style="margin: 0; color: #6c757d;">No tasks scheduled for today. Great day to plan ahead! 📅</p></div>'
+
+    # Add motivational message
+    motivation = random.choice(INSPIRATIONAL_MESSAGES)
+    body += f"""
+        </div>
+
+        <div style="background: linear-gradient(135deg, #6c5ce7, #a29bfe); padding: 15px; color: white; text-align: center; border-radius: 0 0 10px 10px;">
+            <p style="margin: 0; font-size: 16px;">✨ {motivation}</p>
+            <p style="margin: 10px 0 0 0; font-size: 14px;">Ready to conquer tomorrow? �</p>
+        </div>
+    </div>
+    """
 
-            print(f"📋 Generating summary for user: {user_email} (timezone: {user_timezone}, local time: {today.strftime('%I:%M %p')})")
+    return subject, body
 
-            # Get ALL tasks from today (for testing)
-            tasks_ref = db.collection('users').document(user_id).collection('tasks')
-            all_tasks = list(tasks_ref.stream())
+def render_daily_summary_push(completed_tasks, pending_tasks):
+    """Build the concise daily summary push message"""
+    completed_today = completed_tasks[:10]
+    message = f"Daily Summary: {len(completed_today)} tasks completed, {len(pending_tasks)} pending. "
+    if pending_tasks:
+        next_task = pending_tasks[0].get('title', 'Untitled')[:40]
+        message += f"Next up: {next_task}. "
+    message += random.choice(INSPIRATIONAL_MESSAGES)[:80]
+    return message
 
-            current_day = today.strftime('%A').lower()
-            today_date = today.strftime('%Y-%m-%d')
-            
-            completed_tasks = []
-            pending_tasks = []
-            all_today_tasks = []
-            
-            # Get all tasks scheduled for today
-            for task_doc in all_tasks:
-                task_data = task_doc.to_dict()
-                task_day = task_data.get('day', '').lower()
-                
-                # Check if task is for today
-                if task_day == current_day or task_day == 'today' or not task_day:
-                    all_today_tasks.append(task_data)
-                    if task_data.get('completed', False):
-                        completed_tasks.append(task_data)
-                    else:
-                        pending_tasks.append(task_data)
-            
-            # For testing: always show summary even with no tasks
-            completed_today = completed_tasks[:10]  # Limit to 10 most recent
-            
-            # For testing: always send summary (even if no tasks)
-            if True:  # Always send for testing
-                # Create unique notification key for daily summary
-                notification_key = f"{user_id}_daily_summary_{today_date}"
-                
-                # Use the proper Firestore-backed check
-                if check_notification_sent(notification_key):
-                    print(f"⏭️ Skipping daily summary notification for {user_email} - already sent today")
-                    continue
+def render_daily_summaries(summaries, stats):
+    """
+    Stage: render each summary into deliveries for the user's notification methods.
 
-                # Support multiple notification methods
-                notification_methods = user_data.get('notification_methods', [user_data.get('notification_method', 'email')])
-                if not isinstance(notification_methods, list):
-                    notification_methods = [notification_methods]
+    Yields:
+        dict: Delivery dicts for dispatch_notifications
+    """
+    for summary in summaries:
+        started = time.monotonic()
+        user_id = summary['uid']
+        user_data = summary['user_data']
+
+        # Support multiple notification methods
+        notification_methods = user_data.get('notification_methods', [user_data.get('notification_method', 'email')])
+        if not isinstance(notification_methods, list):
+            notification_methods = [notification_methods]
+
+        deliveries = []
+        if 'email' in notification_methods and user_data.get('email'):
+            subject, body = render_daily_summary_email(summary['all_today_tasks'], summary['completed_tasks'], summary['pending_tasks'])
+            deliveries.append({
+                'channel': 'email',
+                'user_id': user_id,
+                'recipient': user_data.get('email'),
+                'title': subject,
+                'body': body,
+                'key': summary['notification_key']
+            })
 
-                summary_sent = False
+        if 'push' in notification_methods:
+            deliveries.append({
+                'channel': 'push',
+                'user_id': user_id,
+                'title': "📊 Daily Summary",
+                'body': render_daily_summary_push(summary['completed_tasks'], summary['pending_tasks']),
+                'key': summary['notification_key'],
+                'subscriptions': get_push_subscriptions(user_id, user_data)
+            })
 
-                if 'email' in notification_methods and user_data.get('email'):
-                    # Calculate productivity stats
-                    total_count = len([t for t in all_today_tasks if not t.get('completed', False)]) + len(completed_tasks)
-                    completion_rate = (len(completed_tasks) / max(total_count, 1)) * 100 if total_count else 100
-                    
-                    subject = f"📊 Daily Summary - {len(all_today_tasks)} Tasks Today ({len(completed_today)} Completed)"
-                    
-                    # Create beautiful HTML email
-                    body = f"""
-                    <div style="font-family: Arial, sans-serif; max-width: 600px; margin: 0 auto;">
-                        <div style="background: linear-gradient(135deg, #28a745, #20c997); padding: 20px; color: white; text-align: center; border-radius: 10px 10px 0 0;">
-                            <h2 style="margin: 0;">📊 Daily Task Summary</h2>
-                            <p style="margin: 10px 0 0 0; font-size: 18px;">Here's how your day went!</p>
-                        </div>
-                        
-                        <div style="background: #f8f9fa; padding: 20px;">
-                            <div style="background: white; padding: 15px; margin-bottom: 15px; border-radius: 8px; text-align: center;">
-                                <h3 style="margin: 0; color: #2c3e50;">📈 Today's Task Overview</h3>
-                                <div style="display: flex; justify-content: space-around; margin: 15px 0; text-align: center;">
-                                    <div style="flex: 1;">
-                                        <p style="margin: 0; font-size: 24px; color: #28a745;"><strong>{len(completed_today)}</strong></p>
-                                        <p style="margin: 5px 0 0 0; color: #666; font-size: 14px;">✅ Completed</p>
-                                    </div>
-                                    <div style="flex: 1;">
-                                        <p style="margin: 0; font-size: 24px; color: #ffc107;"><strong>{len(pending_tasks)}</strong></p>
-                                        <p style="margin: 5px 0 0 0; color: #666; font-size: 14px;">⏳ Pending</p>
-                                    </div>
-                                    <div style="flex: 1;">
-                                        <p style="margin: 0; font-size: 24px; color: #17a2b8;"><strong>{len(all_today_tasks)}</strong></p>
-                                        <p style="margin: 5px 0 0 0; color: #666; font-size: 14px;">📋 Total Today</p>
-                                    </div>
-                                </div>
-                            </div>
-                    """
-                    
-                    if completed_today:
-                        body += '<h3 style="color: #2c3e50; margin: 15px 0 10px 0;">✅ Recently Completed:</h3>'
-                        
-                        for task in completed_today[:6]:  # Show max 6 tasks
-                            priority_color = {
-                                'high': '#FF6B6B',
-                                'medium': '#4ECDC4', 
-                                'low': '#96CEB4'
-                            }.get(task.get('priority', 'medium'), '#4ECDC4')
-                            
-                            body += f"""
-                            <div style="background: white; padding: 12px; margin: 8px 0; border-radius: 6px; border-left: 4px solid {priority_color};">
-                                <strong style="color: #2c3e50;">✅ {task.get('title', 'Untitled Task')}</strong>
-                                {f'<p style="margin: 5px 0 0 0; color: #666; font-size: 14px;">{task.get("description", "")}</p>' if task.get('description') else ''}
-                                <p style="margin: 5px 0 0 0; color: #999; font-size: 12px;">Day: {task.get('day', 'Today')}</p>
-                            </div>
-                            """
-                        
-                        if len(completed_today) > 6:
-                            body += f'<p style="text-align: center; color: #666;">...and {len(completed_today) - 6} more tasks completed today!</p>'
-                    
-                    # Show pending tasks
-                    if pending_tasks:
-                        body += '<h3 style="color: #2c3e50; margin: 15px 0 10px 0;">⏳ Still To Do Today:</h3>'
-                        
-                        for task in pending_tasks[:4]:  # Show max 4 pending tasks
-                            priority_color = {
-                                'high': '#FF6B6B',
-                                'medium': '#4ECDC4', 
-                                'low': '#96CEB4'
-                            }.get(task.get('priority', 'medium'), '#4ECDC4')
-                            
-                            task_time = task.get('startTime') or task.get('time') or task.get('endTime')
-                            formatted_task_time = format_time_12hour(task_time) if task_time else ""
-                            time_info = f" at {formatted_task_time}" if formatted_task_time else ""
-                            
-                            body += f"""
-                            <div style="background: #fff3cd; padding: 12px; margin: 8px 0; border-radius: 6px; border-left: 4px solid {priority_color};">
-                                <strong style="color: #2c3e50;">⏳ {task.get('title', 'Untitled Task')}{time_info}</strong>
-                                {f'<p style="margin: 5px 0 0 0; color: #666; font-size: 14px;">{task.get("description", "")}</p>' if task.get('description') else ''}
-                                <p style="margin: 5px 0 0 0; color: #856404; font-size: 12px;">Priority: {task.get('priority', 'medium').title()}</p>
-                            </div>
-                            """
-                        
-                        if len(pending_tasks) > 4:
-                            body += f'<p style="text-align: center; color: #666;">...and {len(pending_tasks) - 4} more tasks to complete!</p>'
-                    elif not completed_today:
-                        body += '<div style="background: #e2e3e5; padding: 15px; border-radius: 8px; text-align: center;"><p style="margin: 0; color: #6c757d;">No tasks scheduled for today. Great day to plan ahead! 📅</p></div>'
-                    
-                    # Add motivational message
-                    motivation = random.choice(INSPIRATIONAL_MESSAGES)
-                    body += f"""
-                        </div>
-                        
-                        <div style="background: linear-gradient(135deg, #6c5ce7, #a29bfe); padding: 15px; color: white; text-align: center; border-radius: 0 0 10px 10px;">
-                            <p style="margin: 0; font-size: 16px;">✨ {motivation}</p>
-                            <p style="margin: 10px 0 0 0; font-size: 14px;">Ready to conquer tomorrow? �</p>
-                        </div>
-                    </div>
-                    """
-                    
-                    if send_email(user_data.get('email'), subject, body):
-                        summary_sent = True
-                        print(f"✅ Daily summary email sent to {user_email}")
-                    else:
-                        print(f"❌ Failed to send summary email to {user_email}")
+        stats['counts']['rendered'] += 1
+        record_stage_time(stats, 'render', started)
+        yield from deliveries
 
-                if 'push' in notification_methods:
-                    # Push notification summary (concise but informative)
-                    message = f"Daily Summary: {len(completed_today)} tasks completed, {len(pending_tasks)} pending. "
-                    if pending_tasks:
-                        next_task = pending_tasks[0].get('title', 'Untitled')[:40]
-                        message += f"Next up: {next_task}. "
-                    message += random.choice(INSPIRATIONAL_MESSAGES)[:80]
-                    
-                    if send_push_notification(user_id, "📊 Daily Summary", message):
-                        summary_sent = True
-                        print(f"✅ Push summary sent to user {user_id}")
-                    else:
-                        print(f"❌ Failed to send push summary to user {user_id}")
+def send_daily_summary(shard=None):
+    """
+    Send daily summaries to the users whose summary time falls in this tick.
 
-                # Mark as sent if any method succeeded
-                if summary_sent:
-                    mark_notification_sent(notification_key)
-                    summaries_sent += 1
-            else:
-                print(f"📋 No completed tasks found for {user_email}")
+    Runs the daily summary pipeline (see DAILY SUMMARY PIPELINE) and records its
+    per-stage counters in notification_pipeline_stats.
+
+    Args:
+        shard (tuple): (index, count) to only handle that shard's users; None for all
+
+    Returns:
+        int: Number of users who received a summary
+    """
+    if not db:
+        print("⚠️ Database not available for daily summary")
+        return
+        
+    run_name = shard_run_name('daily_summary', shard)
+    stats = new_pipeline_stats(DAILY_SUMMARY_STAGES)
+    run_started = time.monotonic()
+    try:
+        print("📊 Generating daily summaries...")
+        now_utc = datetime.now(ZoneInfo('UTC'))
+
+        entries = timed_stream(stream_due_summary_entries(now_utc, shard=shard), stats, 'query')
+        candidates = filter_due_summaries(entries, stats, now_utc)
+        users = load_summary_users(candidates, stats)
+        summaries = load_summary_tasks(users, stats)
+        deliveries = render_daily_summaries(summaries, stats)
+
+        # Rendered emails/pushes are dispatched in bounded chunks as they are produced,
+        # so memory stays flat however many users are due in this tick
+        sent_keys = set()  # A user's email and push can land in different chunks
+        run_deadline = run_started + NOTIFICATION_RUN_TIMEOUT
+        for delivery_chunk in chunked(deliveries, SUMMARY_DISPATCH_CHUNK_SIZE):
+            stats['counts']['deliveries'] += len(delivery_chunk)
+            started = time.monotonic()
+            results, _ = dispatch_notifications(delivery_chunk, run_name, on_late_delivery=mark_notifications_sent,
+                                                timeout=max(0, run_deadline - started))
+
+            # Mark as sent if any method succeeded
+            delivered_keys = get_delivered_keys(delivery_chunk, results)
+            mark_notifications_sent(delivered_keys)
+            record_stage_time(stats, 'deliver', started)
+            sent_keys |= delivered_keys
+            stats['counts']['delivered'] = len(sent_keys)
+            if time.monotonic() >= run_deadline:
+                # Users not rendered yet stay unsent; the next tick retries those still inside the window
+                print(f"⏱️ {run_name}: run timeout reached, leaving the remaining summaries unsent")
+                break
+        summaries_sent = len(sent_keys)
         
         if summaries_sent > 0:
-            print(f"🎯 Sent {summaries_sent} daily summaries (checked {users_checked} users)")
+            print(f"🎯 Sent {summaries_sent} daily summaries (pipeline: {stats['counts']})")
         else:
-            print(f"📊 No daily summaries sent (checked {users_checked} users, none had daily_summary enabled or already sent)")
+            print(f"📊 No daily summaries sent (pipeline: {stats['counts']})")
         
         return summaries_sent
             
@@ -1253,6 +2798,10 @@ def send_daily_summary():
         import traceback
         print(f"Full traceback: {traceback.format_exc()}")
         return 0
+    finally:
+        stats['elapsed_seconds'] = round(time.monotonic() - run_started, 3)
+        stats['seconds'] = {stage: round(seconds, 4) for stage, seconds in stats['seconds'].items()}
+        notification_pipeline_stats[run_name] = stats
 
 def analyze_user_preferences(uid):
     """Analyze user's task history to learn preferences and patterns"""
@@ -1390,9 +2939,9 @@ def get_user_preferences(uid):
     try:
         combined_preferences = {}
         
-        # Load explicit preferences from preferences collection
-        user_ref = db.collection('users').document(uid)
-        prefs_doc = user_ref.collection('preferences').document('main').get()
+        # Load explicit preferences and the user doc (for stored analysis) in one read
+        user_ref = user_doc_ref(uid)
+        prefs_doc, user_doc = get_request_docs(user_preferences_ref(uid), user_ref)
         
         if prefs_doc.exists:
             explicit_prefs = prefs_doc.to_dict()
@@ -1403,8 +2952,6 @@ def get_user_preferences(uid):
             print(f"ℹ️ No explicit preferences found for user {uid}")
         
         # Check if historical analysis exists and is recent
-        user_doc = user_ref.get()
-        
         if user_doc.exists:
             user_data = user_doc.to_dict()
             stored_analysis = user_data.get('ai_preferences', {})
@@ -1443,6 +2990,7 @@ def get_user_preferences(uid):
                 'ai_preferences': historical_analysis,
                 'preferences_last_updated': datetime.now()
             })
+            forget_request_docs(user_ref)
             print(f"💾 Stored updated historical analysis for user {uid}")
         
         return combined_preferences
@@ -1465,7 +3013,7 @@ def analyze_task_completion_patterns(uid):
         cutoff_date = datetime.now() - timedelta(days=30)
         
         analytics_ref = db.collection('users').document(uid).collection('task_analytics')
-        analytics_docs = analytics_ref.where('timestamp', '>=', cutoff_date).stream()
+        analytics_docs = counted_stream(analytics_ref.where('timestamp', '>=', cutoff_date))
         
         completed_tasks = []
         abandoned_tasks = []
@@ -1625,8 +3173,14 @@ def generate_preference_context(preferences):
     
     return ""
 
-def send_sporadic_inspiration():
-    """Send sporadic inspiration messages throughout the day to engaged users"""
+def send_sporadic_inspiration(shard=None):
+    """
+    Send sporadic inspiration messages throughout the day to engaged users.
+
+    Args:
+        shard (tuple): (index, count) to only read that shard's users by shard_slot
+                       (composite index on notifications_enabled + shard_slot); None for all
+    """
     if not db:
         print("⚠️ Database not available for sporadic inspiration")
         return
@@ -1635,9 +3189,12 @@ def send_sporadic_inspiration():
         print("💫 Checking for sporadic inspiration sending...")
         users_ref = db.collection('users')
         # Get users with notifications enabled and auto_inspiration enabled (default to true if not set)
-        users = users_ref.where(filter=firestore.FieldFilter('notifications_enabled', '==', True)).stream()
+        users = shard_slot_query(
+            users_ref.where(filter=firestore.FieldFilter('notifications_enabled', '==', True)), shard
+        ).stream()
 
-        inspirations_sent = 0
+        deliveries = []
+        pending_history = {}  # delivery key -> (inspiration_history_ref, history record)
 
         for user in users:
             user_data = user.to_dict()
@@ -1663,46 +3220,10 @@ def send_sporadic_inspiration():
             # Check if user needs inspiration (based on activity and busy schedule)
             should_send = False
 
-            # Get user's recent activity - only get today's tasks to improve performance
-            tasks_ref = db.collection('users').document(user_id).collection('tasks')
-
-            # Get today's tasks more efficiently by filtering on current day and date
-            today_tasks = []
-            completed_today = 0
-
-            current_day = current_time.strftime('%A').lower()
+            # Get user's recent activity - only today's tasks, filtered by the query
             today_date = current_time.strftime('%Y-%m-%d')
-            
-            # Get all tasks and filter properly for today only
-            all_tasks = list(tasks_ref.stream())
-            
-            for task_doc in all_tasks:
-                task_data = task_doc.to_dict()
-                task_day = task_data.get('day', '').lower()
-                task_date = task_data.get('date', '')  # Check if there's a date field
-                created_date = task_data.get('created_at')
-                
-                # More precise filtering for today's tasks
-                is_today_task = False
-                
-                # Method 1: Check if task day matches current day name
-                if task_day == current_day:
-                    is_today_task = True
-                
-                # Method 2: Check if task has today's date
-                elif task_date == today_date:
-                    is_today_task = True
-                
-                # Method 3: Check if task was created today and has no specific day set
-                elif created_date and isinstance(created_date, datetime):
-                    if created_date.strftime('%Y-%m-%d') == today_date and not task_day:
-                        is_today_task = True
-                
-                # Only include if it's actually a today task
-                if is_today_task:
-                    today_tasks.append(task_data)
-                    if task_data.get('completed', False):
-                        completed_today += 1
+            today_tasks = get_tasks_for_date(user_id, today_date)
+            completed_today = sum(1 for task_data in today_tasks if task_data.get('completed', False))
             
             print(f"📊 User {user_email}: Found {len(today_tasks)} tasks for today ({completed_today} completed)")
             
@@ -1774,7 +3295,14 @@ def send_sporadic_inspiration():
             if not isinstance(notification_methods, list):
                 notification_methods = [notification_methods]
 
-            inspiration_sent = False
+            inspiration_key = f"{user_id}_inspiration_{today_date}_{inspirations_sent_count + 1}"
+            pending_history[inspiration_key] = (inspiration_history_ref, {
+                'date': today_date,
+                'sent_at': current_time,
+                'message': message,
+                'count': inspirations_sent_count + 1,
+                'methods': notification_methods
+            })
 
             if 'email' in notification_methods and user_data.get('email'):
                 subject = "💫 A Little Motivation For Your Day"
@@ -1795,38 +3323,47 @@ def send_sporadic_inspiration():
                 </div>
                 """
 
-                if send_email(user_data.get('email'), subject, body):
-                    inspiration_sent = True
-                    print(f"✅ Sporadic inspiration email sent to {user_email}")
-                else:
-                    print(f"❌ Failed to send sporadic inspiration email to {user_email}")
+                deliveries.append({
+                    'channel': 'email',
+                    'user_id': user_id,
+                    'recipient': user_data.get('email'),
+                    'title': subject,
+                    'body': body,
+                    'key': inspiration_key
+                })
 
             if 'push' in notification_methods:
                 push_message = f"💫 {message}"
                 if total_today > 3:
                     push_message += f" You've got {total_today} tasks today - you've got this! 🏆"
 
-                if send_push_notification(user_id, "✨ Sporadic Inspiration", push_message):
-                    inspiration_sent = True
-                    print(f"✅ Sporadic inspiration push sent to user {user_id}")
-                else:
-                    print(f"❌ Failed to send sporadic inspiration push to {user_id}")
+                deliveries.append({
+                    'channel': 'push',
+                    'user_id': user_id,
+                    'title': "✨ Sporadic Inspiration",
+                    'body': push_message,
+                    'key': inspiration_key,
+                    'subscriptions': get_push_subscriptions(user_id, user_data)
+                })
 
-            # Record in inspiration history if any method succeeded
-            if inspiration_sent:
+        def record_delivered(delivered_keys):
+            # Record in inspiration history if any method succeeded (once per key, even
+            # if a late unit reports the same key again)
+            for inspiration_key in delivered_keys:
+                pending = pending_history.pop(inspiration_key, None)
+                if pending is None:
+                    continue
+                inspiration_history_ref, history_record = pending
                 try:
-                    inspiration_history_ref.add({
-                        'date': today_date,
-                        'sent_at': current_time,
-                        'message': message,
-                        'count': inspirations_sent_count + 1,
-                        'methods': notification_methods
-                    })
-                    print(f"   📝 Recorded inspiration #{inspirations_sent_count + 1}/4 in history")
+                    inspiration_history_ref.add(history_record)
+                    print(f"   📝 Recorded inspiration #{history_record['count']}/4 in history")
                 except Exception as e:
                     print(f"   ⚠️ Failed to record inspiration history: {e}")
 
-                inspirations_sent += 1
+        results, _ = dispatch_notifications(deliveries, shard_run_name('sporadic_inspiration', shard), on_late_delivery=record_delivered)
+        delivered_keys = get_delivered_keys(deliveries, results)
+        record_delivered(delivered_keys)
+        inspirations_sent = len(delivered_keys)
         
         if inspirations_sent > 0:
             print(f"🎯 Sent {inspirations_sent} sporadic inspiration messages")
@@ -1842,28 +3379,182 @@ def send_sporadic_inspiration():
         return 0
         print(f"Full traceback: {traceback.format_exc()}")
 
+# ===== SCHEDULER LEADER ELECTION =====
+# Gunicorn starts several workers and each one imports this module, so every worker
+# would otherwise run its own scheduler and send every notification job twice.
+# Workers compete for a lease document in Firestore. The holder renews it from a
+# heartbeat thread, and only the holder runs the schedule jobs. If the leader dies,
+# its lease expires and a standby worker takes over on its next heartbeat.
+# Setting SCHEDULER_LOCK_FILE uses an exclusive file lock instead (single host
+# only). The OS releases the lock when the holder process exits.
+#
+# SCHEDULER_SHARD="n/m" makes this deployment handle only shard n of m users (see
+# NOTIFICATION SHARDING). Each shard elects its own leader.
+SCHEDULER_SHARD = os.getenv('SCHEDULER_SHARD')
+scheduler_shard = None
+if SCHEDULER_SHARD:
+    try:
+        scheduler_shard = parse_shard(*SCHEDULER_SHARD.split('/', 1))
+        if None in scheduler_shard:
+            raise ValueError("expected n/m")
+    except (TypeError, ValueError) as e:
+        # A bad value must not stop the app from importing; run unsharded instead
+        print(f"❌ Invalid SCHEDULER_SHARD {SCHEDULER_SHARD!r} ({e}); running the scheduler unsharded")
+        scheduler_shard = None
+
+SCHEDULER_LEASE_COLLECTION = 'scheduler_leases'
+SCHEDULER_LEASE_NAME = os.getenv('SCHEDULER_LEASE_NAME', 'notification_scheduler' + (
+    f"_shard_{scheduler_shard[0]}_of_{scheduler_shard[1]}" if scheduler_shard else ''))
+SCHEDULER_LEASE_TTL = int(os.getenv('SCHEDULER_LEASE_TTL', '90'))  # seconds
+SCHEDULER_HEARTBEAT_INTERVAL = int(os.getenv('SCHEDULER_HEARTBEAT_INTERVAL', '30'))  # seconds
+SCHEDULER_LOCK_FILE = os.getenv('SCHEDULER_LOCK_FILE')
+
+scheduler_instance_id = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+scheduler_is_leader = threading.Event()
+scheduler_lock_handle = None
+
+def try_acquire_scheduler_file_lock():
+    """Take (or keep) the exclusive scheduler file lock without blocking"""
+    global scheduler_lock_handle
+    if scheduler_lock_handle is not None:
+        return True
+    
+    import fcntl
+    lock_handle = open(SCHEDULER_LOCK_FILE, 'a+')
+    try:
+        fcntl.flock(lock_handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_handle.close()
+        return False
+    
+    lock_handle.seek(0)
+    lock_handle.truncate()
+    lock_handle.write(scheduler_instance_id)
+    lock_handle.flush()
+    scheduler_lock_handle = lock_handle
+    return True
+
+def try_acquire_scheduler_lease():
+    """
+    Acquire or renew the scheduler lease in a Firestore transaction.
+    
+    The lease is granted if nobody holds it, this instance already holds it, or the
+    current holder's lease has expired (missed heartbeats).
+    
+    Returns:
+        bool: True if this instance holds the lease
+    """
+    lease_ref = db.collection(SCHEDULER_LEASE_COLLECTION).document(SCHEDULER_LEASE_NAME)
+    
+    @firestore.transactional
+    def acquire(transaction):
+        now_utc = datetime.now(ZoneInfo('UTC'))
+        lease_doc = lease_ref.get(transaction=transaction)
+        lease = lease_doc.to_dict() if lease_doc.exists else {}
+        holder = lease.get('holder')
+        expires_at = lease.get('expires_at')
+        
+        if holder and holder != scheduler_instance_id and expires_at and expires_at > now_utc:
+            return False
+        
+        transaction.set(lease_ref, {
+            'holder': scheduler_instance_id,
+            'acquired_at': lease.get('acquired_at') if holder == scheduler_instance_id else now_utc,
+            'heartbeat_at': now_utc,
+            'expires_at': now_utc + timedelta(seconds=SCHEDULER_LEASE_TTL)
+        })
+        return True
+    
+    return acquire(db.transaction())
+
+def release_scheduler_lease():
+    """Give up leadership on shutdown so a standby can take over immediately"""
+    if not scheduler_is_leader.is_set():
+        return
+    scheduler_is_leader.clear()
+    
+    if SCHEDULER_LOCK_FILE:
+        return  # the OS releases the file lock when the process exits
+    
+    try:
+        lease_ref = db.collection(SCHEDULER_LEASE_COLLECTION).document(SCHEDULER_LEASE_NAME)
+        
+        @firestore.transactional
+        def release(transaction):
+            lease_doc = lease_ref.get(transaction=transaction)
+            if lease_doc.exists and lease_doc.get('holder') == scheduler_instance_id:
+                transaction.delete(lease_ref)
+        
+        release(db.transaction())
+        print(f"👑 Released scheduler lease ({scheduler_instance_id})")
+    except Exception as e:
+        print(f"⚠️ Error releasing scheduler lease: {e}")
+
+def renew_scheduler_leadership():
+    """Heartbeat: try to acquire/renew leadership and update scheduler_is_leader"""
+    try:
+        if SCHEDULER_LOCK_FILE:
+            is_leader = try_acquire_scheduler_file_lock()
+        else:
+            is_leader = try_acquire_scheduler_lease()
+    except Exception as e:
+        # Can't confirm the lease, so stop running jobs until it can be renewed
+        print(f"⚠️ Scheduler lease heartbeat failed: {e}")
+        is_leader = False
+    
+    if is_leader and not scheduler_is_leader.is_set():
+        print(f"👑 This worker is now the scheduler leader ({scheduler_instance_id})")
+        scheduler_is_leader.set()
+    elif not is_leader and scheduler_is_leader.is_set():
+        print(f"🪑 Lost scheduler leadership ({scheduler_instance_id})")
+        scheduler_is_leader.clear()
+    return is_leader
+
+def run_scheduler_heartbeat():
+    """Renew the scheduler lease in the background, independent of job run time"""
+    while True:
+        renew_scheduler_leadership()
+        time.sleep(SCHEDULER_HEARTBEAT_INTERVAL)
+
+def get_scheduler_status():
+    """Scheduler role of this worker for health checks"""
+    return "leader" if scheduler_is_leader.is_set() else "standby"
+
 def run_scheduler():
     """Run the notification scheduler in background"""
     print("📅 Starting notification scheduler...")
     
     # Check for task notifications every 5 minutes
-    schedule.every(5).minutes.do(check_and_send_notifications)
+    schedule.every(5).minutes.do(check_and_send_notifications, shard=scheduler_shard)
     
     # Check for daily summaries every 5 minutes (user-specific times handled in function)
     # This ensures users get summaries at their preferred time regardless of timezone
-    schedule.every(5).minutes.do(send_daily_summary)
+    schedule.every(5).minutes.do(send_daily_summary, shard=scheduler_shard)
     
     # Send sporadic inspirations every 15 minutes (smart logic inside function decides who gets them)
-    schedule.every(15).minutes.do(send_sporadic_inspiration)
+    schedule.every(15).minutes.do(send_sporadic_inspiration, shard=scheduler_shard)
     
-    print("📅 Scheduler configured:")
+    # Sweep expired notification tracking hourly (kept off the notification path)
+    # The sweep covers all users, so only the first shard's leader runs it
+    if scheduler_shard is None or scheduler_shard[0] == 0:
+        schedule.every().hour.do(sweep_expired_notification_tracking)
+    
+    print(f"📅 Scheduler configured{f' for shard {scheduler_shard[0]}/{scheduler_shard[1]}' if scheduler_shard else ''}:")
     print("  - Task notifications: every 5 minutes")
     print("  - Daily summaries: every 5 minutes (checks user preferences)")
     print("  - Sporadic inspiration: every 15 minutes (smart distribution)")
+    print("  - Expired tracking sweep: every hour")
+    
+    # Leadership is renewed on its own thread so long jobs don't let the lease lapse
+    heartbeat_thread = threading.Thread(target=run_scheduler_heartbeat, daemon=True)
+    heartbeat_thread.start()
+    atexit.register(release_scheduler_lease)
     
     while True:
-        schedule.run_pending()
-        time.sleep(60)  # Check every minute
+        # Only the lease holder runs jobs; standbys keep waiting to take over
+        if scheduler_is_leader.wait(timeout=60):
+            schedule.run_pending()
+            time.sleep(min(60, SCHEDULER_HEARTBEAT_INTERVAL))  # Check every minute
 
 # Weather functionality using OpenWeatherMap API
 def get_weather_icon_class(weather_id, is_day=True):
@@ -1895,83 +3586,184 @@ def get_weather_icon_class(weather_id, is_day=True):
     
     return "wi-na"  # Not available
 
+# ===== WEATHER CACHE =====
+# Weather is cached per worker by grid cell: coordinates are rounded to
+# WEATHER_GRID_DEGREES (0.05 deg, about 5 km) and upstream is queried at the cell
+# center, so nearby users share entries. Current conditions and the forecast are
+# cached separately with their own TTLs. Past its TTL an entry is still served, for
+# up to WEATHER_STALE_FACTOR times the TTL, while a single background refresh per
+# key fetches a new copy; older entries are fetched inline. Hit, stale hit and
+# miss counters are reported by /health.
+WEATHER_GRID_DEGREES = 0.05
+WEATHER_CACHE_TTLS = {'current': 600, 'forecast': 3600}  # seconds
+WEATHER_STALE_FACTOR = 6
+WEATHER_CACHE_MAX_ENTRIES = 5000
+
+weather_cache = collections.OrderedDict()  # (kind, lat, lon) of the cell center -> (data, fetched_at)
+weather_cache_lock = threading.Lock()
+weather_refreshing = set()  # Keys with a background refresh in flight
+weather_cache_stats = collections.Counter()
+weather_refresh_executor = concurrent.futures.ThreadPoolExecutor(max_workers=2, thread_name_prefix="weather-refresh")
+weather_fetch_executor = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="weather-fetch")
+
+def weather_grid_cell(lat, lon):
+    """Round coordinates to the center of their weather cache grid cell"""
+    return tuple(
+        round(round(float(value) / WEATHER_GRID_DEGREES) * WEATHER_GRID_DEGREES, 4)
+        for value in (lat, lon)
+    )
+
+def count_weather_cache(stat):
+    """Increment a weather cache counter"""
+    with weather_cache_lock:
+        weather_cache_stats[stat] += 1
+
+def store_cached_weather(key, data):
+    """Store fetched weather data, evicting the least recently used entries past the limit"""
+    with weather_cache_lock:
+        weather_cache[key] = (data, time.time())
+        weather_cache.move_to_end(key)
+        while len(weather_cache) > WEATHER_CACHE_MAX_ENTRIES:
+            weather_cache.popitem(last=False)
+
+def refresh_cached_weather(key, fetch):
+    """Background refresh of one stale weather entry"""
+    try:
+        store_cached_weather(key, fetch(key[1], key[2]))
+        count_weather_cache('refreshes')
+    except Exception as e:
+        count_weather_cache('refresh_errors')
+        print(f"⚠️ Weather refresh failed for {key}: {e}")
+    finally:
+        with weather_cache_lock:
+            weather_refreshing.discard(key)
+
+def get_cached_weather(kind, lat, lon, fetch):
+    """
+    Get weather data of one kind ('current' or 'forecast') for coordinates through the cache.
+
+    Args:
+        kind (str): Key into WEATHER_CACHE_TTLS
+        lat, lon: Coordinates (rounded to the grid cell)
+        fetch (callable): fetch(lat, lon) returning fresh data for a cell center
+
+    Returns:
+        The cached or freshly fetched data
+    """
+    key = (kind, *weather_grid_cell(lat, lon))
+    ttl = WEATHER_CACHE_TTLS[kind]
+    with weather_cache_lock:
+        cached = weather_cache.get(key)
+        if cached is not None:
+            weather_cache.move_to_end(key)
+
+    if cached is not None:
+        age = time.time() - cached[1]
+        if age < ttl:
+            count_weather_cache(f'{kind}_hits')
+            return cached[0]
+        if age < ttl * WEATHER_STALE_FACTOR:
+            count_weather_cache(f'{kind}_stale_hits')
+            with weather_cache_lock:
+                start_refresh = key not in weather_refreshing
+                weather_refreshing.add(key)
+            if start_refresh:
+                weather_refresh_executor.submit(refresh_cached_weather, key, fetch)
+            return cached[0]
+
+    count_weather_cache(f'{kind}_misses')
+    data = fetch(key[1], key[2])
+    store_cached_weather(key, data)
+    return data
+
+def get_weather_cache_stats():
+    """Weather cache counters and size for monitoring"""
+    with weather_cache_lock:
+        return {**weather_cache_stats, 'entries': len(weather_cache)}
+
+def fetch_current_weather(lat, lon):
+    """Fetch and process current conditions from OpenWeatherMap"""
+    current_url = f"https://api.openweathermap.org/data/2.5/weather"
+    current_params = {
+        'lat': lat,
+        'lon': lon,
+        'appid': OPENWEATHERMAP_API_KEY,
+        'units': 'imperial'  # Fahrenheit
+    }
+    
+    current_response = http_session.get(current_url, params=current_params, timeout=10)
+    current_response.raise_for_status()
+    current_data = current_response.json()
+    
+    return {
+        'location': f"{current_data['name']}, {current_data['sys']['country']}",
+        'temperature': round(current_data['main']['temp']),
+        'feels_like': round(current_data['main']['feels_like']),
+        'condition': current_data['weather'][0]['description'].title(),
+        'humidity': current_data['main']['humidity'],
+        'wind_speed': round(current_data['wind']['speed']),
+        'wind_deg': current_data['wind'].get('deg', 0),
+        'icon_class': get_weather_icon_class(current_data['weather'][0]['id']),
+        'weather_id': current_data['weather'][0]['id'],
+        'timestamp': datetime.now().isoformat()
+    }
+
+def fetch_weather_forecast(lat, lon):
+    """Fetch the 5-day/3-hour forecast from OpenWeatherMap and group it into daily forecasts"""
+    forecast_url = f"https://api.openweathermap.org/data/2.5/forecast"
+    forecast_params = {
+        'lat': lat,
+        'lon': lon,
+        'appid': OPENWEATHERMAP_API_KEY,
+        'units': 'imperial'
+    }
+    
+    forecast_response = http_session.get(forecast_url, params=forecast_params, timeout=10)
+    forecast_response.raise_for_status()
+    forecast_data = forecast_response.json()
+    
+    # Process 7-day forecast (group by day)
+    daily_forecasts = {}
+    for item in forecast_data['list']:
+        date = datetime.fromtimestamp(item['dt']).date()
+        day_name = date.strftime('%A')
+        
+        if day_name not in daily_forecasts:
+            daily_forecasts[day_name] = {
+                'day': day_name,
+                'date': date.strftime('%Y-%m-%d'),
+                'high_temp': round(item['main']['temp_max']),
+                'low_temp': round(item['main']['temp_min']),
+                'condition': item['weather'][0]['description'].title(),
+                'icon_class': get_weather_icon_class(item['weather'][0]['id']),
+                'weather_id': item['weather'][0]['id'],
+                'humidity': item['main']['humidity'],
+                'wind_speed': round(item['wind']['speed'])
+            }
+        else:
+            # Update high/low temps if this reading is more extreme
+            daily_forecasts[day_name]['high_temp'] = max(
+                daily_forecasts[day_name]['high_temp'], 
+                round(item['main']['temp_max'])
+            )
+            daily_forecasts[day_name]['low_temp'] = min(
+                daily_forecasts[day_name]['low_temp'], 
+                round(item['main']['temp_min'])
+            )
+    
+    # Convert to list and limit to 7 days
+    return list(daily_forecasts.values())[:7]
+
 def get_weather_by_coordinates(lat, lon):
-    """Get current weather and 7-day forecast using OpenWeatherMap API"""
+    """Get current weather and 7-day forecast using OpenWeatherMap API (cached by grid cell)"""
     if not OPENWEATHERMAP_API_KEY:
         raise Exception("OpenWeatherMap API key not configured")
     
     try:
-        # Get current weather
-        current_url = f"https://api.openweathermap.org/data/2.5/weather"
-        current_params = {
-            'lat': lat,
-            'lon': lon,
-            'appid': OPENWEATHERMAP_API_KEY,
-            'units': 'imperial'  # Fahrenheit
-        }
-        
-        current_response = requests.get(current_url, params=current_params, timeout=10)
-        current_response.raise_for_status()
-        current_data = current_response.json()
-        
-        # Get 7-day forecast
-        forecast_url = f"https://api.openweathermap.org/data/2.5/forecast"
-        forecast_params = {
-            'lat': lat,
-            'lon': lon,
-            'appid': OPENWEATHERMAP_API_KEY,
-            'units': 'imperial'
-        }
-        
-        forecast_response = requests.get(forecast_url, params=forecast_params, timeout=10)
-        forecast_response.raise_for_status()
-        forecast_data = forecast_response.json()
-        
-        # Process current weather
-        current_weather = {
-            'location': f"{current_data['name']}, {current_data['sys']['country']}",
-            'temperature': round(current_data['main']['temp']),
-            'feels_like': round(current_data['main']['feels_like']),
-            'condition': current_data['weather'][0]['description'].title(),
-            'humidity': current_data['main']['humidity'],
-            'wind_speed': round(current_data['wind']['speed']),
-            'wind_deg': current_data['wind'].get('deg', 0),
-            'icon_class': get_weather_icon_class(current_data['weather'][0]['id']),
-            'weather_id': current_data['weather'][0]['id'],
-            'timestamp': datetime.now().isoformat()
-        }
-        
-        # Process 7-day forecast (group by day)
-        daily_forecasts = {}
-        for item in forecast_data['list']:
-            date = datetime.fromtimestamp(item['dt']).date()
-            day_name = date.strftime('%A')
-            
-            if day_name not in daily_forecasts:
-                daily_forecasts[day_name] = {
-                    'day': day_name,
-                    'date': date.strftime('%Y-%m-%d'),
-                    'high_temp': round(item['main']['temp_max']),
-                    'low_temp': round(item['main']['temp_min']),
-                    'condition': item['weather'][0]['description'].title(),
-                    'icon_class': get_weather_icon_class(item['weather'][0]['id']),
-                    'weather_id': item['weather'][0]['id'],
-                    'humidity': item['main']['humidity'],
-                    'wind_speed': round(item['wind']['speed'])
-                }
-            else:
-                # Update high/low temps if this reading is more extreme
-                daily_forecasts[day_name]['high_temp'] = max(
-                    daily_forecasts[day_name]['high_temp'], 
-                    round(item['main']['temp_max'])
-                )
-                daily_forecasts[day_name]['low_temp'] = min(
-                    daily_forecasts[day_name]['low_temp'], 
-                    round(item['main']['temp_min'])
-                )
-        
-        # Convert to list and limit to 7 days
-        forecast_list = list(daily_forecasts.values())[:7]
+        # Current conditions and forecast are separate upstream calls; issue them concurrently
+        forecast_future = weather_fetch_executor.submit(get_cached_weather, 'forecast', lat, lon, fetch_weather_forecast)
+        current_weather = get_cached_weather('current', lat, lon, fetch_current_weather)
+        forecast_list = forecast_future.result()
         
         return {
             'current': current_weather,
@@ -2000,7 +3792,7 @@ def get_weather_by_city(city):
             'appid': OPENWEATHERMAP_API_KEY
         }
         
-        geo_response = requests.get(geocoding_url, params=geocoding_params, timeout=10)
+        geo_response = http_session.get(geocoding_url, params=geocoding_params, timeout=10)
         geo_response.raise_for_status()
         geo_data = geo_response.json()
         
@@ -2032,7 +3824,7 @@ def get_weather_by_zipcode(zipcode):
             'appid': OPENWEATHERMAP_API_KEY
         }
         
-        geo_response = requests.get(geocoding_url, params=geocoding_params, timeout=10)
+        geo_response = http_session.get(geocoding_url, params=geocoding_params, timeout=10)
         geo_response.raise_for_status()
         geo_data = geo_response.json()
         
@@ -2051,100 +3843,554 @@ def get_weather_by_zipcode(zipcode):
         print(f"Zipcode weather error: {e}")
         raise Exception(str(e))
 
+# ===== CITY SEARCH INDEX =====
+# `flask --app planner build-cities` compiles data/uscities.csv into
+# data/uscities.bin, which each worker memory-maps read-only so all gunicorn
+# workers share the same page-cache pages and startup is a single mmap call.
+# Without the binary (or when the CSV is newer) the first worker to need it compiles
+# it from the CSV under a file lock and writes it atomically, and every worker maps
+# that file - so deployments without a build step (Railway, local) still share one
+# copy. Only if the data directory is read-only (Vercel) is it kept in memory.
+#
+# Layout (little-endian): header, section table of (offset, length) pairs, then
+# 8-byte aligned sections:
+#   records         fixed-width lat, lng, population, city string ref, state index
+#   strings         UTF-8 display names for cities, states and state ids
+#   states          name/id string refs plus a slice into state_records
+#   names           lowercased city names joined by newlines (substring search)
+#   name_offsets    uint32 start of each record's name within names
+#   prefix_records  uint32 records ordered by lowercased name (prefix bisect)
+#   state_records   uint32 records per state, most populous first
+#   trigram_*       sorted crc32 trigram hashes of normalized names, with
+#                   start offsets into the uint32 record postings
+#
+# Scoring: city prefix 100 / contains 50, state prefix 25 / contains 10, plus a
+# population boost. Since any city match outscores any state-only match,
+# state-only and fuzzy candidates are only gathered when city matches can't
+# fill the results. Fuzzy matching (typos, "st louis" for "St. Louis") shortlists
+# names by shared trigrams and verifies them with a bounded prefix edit distance,
+# scoring 40 - 5 per edit plus the population boost, within a per-query time
+# budget. Results are cached per query in a small LRU for hot prefixes.
+CITIES_CSV_PATH = os.path.join(os.path.dirname(__file__), 'data', 'uscities.csv')
+CITIES_BIN_PATH = os.path.join(os.path.dirname(__file__), 'data', 'uscities.bin')
+
+CITY_DATASET_MAGIC = b'DPCITIES'
+CITY_DATASET_VERSION = 2
+CITY_DATASET_SECTIONS = ('records', 'strings', 'states', 'names', 'name_offsets', 'prefix_records', 'state_records',
+                         'trigram_hashes', 'trigram_starts', 'trigram_records')
+CITY_DATASET_HEADER = struct.Struct('<8sIII')  # magic, version, record count, state count
+CITY_SECTION_ENTRY = struct.Struct('<II')  # offset, length
+CITY_RECORD = struct.Struct('<ddqIHH')  # lat, lng, population, city offset, city length, state index
+CITY_STATE = struct.Struct('<IHIHII')  # name offset/length, state_id offset/length, first member, member count
+
+CITY_FUZZY_MIN_LENGTH = 4  # Shorter queries are too ambiguous to correct
+CITY_FUZZY_CANDIDATES = 200  # Trigram shortlist size verified by edit distance
+CITY_FUZZY_BUDGET = float(os.getenv('CITY_FUZZY_BUDGET_MS', '25')) / 1000
+CITY_SEARCH_CACHE_SIZE = 2048
+CITY_NAME_ABBREVIATIONS = {'saint': 'st', 'sainte': 'ste', 'fort': 'ft', 'mount': 'mt'}
+
+city_index = None
+city_index_lock = threading.Lock()
+
+city_search_cache = collections.OrderedDict()  # (query, limit) -> results
+city_search_cache_lock = threading.Lock()
+city_search_stats = collections.Counter()
+city_search_latencies = collections.deque(maxlen=1000)  # ms, uncached searches
+
+def city_population_boost(population):
+    """Score boost for larger cities"""
+    if population > 100000:
+        return 10
+    elif population > 50000:
+        return 5
+    elif population > 10000:
+        return 2
+    return 0
+
+def parse_city_population(value):
+    """Parse a population column, treating blanks and junk as 0"""
+    try:
+        return int(float(value))
+    except (ValueError, TypeError):
+        return 0
+
+def read_city_rows(csv_path=CITIES_CSV_PATH):
+    """
+    Read the cities CSV into (city, state, state_id, lat, lng, population) rows.
+
+    Keeps one row per city/state - the most populous, which ranked first before.
+    """
+    rows = {}
+    with open(csv_path, 'r', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            city = row.get('city', '').strip()
+            state = row.get('state_name', '').strip()
+            if not city or not state:
+                continue
+            population = parse_city_population(row.get('population'))
+            key = (city.lower(), state.lower())
+            if key not in rows or population > rows[key][5]:
+                rows[key] = (city, state, row.get('state_id', ''), float(row.get('lat') or 0), float(row.get('lng') or 0), population)
+    return list(rows.values())
+
+def compile_city_dataset(rows):
+    """
+    Compile city rows into the binary city dataset.
+
+    Returns:
+        bytes: The dataset, ready to write to CITIES_BIN_PATH or open directly
+    """
+    if sys.byteorder != 'little':
+        raise RuntimeError('The city dataset is little-endian only')
+
+    strings = bytearray()
+
+    def add_string(value):
+        encoded = value.encode('utf-8')
+        offset = len(strings)
+        strings.extend(encoded)
+        return offset, len(encoded)
+
+    records = bytearray()
+    state_numbers = {}
+    state_refs = []
+    state_members = []
+    names = []
+    populations = []
+    for city, state, state_id, latitude, longitude, population in rows:
+        state_key = state.lower()
+        if state_key not in state_numbers:
+            state_numbers[state_key] = len(state_refs)
+            state_refs.append(add_string(state) + add_string(state_id))
+            state_members.append([])
+        state_number = state_numbers[state_key]
+        state_members[state_number].append(len(names))
+        records += CITY_RECORD.pack(latitude, longitude, population, *add_string(city), state_number)
+        names.append(city.lower().encode('utf-8'))
+        populations.append(population)
+
+    name_offsets = array.array('I')
+    offset = 0
+    for name in names:
+        name_offsets.append(offset)
+        offset += len(name) + 1
+
+    # UTF-8 byte order matches code point order, so prefix lookups compare raw bytes
+    prefix_records = array.array('I', sorted(range(len(names)), key=names.__getitem__))
+
+    states = bytearray()
+    state_records = array.array('I')
+    for refs, members in zip(state_refs, state_members):
+        members.sort(key=lambda record: -populations[record])
+        states += CITY_STATE.pack(*refs, len(state_records), len(members))
+        state_records.extend(members)
+
+    postings = collections.defaultdict(list)
+    for record, (city, *_) in enumerate(rows):
+        for gram_hash in city_trigram_hashes(normalize_city_name(city), padded_end=True):
+            postings[gram_hash].append(record)
+    trigram_hashes = array.array('I', sorted(postings))
+    trigram_starts = array.array('I')
+    trigram_records = array.array('I')
+    for gram_hash in trigram_hashes:
+        trigram_starts.append(len(trigram_records))
+        trigram_records.extend(postings[gram_hash])
+    trigram_starts.append(len(trigram_records))
+
+    sections = [bytes(records), bytes(strings), bytes(states), b'\n'.join(names),
+                name_offsets.tobytes(), prefix_records.tobytes(), state_records.tobytes(),
+                trigram_hashes.tobytes(), trigram_starts.tobytes(), trigram_records.tobytes()]
+
+    table_size = CITY_DATASET_HEADER.size + CITY_SECTION_ENTRY.size * len(sections)
+    dataset = bytearray(CITY_DATASET_HEADER.pack(CITY_DATASET_MAGIC, CITY_DATASET_VERSION, len(names), len(state_refs)))
+    body = bytearray()
+    for section in sections:
+        body += b'\0' * (-(table_size + len(body)) % 8)
+        dataset += CITY_SECTION_ENTRY.pack(table_size + len(body), len(section))
+        body += section
+    return bytes(dataset + body)
+
+def open_city_dataset(buffer):
+    """
+    Open a compiled city dataset without copying it.
+
+    Args:
+        buffer: An mmap or bytes holding the dataset
+
+    Returns:
+        dict: Memoryviews over each section plus the decoded (small) state table
+    """
+    view = memoryview(buffer)
+    magic, version, record_count, state_count = CITY_DATASET_HEADER.unpack_from(view, 0)
+    if magic != CITY_DATASET_MAGIC or version != CITY_DATASET_VERSION:
+        raise ValueError('Unsupported city dataset format')
+
+    sections = {}
+    bounds = {}
+    for number, name in enumerate(CITY_DATASET_SECTIONS):
+        offset, length = CITY_SECTION_ENTRY.unpack_from(view, CITY_DATASET_HEADER.size + number * CITY_SECTION_ENTRY.size)
+        sections[name] = view[offset:offset + length]
+        bounds[name] = (offset, offset + length)
+
+    strings = sections['strings']
+    state_records = sections['state_records'].cast('I')
+    states = []
+    for number in range(state_count):
+        name_offset, name_length, id_offset, id_length, first, count = CITY_STATE.unpack_from(sections['states'], number * CITY_STATE.size)
+        states.append({
+            'name': bytes(strings[name_offset:name_offset + name_length]).decode('utf-8'),
+            'state_id': bytes(strings[id_offset:id_offset + id_length]).decode('utf-8'),
+            'records': state_records[first:first + count]
+        })
+
+    return {
+        'buffer': buffer,
+        'record_count': record_count,
+        'records': sections['records'],
+        'strings': strings,
+        'states': states,
+        'names': sections['names'],
+        'names_bounds': bounds['names'],
+        'name_offsets': sections['name_offsets'].cast('I'),
+        'prefix_records': sections['prefix_records'].cast('I'),
+        'trigram_hashes': sections['trigram_hashes'].cast('I'),
+        'trigram_starts': sections['trigram_starts'].cast('I'),
+        'trigram_records': sections['trigram_records'].cast('I')
+    }
+
+def city_dataset_is_current():
+    """True if the compiled dataset exists and is at least as new as the CSV (or there is no CSV)"""
+    try:
+        compiled_at = os.path.getmtime(CITIES_BIN_PATH)
+    except FileNotFoundError:
+        return False
+    try:
+        return compiled_at >= os.path.getmtime(CITIES_CSV_PATH)
+    except FileNotFoundError:
+        return True
+
+def map_city_dataset():
+    """Memory-map the compiled dataset read-only"""
+    with open(CITIES_BIN_PATH, 'rb') as file:
+        return open_city_dataset(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+def write_city_dataset(dataset):
+    """Replace the compiled dataset atomically so running workers keep their mapping of the old file"""
+    temp_path = f"{CITIES_BIN_PATH}.{os.getpid()}.tmp"
+    with open(temp_path, 'wb') as file:
+        file.write(dataset)
+    os.replace(temp_path, CITIES_BIN_PATH)
+
+def compile_shared_city_dataset():
+    """
+    Compile the CSV, write the binary for the other workers and map it.
+
+    Workers that start together wait on a lock file, then map what the first one
+    wrote instead of compiling again.
+    """
+    if not os.path.exists(CITIES_CSV_PATH):
+        raise FileNotFoundError(CITIES_CSV_PATH)
+
+    dataset = None
+    try:
+        with open(CITIES_BIN_PATH + '.lock', 'a') as lock_handle:
+            try:
+                import fcntl
+                fcntl.flock(lock_handle, fcntl.LOCK_EX)  # Released when the handle closes
+            except ImportError:
+                pass  # No flock on Windows; concurrent workers may each compile once
+            if city_dataset_is_current():
+                try:
+                    return map_city_dataset()
+                except ValueError:
+                    pass  # Unreadable or an older format; rebuild it
+            dataset = compile_city_dataset(read_city_rows(CITIES_CSV_PATH))
+            write_city_dataset(dataset)
+            print(f"🏙️ Compiled {CITIES_BIN_PATH} for all workers")
+            return map_city_dataset()
+    except OSError as e:
+        # Read-only deployments can't share the file; keep this worker's copy in memory
+        print(f"Couldn't write the compiled cities dataset ({e}); using an in-memory copy")
+        return open_city_dataset(dataset or compile_city_dataset(read_city_rows(CITIES_CSV_PATH)))
+
+def load_city_index():
+    """Memory-map the compiled dataset, compiling and sharing it first when it is missing or stale"""
+    if city_dataset_is_current():
+        try:
+            return map_city_dataset()
+        except ValueError as e:
+            print(f"Cities dataset unreadable ({e}); rebuilding from CSV")
+    return compile_shared_city_dataset()
+
+def get_city_index():
+    """Load the city index on first use; an empty index if no city data is available"""
+    global city_index
+    if city_index is None:
+        with city_index_lock:
+            if city_index is None:
+                clear_city_search_cache()
+                try:
+                    city_index = load_city_index()
+                    print(f"🏙️ Loaded city search index: {city_index['record_count']} cities")
+                except FileNotFoundError:
+                    print("Cities CSV file not found")
+                    city_index = open_city_dataset(compile_city_dataset([]))
+    return city_index
+
+@app.cli.command('build-cities')
+def build_cities_command():
+    """Compile data/uscities.csv into the memory-mapped data/uscities.bin."""
+    dataset = compile_city_dataset(read_city_rows(CITIES_CSV_PATH))
+    write_city_dataset(dataset)
+    print(f"Wrote {CITIES_BIN_PATH} ({len(dataset)} bytes)")
+
+def city_record(index, record):
+    """Unpack a record as (lat, lng, population, city offset, city length, state index)"""
+    return CITY_RECORD.unpack_from(index['records'], record * CITY_RECORD.size)
+
+def city_name_key(index, record):
+    """Lowercased UTF-8 city name of a record"""
+    name_offsets = index['name_offsets']
+    start = name_offsets[record]
+    end = name_offsets[record + 1] - 1 if record + 1 < len(name_offsets) else len(index['names'])
+    return bytes(index['names'][start:end])
+
+def find_city_name_matches(index, query):
+    """
+    Find records whose city name matches the query.
+
+    Returns:
+        dict: Record -> city match score (100 for prefix, 50 for contains)
+    """
+    matches = {}
+    query = query.encode('utf-8')
+    prefix_records = index['prefix_records']
+    key = lambda record: city_name_key(index, record)
+    low = bisect.bisect_left(prefix_records, query, key=key)
+    high = bisect.bisect_left(prefix_records, query + b'\xff', low, key=key)
+    for position in range(low, high):
+        matches[prefix_records[position]] = 100
+
+    if b'\n' in query:
+        return matches
+    # Search the names section in place (mmap.find / bytes.find) rather than copying it
+    buffer = index['buffer']
+    names_start, names_end = index['names_bounds']
+    position = buffer.find(query, names_start, names_end)
+    while position != -1:
+        record = bisect.bisect_right(index['name_offsets'], position - names_start) - 1
+        matches.setdefault(record, 50)
+        # Skip to the next name; further hits in this one add nothing
+        next_name = buffer.find(b'\n', position, names_end)
+        if next_name == -1:
+            break
+        position = buffer.find(query, next_name + 1, names_end)
+    return matches
+
+def normalize_city_name(name):
+    """Lowercase, turn punctuation into spaces and fold common abbreviations ("Saint" -> "st")"""
+    words = re.sub(r'[^\w\s]|_', ' ', name.lower()).split()
+    return ' '.join(CITY_NAME_ABBREVIATIONS.get(word, word) for word in words)
+
+def city_trigram_hashes(name, padded_end=False):
+    """
+    Hashes of a normalized name's trigrams, padded at the start.
+
+    Queries are prefixes of what the user means, so only indexed names get the
+    trailing pad.
+    """
+    padded = '  ' + name + (' ' if padded_end else '')
+    return {zlib.crc32(padded[i:i + 3].encode('utf-8')) for i in range(len(padded) - 2)}
+
+def bounded_prefix_distance(query, name, max_distance):
+    """
+    Edit distance (with adjacent transpositions) from query to its closest prefix
+    of name, or None once it must exceed max_distance.
+    """
+    name = name[:len(query) + max_distance]
+    before_previous = None
+    previous = list(range(len(name) + 1))
+    for i in range(1, len(query) + 1):
+        current = [i] + [0] * len(name)
+        for j in range(1, len(name) + 1):
+            cost = query[i - 1] != name[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if (before_previous is not None and j > 1 and query[i - 1] == name[j - 2]
+                    and query[i - 2] == name[j - 1]):
+                current[j] = min(current[j], before_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return None
+        before_previous, previous = previous, current
+    distance = min(previous)
+    return distance if distance <= max_distance else None
+
+def find_fuzzy_city_matches(index, query, deadline):
+    """
+    Find records whose normalized name nearly starts with the normalized query.
+
+    Trigrams are counted rarest-first so the shortlist is as selective as possible
+    if the deadline cuts counting short.
+
+    Returns:
+        tuple: (dict of record -> edit distance, whether the deadline was hit)
+    """
+    query = normalize_city_name(query)
+    if len(query) < CITY_FUZZY_MIN_LENGTH:
+        return {}, False
+    max_distance = 1 if len(query) <= 5 else 2 if len(query) <= 9 else 3
+
+    trigram_hashes = index['trigram_hashes']
+    trigram_starts = index['trigram_starts']
+    posting_lists = []
+    for gram_hash in city_trigram_hashes(query):
+        position = bisect.bisect_left(trigram_hashes, gram_hash)
+        if position < len(trigram_hashes) and trigram_hashes[position] == gram_hash:
+            posting_lists.append(index['trigram_records'][trigram_starts[position]:trigram_starts[position + 1]])
+    posting_lists.sort(key=len)
+
+    counts = collections.Counter()
+    for postings in posting_lists:
+        if time.perf_counter() > deadline:
+            return {}, True
+        counts.update(postings)
+
+    # Each edit can break at most three of the query's trigrams
+    min_shared = max(1, len(query) - 3 * max_distance)
+    matches = {}
+    for record, shared in counts.most_common(CITY_FUZZY_CANDIDATES):
+        if shared < min_shared:
+            break
+        if time.perf_counter() > deadline:
+            return matches, True
+        distance = bounded_prefix_distance(query, normalize_city_name(city_name_key(index, record).decode('utf-8')), max_distance)
+        if distance is not None:
+            matches[record] = distance
+    return matches, False
+
+def clear_city_search_cache():
+    """Drop cached search results (e.g. when the city index is reloaded)"""
+    with city_search_cache_lock:
+        city_search_cache.clear()
+
+def get_city_search_stats():
+    """City search cache counters and recent uncached latency percentiles for monitoring"""
+    with city_search_cache_lock:
+        latencies = sorted(city_search_latencies)
+        stats = {**city_search_stats, 'entries': len(city_search_cache), 'fuzzy_budget_ms': CITY_FUZZY_BUDGET * 1000}
+    if latencies:
+        stats['p50_ms'] = round(latencies[len(latencies) // 2], 2)
+        stats['p95_ms'] = round(latencies[int(len(latencies) * 0.95)], 2)
+        stats['max_ms'] = round(latencies[-1], 2)
+    return stats
+
 def search_cities(query, limit=10):
-    """Search for cities in the CSV file based on query"""
+    """Search for cities by name or state (tolerating typos), ranked by match score then population"""
     if not query or len(query.strip()) < 2:
         return []
     
     query = query.strip().lower()
-    results = []
+    cache_key = (query, limit)
+    with city_search_cache_lock:
+        if cache_key in city_search_cache:
+            city_search_cache.move_to_end(cache_key)
+            city_search_stats['hits'] += 1
+            return list(city_search_cache[cache_key])
+        city_search_stats['misses'] += 1
     
     try:
-        csv_path = os.path.join(os.path.dirname(__file__), 'data', 'uscities.csv')
-        
-        with open(csv_path, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
+        index = get_city_index()
+        started = time.perf_counter()
+        states = index['states']
+        
+        state_scores = {}
+        for number, state in enumerate(states):
+            state_name = state['name'].lower()
+            if state_name.startswith(query):
+                state_scores[number] = 25
+            elif query in state_name:
+                state_scores[number] = 10
+        
+        def candidate(record, city_score):
+            _, _, population, _, _, state_number = city_record(index, record)
+            total_score = city_score + state_scores.get(state_number, 0) + city_population_boost(population)
+            return (total_score, population, -record)
+        
+        city_matches = find_city_name_matches(index, query)
+        searched_fuzzy = over_budget = False
+        candidates = {record: candidate(record, city_score) for record, city_score in city_matches.items()}
+        
+        # State-only and fuzzy matches score below city matches, so they only fill remaining slots.
+        # Within a state the score only grows with population, so each state's most
+        # populous non-city-matching records are its best candidates.
+        if len(candidates) < limit:
+            for number in state_scores:
+                taken = 0
+                for record in states[number]['records']:
+                    if record in city_matches:
+                        continue
+                    candidates[record] = candidate(record, 0)
+                    taken += 1
+                    if taken >= limit:
+                        break
             
-            for row in reader:
-                city = row.get('city', '').strip()
-                state = row.get('state_name', '').strip()
-                population = row.get('population', '0')
-                
-                if not city or not state:
-                    continue
-                
-                city_lower = city.lower()
-                state_lower = state.lower()
-                
-                # Check if query matches city name (starts with or contains)
-                city_match_score = 0
-                if city_lower.startswith(query):
-                    city_match_score = 100  # Exact start match gets highest priority
-                elif query in city_lower:
-                    city_match_score = 50   # Contains match gets medium priority
-                
-                # Check if query matches state
-                state_match_score = 0
-                if state_lower.startswith(query):
-                    state_match_score = 25
-                elif query in state_lower:
-                    state_match_score = 10
-                
-                # Combined match score
-                total_score = city_match_score + state_match_score
-                
-                if total_score > 0:
-                    try:
-                        pop_int = int(population) if population.isdigit() else 0
-                    except (ValueError, TypeError):
-                        pop_int = 0
-                    
-                    # Boost score based on population (larger cities get slight preference)
-                    if pop_int > 100000:
-                        total_score += 10
-                    elif pop_int > 50000:
-                        total_score += 5
-                    elif pop_int > 10000:
-                        total_score += 2
-                    
-                    results.append({
-                        'city': city,
-                        'state': state,
-                        'state_id': row.get('state_id', ''),
-                        'population': pop_int,
-                        'latitude': float(row.get('lat', 0)),
-                        'longitude': float(row.get('lng', 0)),
-                        'display_name': f"{city}, {state}",
-                        'score': total_score
-                    })
-                
-                # Stop if we have enough high-quality results
-                if len(results) >= limit * 3:  # Get extra to sort and filter
-                    break
-        
-        # Sort by score (descending) and population (descending) as tiebreaker
-        results.sort(key=lambda x: (x['score'], x['population']), reverse=True)
-        
-        # Return top results, removing duplicates
-        seen = set()
-        unique_results = []
-        for result in results:
-            key = (result['city'].lower(), result['state'].lower())
-            if key not in seen:
-                seen.add(key)
-                unique_results.append(result)
-                if len(unique_results) >= limit:
-                    break
-        
-        return unique_results
+            searched_fuzzy = True
+            fuzzy_matches, over_budget = find_fuzzy_city_matches(index, query, started + CITY_FUZZY_BUDGET)
+            for record, distance in fuzzy_matches.items():
+                if record not in city_matches:
+                    candidates[record] = max(candidates.get(record, ()), candidate(record, 40 - 5 * distance))
+        
+        results = []
+        for total_score, population, negative_record in heapq.nlargest(limit, candidates.values()):
+            latitude, longitude, _, city_offset, city_length, state_number = city_record(index, -negative_record)
+            city = bytes(index['strings'][city_offset:city_offset + city_length]).decode('utf-8')
+            state = states[state_number]
+            results.append({
+                'city': city,
+                'state': state['name'],
+                'state_id': state['state_id'],
+                'population': population,
+                'latitude': latitude,
+                'longitude': longitude,
+                'display_name': f"{city}, {state['name']}",
+                'score': total_score
+            })
+        
+        with city_search_cache_lock:
+            city_search_latencies.append((time.perf_counter() - started) * 1000)
+            city_search_stats['fuzzy'] += searched_fuzzy
+            city_search_stats['over_budget'] += over_budget
+            # Don't pin results a slow moment cut short
+            if not over_budget:
+                city_search_cache[cache_key] = results
+                while len(city_search_cache) > CITY_SEARCH_CACHE_SIZE:
+                    city_search_cache.popitem(last=False)
+        return list(results)
         
-    except FileNotFoundError:
-        print("Cities CSV file not found")
-        return []
     except Exception as e:
         print(f"City search error: {e}")
         return []
 
+@app.cli.command('bench-cities')
+@click.argument('queries', nargs=-1)
+@click.option('--runs', default=50, help='Uncached searches per query')
+def bench_cities_command(queries, runs):
+    """Time uncached city searches against the fuzzy latency budget."""
+    queries = queries or ('ne', 'san', 'spring', 'st louis', 'pittsbrg', 'sna francisco', 'cincinatti', 'albuquerqe')
+    get_city_index()
+    print(f"Fuzzy budget: {CITY_FUZZY_BUDGET * 1000:.0f} ms")
+    for query in queries:
+        timings = []
+        for _ in range(runs):
+            clear_city_search_cache()
+            started = time.perf_counter()
+            results = search_cities(query)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        top = results[0]['display_name'] if results else '-'
+        print(f"{query!r:18} p50 {timings[len(timings) // 2]:7.2f} ms  p95 {timings[int(len(timings) * 0.95)]:7.2f} ms  "
+              f"max {timings[-1]:7.2f} ms  {len(results)} results, top: {top}")
+    clear_city_search_cache()
+
 
 
 # ===== NOTIFICATION SCHEDULER (FOR LOCAL DEVELOPMENT ONLY) =====
@@ -2159,12 +4405,12 @@ if db and os.getenv('RAILWAY_ENVIRONMENT'):
     # Only start scheduler on Railway
     scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
     scheduler_thread.start()
-    print("📅 Notification scheduler started on Railway")
+    print(f"📅 Notification scheduler started on Railway (waiting for leader lease as {scheduler_instance_id})")
 elif db and ENV != 'production':
     # Also run in local development
     scheduler_thread = threading.Thread(target=run_scheduler, daemon=True)
     scheduler_thread.start()
-    print("📅 Notification scheduler started (LOCAL DEVELOPMENT)")
+    print(f"📅 Notification scheduler started (LOCAL DEVELOPMENT, waiting for leader lease as {scheduler_instance_id})")
 else:
     print("⚠️ Scheduler disabled - using Vercel cron jobs or not in Railway environment")
 
@@ -2222,7 +4468,7 @@ def planner():
     if not session_cookie:
         return redirect(url_for("login"))
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         display_name = decoded_claims.get("name") or decoded_claims.get("email") or "User"
         return render_template("index.html", user=display_name)
     except Exception:
@@ -2311,8 +4557,10 @@ def session_login():
                     'email': email,
                     'name': name,
                     'last_login': datetime.now(),
-                    'uid': uid
+                    'uid': uid,
+                    'shard_slot': user_shard_slot(uid)
                 })
+                bump_resource_versions(uid, 'settings')
                 print(f"✅ Updated existing user {uid} - settings preserved")
             else:
                 # New user - create with default settings
@@ -2321,6 +4569,7 @@ def session_login():
                     'name': name,
                     'last_login': datetime.now(),
                     'uid': uid,
+                    'shard_slot': user_shard_slot(uid),
                     'notifications_enabled': False,
                     'notification_method': 'email',
                     'daily_summary': True,
@@ -2332,6 +4581,7 @@ def session_login():
                     'custom_reminder_times': [300, 60, 30],
                     'daily_summary_time': '23:30'
                 })
+                bump_resource_versions(uid, 'settings')
                 print(f"✅ Created new user {uid} with default settings")
         
         # Set session duration based on Remember Me preference
@@ -2412,7 +4662,7 @@ def send_password_reset():
         
         print(f"🌐 Calling Firebase REST API: {reset_url[:80]}...")
         
-        response = requests.post(reset_url, json=payload, timeout=10)
+        response = http_session.post(reset_url, json=payload, timeout=10)
         
         print(f"📬 Firebase API Response Status: {response.status_code}")
         
@@ -2469,7 +4719,7 @@ def session_status():
         return jsonify({"status": "no_session"}), 401
 
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         return jsonify({"status": "ok", "uid": decoded_claims.get('uid'), "email": decoded_claims.get('email', '')})
     except Exception as e:
         print(f"Session status verify error: {e}")
@@ -2483,7 +4733,7 @@ def notification_settings():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if not db:
@@ -2492,6 +4742,11 @@ def notification_settings():
         user_ref = db.collection('users').document(uid)
         
         if request.method == "GET":
+            etag = resource_etag(uid, 'settings', 'notification-settings')
+            not_modified = not_modified_response(etag)
+            if not_modified:
+                return not_modified
+            
             user_doc = user_ref.get()
             if user_doc.exists:
                 data = user_doc.to_dict()
@@ -2524,8 +4779,8 @@ def notification_settings():
                     'cleanup_weeks': data.get('cleanup_weeks', 2)
                 }
                 print(f"📤 Sending response: {response_data}")
-                return jsonify(response_data)
-            return jsonify({
+                return with_etag(jsonify(response_data), etag)
+            return with_etag(jsonify({
                 'notifications_enabled': False,
                 'notification_method': 'email',
                 'notification_methods': ['email'],  # Default to email only
@@ -2541,7 +4796,7 @@ def notification_settings():
                 'auto_delete_old_tasks': False,  # Add missing setting
                 'auto_cleanup': False,
                 'cleanup_weeks': 2
-            })
+            }), etag)
         
         elif request.method == "POST":
             settings = request.json
@@ -2558,7 +4813,8 @@ def notification_settings():
                 'auto_inspiration': settings.get('auto_inspiration', True),
                 'auto_delete_old_tasks': settings.get('auto_delete_old_tasks', False),  # Add missing setting
                 'auto_cleanup': settings.get('auto_cleanup', False),
-                'cleanup_weeks': settings.get('cleanup_weeks', 2)
+                'cleanup_weeks': settings.get('cleanup_weeks', 2),
+                'shard_slot': user_shard_slot(uid)  # Lets sharded sweeps range-query their users
             }
             
             # Handle both old and new field names for reminder times
@@ -2585,8 +4841,23 @@ def notification_settings():
                 update_data['email'] = settings.get('email')
             
             print(f"💾 Final update_data: {update_data}")
+            previous_data = load_user_data(uid)
             user_ref.update(update_data)
+            forget_request_docs(user_ref)
+            bump_resource_versions(uid, 'settings')
             print("✅ Successfully updated database")
+            
+            # Reminder fire times shift when the reminder offsets or timezone change
+            if (get_user_reminder_times(previous_data) != get_user_reminder_times(update_data) or
+                    previous_data.get('timezone') != update_data.get('timezone')):
+                rebuild_user_reminder_index(uid, {**previous_data, **update_data})
+            
+            # Normalized task dates are resolved in the user's timezone
+            if previous_data.get('timezone') != update_data.get('timezone'):
+                backfill_user_task_fields(uid, {**previous_data, **update_data})
+            
+            # Summary fire time depends on the timezone, summary time and enabled flags
+            sync_user_summary_schedule(uid, {**previous_data, **update_data})
             return jsonify({"status": "Settings updated successfully"})
     
     except Exception as e:
@@ -2601,7 +4872,7 @@ def send_inspiration():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if not db:
@@ -2657,7 +4928,7 @@ def test_notification():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if not db:
@@ -2771,7 +5042,7 @@ def test_task_reminder():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if not db:
@@ -2876,7 +5147,7 @@ def create_test_task():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if not db:
@@ -2896,13 +5167,18 @@ def create_test_task():
             'priority': 'high',
             'completed': False,
             'created_at': current_time,
+            'updated_at': task_timestamp(),
             'user_id': uid
         }
         
         # Save to Firestore
+        user_data = load_user_data(uid)
+        test_task.update(build_task_index_fields(test_task, user_data))
         tasks_ref = db.collection('users').document(uid).collection('tasks')
         doc_ref = tasks_ref.document(test_task['id'])
         doc_ref.set(test_task)
+        bump_resource_versions(uid, 'tasks')
+        sync_task_reminders(uid, test_task['id'], test_task, user_data)
         
         print(f"✅ Created test task for {decoded_claims.get('email', 'user')} - Due at {test_time.strftime('%H:%M')}")
         
@@ -2928,7 +5204,7 @@ def test_daily_summary():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if not db:
@@ -2944,25 +5220,11 @@ def test_daily_summary():
             print(f"📊 Sending test daily summary to {user_email}")
             
             # Get actual completed tasks from today instead of fake ones
-            tasks_ref = db.collection('users').document(uid).collection('tasks')
-            all_tasks = list(tasks_ref.stream())
-            
-            current_time = datetime.now()
-            current_day = current_time.strftime('%A').lower()
+            current_time = get_user_current_time(user_data.get('timezone'))
             today_date = current_time.strftime('%Y-%m-%d')
             
-            actual_completed_tasks = []
-            total_today_tasks = []
-            
-            for task_doc in all_tasks:
-                task_data = task_doc.to_dict()
-                task_day = task_data.get('day', '').lower()
-                
-                # Check if task is for today
-                if task_day == current_day or task_day == 'today' or not task_day:
-                    total_today_tasks.append(task_data)
-                    if task_data.get('completed', False):
-                        actual_completed_tasks.append(task_data)
+            total_today_tasks = get_tasks_for_date(uid, today_date)
+            actual_completed_tasks = [task_data for task_data in total_today_tasks if task_data.get('completed', False)]
             
             # If no actual completed tasks, create sample ones for testing
             if not actual_completed_tasks:
@@ -3070,87 +5332,658 @@ def test_daily_summary():
         return {"error": f"Test failed: {str(e)}"}, 500
 
 
-def check_time_overlap(new_task, existing_tasks):
+def parse_clock_time(time_str):
+    """Convert time string (HH:MM or H:MM AM/PM) to minutes since midnight"""
+    try:
+        time_str = time_str.strip()
+        # Handle 24-hour format
+        if ':' in time_str and ('AM' not in time_str.upper() and 'PM' not in time_str.upper()):
+            hours, minutes = map(int, time_str.split(':'))
+            return hours * 60 + minutes
+        # Handle 12-hour format
+        else:
+            time_str = time_str.upper()
+            is_pm = 'PM' in time_str
+            time_str = time_str.replace('AM', '').replace('PM', '').strip()
+            hours, minutes = map(int, time_str.split(':'))
+            if is_pm and hours != 12:
+                hours += 12
+            elif not is_pm and hours == 12:
+                hours = 0
+            return hours * 60 + minutes
+    except:
+        return None
+
+def parse_time_range(time_range):
+    """Parse a task's 'start-end' time string into (start, end) minutes, or None"""
+    if not time_range or '-' not in time_range:
+        return None
+    try:
+        start_str, end_str = time_range.split('-')
+    except ValueError:
+        return None
+    start = parse_clock_time(start_str)
+    end = parse_clock_time(end_str)
+    if start is None or end is None:
+        return None
+    return start, end
+
+def check_time_overlap(new_task, existing_tasks):
+    """
+    Check if a new task overlaps with existing tasks on the same day/week.
+    Returns (has_conflict, conflicting_tasks_list)
+    """
+    new_interval = parse_time_range(new_task.get('time', ''))
+    if new_interval is None:
+        return False, []  # Can't check without a valid time range
+    
+    partition = build_task_intervals(existing_tasks)['partitions'].get(task_interval_key(new_task))
+    conflicting_tasks = find_overlapping_intervals(partition, *new_interval)
+    return len(conflicting_tasks) > 0, conflicting_tasks
+
+
+# ===== CONDITIONAL GET (ETAGS) =====
+# Writes bump a per-user version counter (resource_versions/{uid}, one field per
+# resource) after they commit. GET responses carry a strong ETag derived from the
+# user, the resource's version and the request variant (query string), and a
+# matching If-None-Match is answered with 304 without reading the resource. Versions
+# are cached per worker for RESOURCE_VERSION_CACHE_TTL for the ETags of full
+# responses, but a conditional request always reads the current version, so a 304
+# from any worker reflects every committed write (read-your-writes across workers).
+RESOURCE_VERSION_COLLECTION = 'resource_versions'
+RESOURCE_VERSION_CACHE_TTL = int(os.getenv('RESOURCE_VERSION_CACHE_TTL', '10'))  # seconds
+WEEK_SCOPE_ETAG_BUCKET = 15 * 60  # weekOffset is relative to "now"; UTC offsets are multiples of 15 minutes
+
+resource_version_cache = {}  # uid -> (versions dict, cached_at)
+resource_version_cache_lock = threading.Lock()
+
+def get_resource_versions(uid, fresh=False):
+    """Get a user's resource version counters, from the per-worker cache when fresh enough (or fresh=False)"""
+    now = time.time()
+    if not fresh:
+        with resource_version_cache_lock:
+            cached = resource_version_cache.get(uid)
+            if cached and now - cached[1] < RESOURCE_VERSION_CACHE_TTL:
+                return cached[0]
+
+    versions_doc = db.collection(RESOURCE_VERSION_COLLECTION).document(uid).get()
+    note_firestore_reads()
+    versions = (versions_doc.to_dict() or {}) if versions_doc.exists else {}
+    with resource_version_cache_lock:
+        resource_version_cache[uid] = (versions, now)
+    return versions
+
+def bump_resource_versions(uid, *resources):
+    """Mark a user's resources as changed so their ETags stop matching; errors are logged, not raised"""
+    if not db or not resources:
+        return
+    try:
+        db.collection(RESOURCE_VERSION_COLLECTION).document(uid).set(
+            {resource: firestore.Increment(1) for resource in resources}, merge=True
+        )
+    except Exception as e:
+        print(f"⚠️ Error bumping resource versions {resources} for user {uid}: {e}")
+    finally:
+        with resource_version_cache_lock:
+            resource_version_cache.pop(uid, None)
+
+def resource_etag(uid, resource, variant=''):
+    """
+    Strong ETag for the current version of one of a user's resources.
+
+    Returns:
+        str: Unquoted ETag, or None if versions are unavailable (response is sent without one)
+    """
+    if not db:
+        return None
+    try:
+        # A cached version could be older than a write another worker just made, which
+        # would turn that write into a 304 for the client that made it
+        revalidating = has_request_context() and bool(request.if_none_match)
+        version = get_resource_versions(uid, fresh=revalidating).get(resource, 0)
+    except Exception as e:
+        print(f"⚠️ Error reading resource versions for user {uid}: {e}")
+        return None
+    # Hashing in the uid keeps ETags from matching across accounts sharing a browser cache
+    return hashlib.sha256(f"{uid}:{resource}:{version}:{variant}".encode('utf-8')).hexdigest()[:32]
+
+def not_modified_response(etag):
+    """Return a 304 response if the request's If-None-Match matches the ETag, else None"""
+    if etag and request.if_none_match.contains(etag):
+        return with_etag(Response(status=304), etag)
+    return None
+
+def with_etag(response, etag):
+    """Attach an ETag and revalidate-every-time caching to a response"""
+    response = make_response(response)
+    if etag:
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+# ===== TASK INTERVAL INDEX =====
+# Conflict detection on save used to stream the user's whole task collection and
+# re-parse every time string. Each worker now keeps, per user, the open tasks'
+# pre-parsed minute intervals partitioned by (weekOffset, day) and sorted by start,
+# with a running max end, so a lookup is a bisect plus a scan of the candidates that
+# can overlap. Entries are tagged with the user's tasks version (see CONDITIONAL
+# GET) and rebuilt when another worker or a bulk path bumps it; save, update and
+# delete keep this worker's entry current in place. Partitions are replaced rather
+# than mutated, so readers never see a half-updated one.
+TASK_INTERVAL_CACHE_TTL = 300  # seconds
+TASK_INTERVAL_CACHE_MAX_USERS = 1000
+TASK_BATCH_MAX_SIZE = 200  # POST /api/tasks/batch; stays within one WriteBatch
+
+task_interval_cache = collections.OrderedDict()  # uid -> {'version', 'partitions', 'task_keys', 'cached_at'}
+task_interval_cache_lock = threading.Lock()
+
+def task_interval_key(task):
+    """Partition key for conflict checks: tasks only conflict within the same week and day"""
+    return (task.get('weekOffset', 0), task.get('day'))
+
+def task_interval(task):
+    """Pre-parsed (start, end, task_id, summary) for an open task with a time range, else None"""
+    if task.get('completed', False):
+        return None
+    time_range = parse_time_range(task.get('time', ''))
+    if time_range is None:
+        return None
+    summary = {
+        'id': task.get('id'),
+        'title': task.get('title', 'Untitled'),
+        'time': task.get('time', ''),
+        'priority': task.get('priority', 'medium')
+    }
+    return (time_range[0], time_range[1], task.get('id') or '', summary)
+
+def build_interval_partition(intervals):
+    """Sort a partition's intervals by start and precompute the running max end"""
+    intervals = sorted(intervals, key=lambda interval: interval[:3])
+    max_ends = []
+    for interval in intervals:
+        max_ends.append(max(max_ends[-1], interval[1]) if max_ends else interval[1])
+    return {
+        'intervals': intervals,
+        'starts': [interval[0] for interval in intervals],
+        'max_ends': max_ends
+    }
+
+def build_task_intervals(tasks):
+    """Build the interval partitions for an iterable of task dicts"""
+    grouped = collections.defaultdict(list)
+    task_keys = {}
+    for task in tasks:
+        interval = task_interval(task)
+        if interval is None:
+            continue
+        key = task_interval_key(task)
+        grouped[key].append(interval)
+        task_keys[interval[2]] = key
+    return {
+        'partitions': {key: build_interval_partition(intervals) for key, intervals in grouped.items()},
+        'task_keys': task_keys
+    }
+
+def find_overlapping_intervals(partition, start, end):
+    """
+    Find the tasks in a partition overlapping [start, end).
+
+    Only intervals starting before end can overlap; walking those back from the
+    bisect point stops as soon as the running max end can no longer reach start.
+    """
+    if not partition:
+        return []
+    overlapping = []
+    index = bisect.bisect_left(partition['starts'], end) - 1
+    while index >= 0 and partition['max_ends'][index] > start:
+        interval = partition['intervals'][index]
+        if interval[1] > start:
+            overlapping.append(interval[3])
+        index -= 1
+    overlapping.reverse()
+    return overlapping
+
+def get_task_intervals(uid):
+    """Get a user's interval index, rebuilding it from Firestore when missing, expired or stale"""
+    version = get_resource_versions(uid).get('tasks', 0)
+    now = time.time()
+    with task_interval_cache_lock:
+        entry = task_interval_cache.get(uid)
+        if entry and entry['version'] == version and now - entry['cached_at'] < TASK_INTERVAL_CACHE_TTL:
+            task_interval_cache.move_to_end(uid)
+            return entry
+
+    tasks_ref = db.collection('users').document(uid).collection('tasks')
+    entry = build_task_intervals(task_doc.to_dict() for task_doc in counted_stream(tasks_ref))
+    entry.update(version=version, cached_at=now)
+    with task_interval_cache_lock:
+        task_interval_cache[uid] = entry
+        task_interval_cache.move_to_end(uid)
+        while len(task_interval_cache) > TASK_INTERVAL_CACHE_MAX_USERS:
+            task_interval_cache.popitem(last=False)
+    return entry
+
+def update_task_interval_cache(uid, task_id, task_data=None):
+    """
+    Apply a task write to this worker's interval index after the tasks version was bumped.
+
+    Args:
+        uid (str): User ID
+        task_id (str): The written task
+        task_data (dict): The task as now stored, or None if it was deleted
+    """
+    apply_task_interval_changes(uid, [(task_id, task_data)])
+
+def apply_task_interval_changes(uid, changes):
+    """
+    Apply task writes covered by a single tasks version bump to this worker's interval index.
+
+    The entry only adopts the bumped version if it is exactly one past the cached
+    version. Anything else means another write (possibly on another worker) landed
+    in between, so the entry is dropped and the next check rebuilds it.
+
+    Args:
+        uid (str): User ID
+        changes (list): (task_id, task data as now stored or None if deleted) pairs
+    """
+    try:
+        version = get_resource_versions(uid).get('tasks', 0)
+    except Exception:
+        version = None
+
+    with task_interval_cache_lock:
+        entry = task_interval_cache.get(uid)
+        if entry is None:
+            return
+        if version is None or version != entry['version'] + 1:
+            task_interval_cache.pop(uid, None)
+            return
+        for task_id, task_data in changes:
+            old_key = entry['task_keys'].pop(task_id, None)
+            if old_key is not None:
+                remaining = [interval for interval in entry['partitions'][old_key]['intervals'] if interval[2] != task_id]
+                entry['partitions'][old_key] = build_interval_partition(remaining)
+            interval = task_interval({**task_data, 'id': task_id}) if task_data is not None else None
+            if interval is not None:
+                key = task_interval_key(task_data)
+                current = entry['partitions'].get(key, {'intervals': []})['intervals']
+                entry['partitions'][key] = build_interval_partition(current + [interval])
+                entry['task_keys'][task_id] = key
+        entry['version'] = version
+
+def find_batch_conflicts(new_tasks, partitions):
+    """
+    Conflict-check a batch of new tasks against existing intervals and each other.
+
+    One sweep per (weekOffset, day) partition over existing and new intervals in
+    start order, keeping the still-open intervals in a heap by end, collects every
+    overlapping pair. New tasks are then accepted in request order: a task is
+    rejected if it overlaps an existing task or an earlier accepted task from the
+    batch, matching what posting them one at a time would do.
+
+    Args:
+        new_tasks (list): Task dicts to check; tasks with 'force' are always accepted
+        partitions (dict): Existing interval partitions from get_task_intervals
+
+    Returns:
+        dict: Index into new_tasks -> list of conflicting task summaries, for rejected tasks
+    """
+    grouped = collections.defaultdict(list)
+    batch_summaries = {}
+    for index, task in enumerate(new_tasks):
+        interval = task_interval(task)
+        if interval is not None:
+            grouped[task_interval_key(task)].append((interval[0], interval[1], index, interval[3]))
+            batch_summaries[index] = interval[3]
+
+    # Overlapping pairs per new task: existing summaries and indexes of other new tasks
+    existing_overlaps = collections.defaultdict(list)
+    batch_overlaps = collections.defaultdict(set)
+    for key, batch_intervals in grouped.items():
+        existing_intervals = partitions.get(key, {}).get('intervals', [])
+        # (start, end, new-task index or None for existing, summary)
+        events = sorted(
+            [(start, end, None, summary) for start, end, _, summary in existing_intervals] + batch_intervals,
+            key=lambda event: (event[0], event[1])
+        )
+        active = []  # heap of (end, sequence, event)
+        for sequence, event in enumerate(events):
+            start, end, index, summary = event
+            while active and active[0][0] <= start:
+                heapq.heappop(active)
+            for _, _, other in active:
+                if not (other[0] < end and start < other[1]):
+                    continue
+                if index is not None and other[2] is not None:
+                    batch_overlaps[index].add(other[2])
+                    batch_overlaps[other[2]].add(index)
+                elif index is not None:
+                    existing_overlaps[index].append(other[3])
+                elif other[2] is not None:
+                    existing_overlaps[other[2]].append(summary)
+            heapq.heappush(active, (end, sequence, event))
+
+    accepted = set()
+    rejected = {}
+    for index, task in enumerate(new_tasks):
+        if task.get('force'):
+            accepted.add(index)
+            continue
+        conflicts = list(existing_overlaps.get(index, []))
+        conflicts.extend(
+            batch_summaries[other] for other in sorted(batch_overlaps.get(index, ())) if other in accepted
+        )
+        if conflicts:
+            rejected[index] = conflicts
+        else:
+            accepted.add(index)
+    return rejected
+
+def check_task_conflicts(uid, new_task):
+    """
+    Check a new task against the user's open tasks using the interval index.
+    Returns (has_conflict, conflicting_tasks_list) like check_time_overlap.
+    """
+    new_interval = parse_time_range(new_task.get('time', ''))
+    if new_interval is None:
+        return False, []
+    partition = get_task_intervals(uid)['partitions'].get(task_interval_key(new_task))
+    conflicting_tasks = find_overlapping_intervals(partition, *new_interval)
+    return len(conflicting_tasks) > 0, conflicting_tasks
+
+# ===== TASK ANALYTICS BUFFER =====
+# task_analytics events (completion toggles, deletions) are buffered in-process and
+# written by a background thread in WriteBatch chunks once ANALYTICS_FLUSH_SIZE
+# events are waiting or every ANALYTICS_FLUSH_INTERVAL seconds, keeping the write
+# off the request path. The buffer is drained at exit. When it already holds
+# ANALYTICS_BUFFER_MAX events, new ones are written synchronously instead.
+# Serverless instances (Vercel) can be frozen between requests, so there buffering
+# is off by default and events are written inline.
+ANALYTICS_ASYNC = os.getenv('ANALYTICS_ASYNC', 'false' if os.getenv('VERCEL') else 'true').lower() in ('1', 'true', 'yes')
+ANALYTICS_BUFFER_MAX = int(os.getenv('ANALYTICS_BUFFER_MAX', '5000'))
+ANALYTICS_FLUSH_SIZE = 200
+ANALYTICS_FLUSH_INTERVAL = 5  # seconds
+
+analytics_buffer = collections.deque()  # (uid, record)
+analytics_buffer_lock = threading.Lock()
+analytics_flush_requested = threading.Event()
+analytics_flusher = {'thread': None, 'pid': None}
+
+def task_analytics_ref(uid):
+    """Reference to users/{uid}/task_analytics"""
+    return db.collection('users').document(uid).collection('task_analytics')
+
+def log_task_analytics(uid, record):
+    """Record a task_analytics event, buffered for a background batch write when possible"""
+    if not db:
+        return
+
+    if ANALYTICS_ASYNC:
+        with analytics_buffer_lock:
+            buffered = len(analytics_buffer) < ANALYTICS_BUFFER_MAX
+            if buffered:
+                analytics_buffer.append((uid, record))
+            pending = len(analytics_buffer)
+        if buffered:
+            ensure_analytics_flusher()
+            if pending >= ANALYTICS_FLUSH_SIZE:
+                analytics_flush_requested.set()
+            return
+        print("⚠️ Analytics buffer full - writing event synchronously")
+
+    task_analytics_ref(uid).add(record)
+
+def flush_task_analytics():
     """
-    Check if a new task overlaps with existing tasks on the same day/week.
-    Returns (has_conflict, conflicting_tasks_list)
+    Write all buffered analytics events in WriteBatch chunks.
+
+    Events from a chunk that fails to commit (and everything after it) go back to the
+    front of the buffer for the next flush, as far as there is room.
+
+    Returns:
+        int: Number of events written
     """
-    def parse_time(time_str):
-        """Convert time string (HH:MM or H:MM AM/PM) to minutes since midnight"""
+    with analytics_buffer_lock:
+        events = list(analytics_buffer)
+        analytics_buffer.clear()
+    if not events or not db:
+        return 0
+
+    written = 0
+    for start in range(0, len(events), FIRESTORE_BATCH_LIMIT):
+        chunk = events[start:start + FIRESTORE_BATCH_LIMIT]
         try:
-            time_str = time_str.strip()
-            # Handle 24-hour format
-            if ':' in time_str and ('AM' not in time_str.upper() and 'PM' not in time_str.upper()):
-                hours, minutes = map(int, time_str.split(':'))
-                return hours * 60 + minutes
-            # Handle 12-hour format
-            else:
-                time_str = time_str.upper()
-                is_pm = 'PM' in time_str
-                time_str = time_str.replace('AM', '').replace('PM', '').strip()
-                hours, minutes = map(int, time_str.split(':'))
-                if is_pm and hours != 12:
-                    hours += 12
-                elif not is_pm and hours == 12:
-                    hours = 0
-                return hours * 60 + minutes
-        except:
-            return None
-    
-    # Extract new task details
-    new_day = new_task.get('day', '')
-    new_week_offset = new_task.get('weekOffset', 0)
-    new_time = new_task.get('time', '')
-    
-    if not new_time or '-' not in new_time:
-        return False, []  # Can't check without time range
-    
+            commit_batched_writes([('set', task_analytics_ref(uid).document(), record) for uid, record in chunk])
+            written += len(chunk)
+        except Exception as e:
+            unwritten = events[start:]
+            with analytics_buffer_lock:
+                requeued = unwritten[:max(0, ANALYTICS_BUFFER_MAX - len(analytics_buffer))]
+                analytics_buffer.extendleft(reversed(requeued))
+            print(f"⚠️ Error flushing task analytics ({len(requeued)} requeued, "
+                  f"{len(unwritten) - len(requeued)} dropped): {e}")
+            break
+    return written
+
+def run_analytics_flusher():
+    """Background loop flushing the analytics buffer on size or time thresholds"""
+    while True:
+        analytics_flush_requested.wait(ANALYTICS_FLUSH_INTERVAL)
+        analytics_flush_requested.clear()
+        try:
+            flush_task_analytics()
+        except Exception as e:
+            print(f"⚠️ Analytics flusher error: {e}")
+
+def ensure_analytics_flusher():
+    """Start this process's flusher thread on first use (after any gunicorn worker fork)"""
+    thread = analytics_flusher['thread']
+    if analytics_flusher['pid'] == os.getpid() and thread is not None and thread.is_alive():
+        return
+    with analytics_buffer_lock:
+        thread = analytics_flusher['thread']
+        if analytics_flusher['pid'] == os.getpid() and thread is not None and thread.is_alive():
+            return
+        thread = threading.Thread(target=run_analytics_flusher, daemon=True, name="analytics-flusher")
+        thread.start()
+        analytics_flusher.update(thread=thread, pid=os.getpid())
+
+atexit.register(flush_task_analytics)
+
+# ===== TASK DELTA SYNC =====
+# Task mutation routes stamp updated_at on every task they write. Deletes leave a
+# tombstone in users/{uid}/task_tombstones. GET /api/tasks returns a sync_token,
+# and GET /api/tasks?since=<token> returns only tasks changed and ids deleted since
+# then, so reads and payload scale with churn instead of history. Tombstones carry
+# expires_at for a Firestore TTL policy. A token older than the retention gets a
+# full response ('full': true).
+TASK_TOMBSTONE_COLLECTION = 'task_tombstones'
+TASK_TOMBSTONE_RETENTION = timedelta(days=30)
+SYNC_TOKEN_OVERLAP = timedelta(seconds=5)  # Re-send recent changes to absorb clock skew between workers
+
+def task_timestamp():
+    """Timestamp for updated_at/deleted_at (timezone-aware UTC so tokens compare correctly)"""
+    return datetime.now(ZoneInfo('UTC'))
+
+def encode_sync_token(sync_time):
+    """Opaque delta sync token for a point in time"""
+    return f"t{int(sync_time.timestamp() * 1000)}"
+
+def decode_sync_token(token):
+    """
+    Parse a delta sync token back into a UTC datetime.
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    if not token or not token.startswith('t'):
+        raise ValueError("Invalid sync token")
+    return datetime.fromtimestamp(int(token[1:]) / 1000, tz=ZoneInfo('UTC'))
+
+def build_task_tombstone_writes(uid, task_ids, deleted_at=None):
+    """Write operations recording deleted tasks for delta sync"""
+    deleted_at = deleted_at or task_timestamp()
+    tombstones_ref = db.collection('users').document(uid).collection(TASK_TOMBSTONE_COLLECTION)
+    return [
+        ('set', tombstones_ref.document(task_id), {
+            'task_id': task_id,
+            'deleted_at': deleted_at,
+            'expires_at': deleted_at + TASK_TOMBSTONE_RETENTION
+        })
+        for task_id in task_ids
+    ]
+
+def record_task_tombstones(uid, task_ids):
+    """Record deleted tasks so delta sync clients remove them; errors are logged, not raised"""
+    if not db or not task_ids:
+        return
     try:
-        new_start_str, new_end_str = new_time.split('-')
-        new_start = parse_time(new_start_str)
-        new_end = parse_time(new_end_str)
-        
-        if new_start is None or new_end is None:
-            return False, []  # Invalid time format
-    except:
-        return False, []
-    
-    conflicting_tasks = []
-    
-    for task in existing_tasks:
-        # Skip completed tasks
-        if task.get('completed', False):
-            continue
-        
-        # Check if same day and week
-        if task.get('day') != new_day or task.get('weekOffset', 0) != new_week_offset:
-            continue
-        
-        task_time = task.get('time', '')
-        if not task_time or '-' not in task_time:
-            continue
-        
+        commit_batched_writes(build_task_tombstone_writes(uid, task_ids))
+    except Exception as e:
+        print(f"⚠️ Error recording task tombstones for user {uid}: {e}")
+
+def serialize_task(task_data):
+    """Convert a task document for JSON (datetimes to ISO strings)"""
+    for field in ('created_at', 'updated_at'):
+        if isinstance(task_data.get(field), datetime):
+            task_data[field] = task_data[field].isoformat()
+    return task_data
+
+# ===== TASK LISTING =====
+# GET /api/tasks can be scoped to one planner week (?weekOffset=N, relative to the
+# user's current Sunday-Saturday week) or a date range (?start=&end=, YYYY-MM-DD),
+# both served from the normalized date field, and paged with ?limit=N and the
+# returned next_cursor. The JSON body is streamed in chunks as documents arrive,
+# so a user with years of tasks never has the whole listing held in memory.
+# Listings of up to TASK_ETAG_MAX_BUFFERED_CHUNKS chunks are read completely before
+# responding and carry an ETag; larger ones stream without one, since a stream that
+# fails midway would otherwise be cached as a truncated body under a valid ETag.
+TASK_PAGE_MAX_LIMIT = 500
+TASK_STREAM_CHUNK_SIZE = 50
+TASK_ETAG_MAX_BUFFERED_CHUNKS = 10
+
+def get_week_date_range(week_offset, user_data):
+    """Get the (Sunday, Saturday) date strings of a planner week relative to the user's current week"""
+    today = datetime.now(get_user_timezone(user_data)).date()
+    week_start = today - timedelta(days=(today.weekday() + 1) % 7) + timedelta(weeks=week_offset)
+    return week_start.isoformat(), (week_start + timedelta(days=6)).isoformat()
+
+def encode_task_cursor(task_data, cursor_fields):
+    """Opaque pagination cursor from the ordering fields of the last task on a page"""
+    values = [task_data.get(field) for field in cursor_fields]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip('=')
+
+def decode_task_cursor(cursor, cursor_fields):
+    """
+    Parse a pagination cursor into start_after field values.
+
+    Raises:
+        ValueError: If the cursor is malformed or from a differently ordered listing
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(cursor_fields):
+        raise ValueError("Invalid cursor")
+    return dict(zip(cursor_fields, values))
+
+def parse_task_listing_params(args, uid):
+    """
+    Parse the scope and paging query parameters of GET /api/tasks.
+
+    Returns:
+        dict: start/end date strings (or None), limit (or None), cursor_fields and start_after
+
+    Raises:
+        ValueError: With a client-facing message for invalid parameters
+    """
+    start_date = end_date = None
+    if args.get('weekOffset') not in (None, ''):
         try:
-            task_start_str, task_end_str = task_time.split('-')
-            task_start = parse_time(task_start_str)
-            task_end = parse_time(task_end_str)
-            
-            if task_start is None or task_end is None:
-                continue
-            
-            # Check for overlap: tasks overlap if one starts before the other ends
-            if (new_start < task_end and new_end > task_start):
-                conflicting_tasks.append({
-                    'id': task.get('id'),
-                    'title': task.get('title', 'Untitled'),
-                    'time': task_time,
-                    'priority': task.get('priority', 'medium')
-                })
-        except:
-            continue
-    
-    return len(conflicting_tasks) > 0, conflicting_tasks
+            week_offset = int(args['weekOffset'])
+        except ValueError:
+            raise ValueError("weekOffset must be an integer")
+        start_date, end_date = get_week_date_range(week_offset, load_user_data(uid))
+    else:
+        for name in ('start', 'end'):
+            value = args.get(name)
+            if value and not parse_task_date(value):
+                raise ValueError(f"{name} must be a YYYY-MM-DD date")
+        start_date = args.get('start') or None
+        end_date = args.get('end') or None
+        if start_date and end_date and start_date > end_date:
+            raise ValueError("start must not be after end")
+
+    limit = None
+    if args.get('limit') not in (None, ''):
+        try:
+            limit = int(args['limit'])
+        except ValueError:
+            raise ValueError("limit must be an integer")
+        if not 1 <= limit <= TASK_PAGE_MAX_LIMIT:
+            raise ValueError(f"limit must be between 1 and {TASK_PAGE_MAX_LIMIT}")
+
+    # Date-scoped listings are ordered by date; id breaks ties so cursors are stable
+    cursor_fields = ['date', 'id'] if (start_date or end_date) else ['id']
+    cursor = args.get('cursor')
+    if cursor and limit is None:
+        raise ValueError("cursor requires limit")
+
+    return {
+        'start': start_date,
+        'end': end_date,
+        'limit': limit,
+        'cursor_fields': cursor_fields,
+        'start_after': decode_task_cursor(cursor, cursor_fields) if cursor else None
+    }
+
+def build_task_listing_query(tasks_ref, params):
+    """Map parsed listing parameters onto a Firestore query"""
+    query = tasks_ref
+    if params['start']:
+        query = query.where(filter=firestore.FieldFilter('date', '>=', params['start']))
+    if params['end']:
+        query = query.where(filter=firestore.FieldFilter('date', '<=', params['end']))
+    if params['limit'] is not None:
+        for field in params['cursor_fields']:
+            query = query.order_by(field)
+        if params['start_after']:
+            query = query.start_after(params['start_after'])
+        query = query.limit(params['limit'])
+    elif params['start'] or params['end']:
+        query = query.order_by('date')
+    return query
+
+def stream_task_listing(task_docs, response_fields, params=None):
+    """
+    Stream a task listing as a JSON object, one chunk of tasks at a time.
 
+    Yields '{"status": "success", "tasks": [...], <response_fields>, "count": N,
+    "next_cursor": ...}'. next_cursor is only set when a page came back full.
+    """
+    limit = params['limit'] if params else None
+    count = 0
+    last_task = None
+    yield '{"status": "success", "tasks": ['
+    try:
+        for task_chunk in chunked(task_docs, TASK_STREAM_CHUNK_SIZE):
+            encoded_tasks = []
+            for task_doc in task_chunk:
+                last_task = serialize_task(task_doc.to_dict())
+                encoded_tasks.append(app.json.dumps(last_task))
+            yield (', ' if count else '') + ', '.join(encoded_tasks)
+            count += len(task_chunk)
+    except Exception as e:
+        # Headers are already sent; the truncated body fails to parse client-side
+        print(f"❌ Error streaming tasks: {e}")
+        raise
+
+    next_cursor = None
+    if limit is not None and count == limit and last_task:
+        next_cursor = encode_task_cursor(last_task, params['cursor_fields'])
+    tail = dict(response_fields, count=count, next_cursor=next_cursor)
+    yield '], ' + app.json.dumps(tail)[1:]
 
 @app.route("/api/tasks", methods=["POST"])
 def save_task():
@@ -3160,7 +5993,7 @@ def save_task():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if not db:
@@ -3174,13 +6007,8 @@ def save_task():
         force_save = task_data.get('force', False)
         
         if not force_save and task_data.get('time') and task_data.get('day'):
-            # Get existing tasks for conflict checking
-            tasks_ref = db.collection('users').document(uid).collection('tasks')
-            existing_tasks_docs = tasks_ref.stream()
-            existing_tasks = [doc.to_dict() for doc in existing_tasks_docs]
-            
-            # Check for conflicts
-            has_conflict, conflicting_tasks = check_time_overlap(task_data, existing_tasks)
+            # Check for conflicts against the cached interval index
+            has_conflict, conflicting_tasks = check_task_conflicts(uid, task_data)
             
             if has_conflict:
                 print(f"⚠️ Time conflict detected for task '{task_data.get('title')}' with {len(conflicting_tasks)} existing task(s)")
@@ -3198,6 +6026,7 @@ def save_task():
         # Add metadata
         task_data.update({
             'created_at': datetime.now(),
+            'updated_at': task_timestamp(),
             'user_id': uid,
             'id': task_data.get('id', str(uuid.uuid4())),
             'completed': task_data.get('completed', False)
@@ -3206,10 +6035,17 @@ def save_task():
         # Remove 'force' flag before saving
         task_data.pop('force', None)
         
+        # Normalized fields for date/start-time queries
+        user_data = load_user_data(uid)
+        task_data.update(build_task_index_fields(task_data, user_data))
+        
         # Save to Firestore
         tasks_ref = db.collection('users').document(uid).collection('tasks')
         doc_ref = tasks_ref.document(task_data['id'])
         doc_ref.set(task_data)
+        bump_resource_versions(uid, 'tasks')
+        update_task_interval_cache(uid, task_data['id'], task_data)
+        sync_task_reminders(uid, task_data['id'], task_data, user_data)
         
         print(f"✅ Task saved to Firestore: {task_data.get('title')} for user {uid}")
         
@@ -3225,35 +6061,80 @@ def save_task():
 
 @app.route("/api/tasks", methods=["GET"])
 def get_tasks():
-    """Get user's tasks from Firestore"""
+    """Get user's tasks from Firestore (all, changed since a sync token, or one week/date range, optionally paged)"""
     session_cookie = request.cookies.get(SESSION_COOKIE_NAME)
     if not session_cookie:
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if not db:
             return {"error": "Database not available"}, 500
         
-        # Get tasks from Firestore
+        # Conditional GET: the listing only changes with the tasks version (and the week for weekOffset)
+        etag_variant = request.query_string.decode('utf-8')
+        if request.args.get('weekOffset'):
+            etag_variant += f"|{int(time.time() // WEEK_SCOPE_ETAG_BUCKET)}"
+        etag = resource_etag(uid, 'tasks', etag_variant)
+        not_modified = not_modified_response(etag)
+        if not_modified:
+            return not_modified
+        
         tasks_ref = db.collection('users').document(uid).collection('tasks')
-        all_tasks = list(tasks_ref.stream())
+        sync_started = task_timestamp()
         
-        tasks = []
-        for task_doc in all_tasks:
-            task_data = task_doc.to_dict()
-            # Convert datetime to string for JSON serialization
-            if 'created_at' in task_data:
-                task_data['created_at'] = task_data['created_at'].isoformat()
-            tasks.append(task_data)
+        try:
+            listing_params = parse_task_listing_params(request.args, uid)
+        except ValueError as e:
+            return {"error": str(e)}, 400
+        scoped = bool(listing_params['start'] or listing_params['end'])
+        
+        # Delta mode: only tasks changed and ids deleted since the client's token
+        since_token = request.args.get('since')
+        since_time = None
+        if since_token:
+            if scoped or listing_params['limit'] is not None:
+                return {"error": "since cannot be combined with weekOffset, start, end or limit"}, 400
+            try:
+                since_time = decode_sync_token(since_token)
+            except ValueError:
+                return {"error": "Invalid since token"}, 400
+            if since_time < sync_started - TASK_TOMBSTONE_RETENTION:
+                since_time = None  # Tombstones may be gone, fall back to a full sync
+        
+        deleted = []
+        if since_time is not None:
+            task_docs = tasks_ref.where(filter=firestore.FieldFilter('updated_at', '>', since_time)).stream()
+            tombstones_ref = db.collection('users').document(uid).collection(TASK_TOMBSTONE_COLLECTION)
+            deleted = [
+                doc.id for doc in
+                counted_stream(tombstones_ref.where(filter=firestore.FieldFilter('deleted_at', '>', since_time)))
+            ]
+        else:
+            task_docs = build_task_listing_query(tasks_ref, listing_params).stream()
         
-        return jsonify({
-            "status": "success",
-            "tasks": tasks,
-            "count": len(tasks)
-        })
+        # full: the response replaces the client's task list (not a delta, week or page)
+        full = since_time is None and not scoped and listing_params['limit'] is None
+        response_fields = {"full": full, "deleted": deleted}
+        if scoped:
+            response_fields.update(start=listing_params['start'], end=listing_params['end'])
+        else:
+            # When paging, keep the token from the first page for the next delta sync
+            response_fields['sync_token'] = encode_sync_token(sync_started - SYNC_TOKEN_OVERLAP)
+        
+        # Read the first chunks before answering, so a failing query (e.g. a missing
+        # index) is a 500 rather than a truncated 200
+        listing = stream_task_listing(task_docs, response_fields, listing_params)
+        buffered = list(itertools.islice(listing, TASK_ETAG_MAX_BUFFERED_CHUNKS + 2))  # + opening and tail
+        next_piece = next(listing, None)
+        if next_piece is None:
+            return with_etag(Response(''.join(buffered), mimetype='application/json'), etag)
+        return Response(
+            stream_with_context(itertools.chain(buffered, [next_piece], listing)),
+            mimetype='application/json'
+        )
     
     except Exception as e:
         print(f"❌ Get tasks error: {e}")
@@ -3267,7 +6148,7 @@ def update_task(task_id):
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if not db:
@@ -3277,9 +6158,9 @@ def update_task(task_id):
         if not task_data:
             return {"error": "No task data provided"}, 400
         
-        # Get the existing task to compare changes
+        # Get the existing task to compare changes (with the user doc needed for reminders)
         task_ref = db.collection('users').document(uid).collection('tasks').document(task_id)
-        existing_task = task_ref.get()
+        existing_task, _ = get_request_docs(task_ref, user_doc_ref(uid))
         
         # Track task completion patterns for AI learning
         if existing_task.exists:
@@ -3289,15 +6170,8 @@ def update_task(task_id):
             
             # If task completion status changed, log it for learning (unless privacy mode is on)
             if new_completed != old_completed:
-                # Check if user has privacy mode enabled
-                user_ref = db.collection('users').document(uid)
-                prefs_doc = user_ref.collection('preferences').document('main').get()
-                privacy_mode = False
-                if prefs_doc.exists:
-                    privacy_mode = prefs_doc.to_dict().get('privacyMode', False)
-                
                 # Only track if privacy mode is OFF
-                if not privacy_mode:
+                if not is_privacy_mode_enabled(uid):
                     completion_data = {
                         'task_id': task_id,
                         'task_title': task_data.get('title', old_task.get('title', '')),
@@ -3309,18 +6183,28 @@ def update_task(task_id):
                         'description': task_data.get('description', old_task.get('description', ''))
                     }
                     
-                    # Store in learning analytics collection
-                    learning_ref = db.collection('users').document(uid).collection('task_analytics')
-                    learning_ref.add(completion_data)
+                    # Store in learning analytics collection (buffered, written in the background)
+                    log_task_analytics(uid, completion_data)
                     print(f"📊 Logged task completion pattern: {completion_data['task_title']} - completed: {new_completed}")
                 else:
                     print(f"🔒 Privacy mode enabled - skipping task analytics tracking")
         
+        # Normalized fields and reminder fire times depend on the merged task (time, day, completion)
+        user_data = load_user_data(uid)
+        merged_task = {**(existing_task.to_dict() if existing_task.exists else {}), **task_data}
+        index_fields = build_task_index_fields(merged_task, user_data)
+        merged_task.update(index_fields)
+        
         # Update task in Firestore
         task_ref.update({
             **task_data,
-            'updated_at': datetime.now()
+            **index_fields,
+            'updated_at': task_timestamp()
         })
+        bump_resource_versions(uid, 'tasks')
+        update_task_interval_cache(uid, task_id, merged_task)
+        
+        sync_task_reminders(uid, task_id, merged_task, user_data)
         
         print(f"✅ Task updated in Firestore: {task_id} for user {uid}")
         
@@ -3333,6 +6217,27 @@ def update_task(task_id):
         print(f"❌ Update task error: {e}")
         return {"error": f"Failed to update task: {str(e)}"}, 500
 
+def is_privacy_mode_enabled(uid):
+    """Check the user's privacy mode preference (analytics are not recorded when it is on)"""
+    prefs_doc = get_request_docs(user_preferences_ref(uid))[0]
+    if prefs_doc.exists:
+        return prefs_doc.to_dict().get('privacyMode', False)
+    return False
+
+def build_task_deletion_record(task_id, task_data):
+    """Build the task_analytics entry logged when a task is deleted (likely abandoned/not wanted)"""
+    return {
+        'task_id': task_id,
+        'task_title': task_data.get('title', ''),
+        'task_category': task_data.get('category', ''),
+        'deleted': True,
+        'completed': task_data.get('completed', False),
+        'timestamp': datetime.now(),
+        'date': task_data.get('date', ''),
+        'time': task_data.get('time', ''),
+        'description': task_data.get('description', '')
+    }
+
 @app.route("/api/tasks/<task_id>", methods=["DELETE"])
 def delete_task(task_id):
     """Delete a task from Firestore"""
@@ -3341,50 +6246,36 @@ def delete_task(task_id):
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if not db:
             return {"error": "Database not available"}, 500
         
-        # Get task data before deleting for learning analytics
+        # Get task data before deleting for learning analytics, with the privacy and reminder settings
         task_ref = db.collection('users').document(uid).collection('tasks').document(task_id)
-        task_doc = task_ref.get()
+        task_doc, _, _ = get_request_docs(task_ref, user_doc_ref(uid), user_preferences_ref(uid))
         
         if task_doc.exists:
             task_data = task_doc.to_dict()
             
-            # Check if user has privacy mode enabled
-            user_ref = db.collection('users').document(uid)
-            prefs_doc = user_ref.collection('preferences').document('main').get()
-            privacy_mode = False
-            if prefs_doc.exists:
-                privacy_mode = prefs_doc.to_dict().get('privacyMode', False)
-            
             # Only track deletion if privacy mode is OFF
-            if not privacy_mode:
+            if not is_privacy_mode_enabled(uid):
                 # Log deleted task (likely abandoned/not wanted)
-                deletion_data = {
-                    'task_id': task_id,
-                    'task_title': task_data.get('title', ''),
-                    'task_category': task_data.get('category', ''),
-                    'deleted': True,
-                    'completed': task_data.get('completed', False),
-                    'timestamp': datetime.now(),
-                    'date': task_data.get('date', ''),
-                    'time': task_data.get('time', ''),
-                    'description': task_data.get('description', '')
-                }
+                deletion_data = build_task_deletion_record(task_id, task_data)
                 
-                # Store in learning analytics
-                learning_ref = db.collection('users').document(uid).collection('task_analytics')
-                learning_ref.add(deletion_data)
+                # Store in learning analytics (buffered, written in the background)
+                log_task_analytics(uid, deletion_data)
                 print(f"📊 Logged task deletion: {deletion_data['task_title']} - was completed: {deletion_data['completed']}")
             else:
                 print(f"🔒 Privacy mode enabled - skipping task deletion analytics")
         
         # Delete task from Firestore
         task_ref.delete()
+        record_task_tombstones(uid, [task_id])
+        bump_resource_versions(uid, 'tasks')
+        update_task_interval_cache(uid, task_id)
+        remove_task_reminders(uid, [task_id])
         
         print(f"✅ Task deleted from Firestore: {task_id} for user {uid}")
         
@@ -3397,6 +6288,106 @@ def delete_task(task_id):
         print(f"❌ Delete task error: {e}")
         return {"error": f"Failed to delete task: {str(e)}"}, 500
 
+@app.route("/api/tasks/batch", methods=["POST"])
+def save_tasks_batch():
+    """
+    Save a list of tasks (e.g. an assistant's task block) with one conflict check and one write batch.
+
+    Tasks are checked against existing tasks and each other in a single sweep; conflicting
+    ones are returned instead of saved, unless the batch or the task sets 'force'.
+    """
+    session_cookie = request.cookies.get(SESSION_COOKIE_NAME)
+    if not session_cookie:
+        return {"error": "Not authenticated"}, 401
+    
+    try:
+        decoded_claims = verify_session(session_cookie)
+        uid = decoded_claims['uid']
+        
+        if not db:
+            return {"error": "Database not available"}, 500
+        
+        data = request.json
+        if not data or not isinstance(data.get('tasks'), list):
+            return {"error": "tasks array required"}, 400
+        
+        new_tasks = data['tasks']
+        if not new_tasks:
+            return {"error": "No tasks provided"}, 400
+        if len(new_tasks) > TASK_BATCH_MAX_SIZE:
+            return {"error": f"At most {TASK_BATCH_MAX_SIZE} tasks per batch"}, 400
+        if not all(isinstance(task, dict) for task in new_tasks):
+            return {"error": "Each task must be an object"}, 400
+        
+        # A repeated id would be counted twice and overwrite itself within the write batch
+        task_ids = [task['id'] for task in new_tasks if task.get('id')]
+        if not all(is_valid_document_id(task_id) for task_id in task_ids):
+            return {"error": "Task ids must be valid task ids"}, 400
+        if len(set(task_ids)) != len(task_ids):
+            return {"error": "Duplicate task id in batch"}, 400
+        
+        if data.get('force', False):
+            rejected = {}
+        else:
+            rejected = find_batch_conflicts(new_tasks, get_task_intervals(uid)['partitions'])
+        
+        user_data = load_user_data(uid)
+        tasks_ref = db.collection('users').document(uid).collection('tasks')
+        saved_tasks = []
+        task_writes = []
+        for index, task_data in enumerate(new_tasks):
+            if index in rejected:
+                continue
+            task_data = dict(task_data)
+            task_data.pop('force', None)
+            task_data.update({
+                'created_at': datetime.now(),
+                'updated_at': task_timestamp(),
+                'user_id': uid,
+                'id': task_data.get('id') or str(uuid.uuid4()),
+                'completed': task_data.get('completed', False)
+            })
+            task_data.update(build_task_index_fields(task_data, user_data))
+            task_writes.append(('set', tasks_ref.document(task_data['id']), task_data))
+            saved_tasks.append((index, task_data))
+        
+        # TASK_BATCH_MAX_SIZE keeps this to a single WriteBatch commit
+        commit_batched_writes(task_writes)
+        if saved_tasks:
+            bump_resource_versions(uid, 'tasks')
+            apply_task_interval_changes(uid, [(task_data['id'], task_data) for _, task_data in saved_tasks])
+            try:
+                commit_batched_writes([
+                    write
+                    for _, task_data in saved_tasks
+                    for write in build_task_reminder_writes(uid, task_data['id'], task_data, user_data)
+                ])
+            except Exception as e:
+                print(f"⚠️ Error updating reminder index for batch of {len(saved_tasks)} tasks: {e}")
+        
+        conflicts = [
+            {
+                "index": index,
+                "title": new_tasks[index].get('title'),
+                "time": new_tasks[index].get('time'),
+                "day": new_tasks[index].get('day'),
+                "conflicts": rejected[index]
+            }
+            for index in sorted(rejected)
+        ]
+        print(f"✅ Batch saved {len(saved_tasks)}/{len(new_tasks)} tasks for user {uid} ({len(conflicts)} conflicts)")
+        
+        return jsonify({
+            "status": "success" if not conflicts else "partial",
+            "saved": [{"index": index, "id": task_data['id']} for index, task_data in saved_tasks],
+            "conflicts": conflicts,
+            "saved_count": len(saved_tasks)
+        })
+    
+    except Exception as e:
+        print(f"❌ Batch save tasks error: {e}")
+        return {"error": f"Failed to save tasks: {str(e)}"}, 500
+
 @app.route("/api/tasks/bulk-delete", methods=["POST"])
 def bulk_delete_tasks():
     """Delete multiple tasks from Firestore"""
@@ -3405,44 +6396,71 @@ def bulk_delete_tasks():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if not db:
             return {"error": "Database not available"}, 500
         
         data = request.json
-        print(f"🔍 Bulk delete request data: {data}")
-        
         if not data or 'task_ids' not in data:
             return {"error": "task_ids array required"}, 400
         
         task_ids = data['task_ids']
-        print(f"🔍 Task IDs to delete: {task_ids} (count: {len(task_ids)})")
-        
         if not isinstance(task_ids, list):
             return {"error": "task_ids must be an array"}, 400
         
-        # Delete tasks from Firestore
-        deleted_count = 0
-        tasks_ref = db.collection('users').document(uid).collection('tasks')
-        
-        for task_id in task_ids:
-            try:
-                print(f"🔍 Attempting to delete task: {task_id}")
-                task_ref = tasks_ref.document(task_id)
-                task_ref.delete()
-                deleted_count += 1
-                print(f"✅ Successfully deleted task: {task_id}")
-            except Exception as e:
-                print(f"❌ Failed to delete task {task_id}: {e}")
+        if not all(is_valid_document_id(task_id) for task_id in task_ids):
+            return {"error": "task_ids must be valid task ids"}, 400
         
-        print(f"✅ Bulk deleted {deleted_count}/{len(task_ids)} tasks from Firestore for user {uid}")
+        task_ids = list(dict.fromkeys(task_ids))
+        tasks_ref = db.collection('users').document(uid).collection('tasks')
+        learning_ref = task_analytics_ref(uid)
+        get_request_docs(user_doc_ref(uid), user_preferences_ref(uid))
+        user_data = load_user_data(uid)
+        
+        # Read the tasks in one batched call: only existing tasks are deleted and tombstoned,
+        # and they carry the same deletion analytics delete_task records
+        existing_docs = {}
+        if task_ids:
+            note_firestore_reads(len(task_ids))
+            existing_docs = {task_doc.id: task_doc
+                             for task_doc in db.get_all([tasks_ref.document(task_id) for task_id in task_ids])
+                             if task_doc.exists}
+        not_found_ids = [task_id for task_id in task_ids if task_id not in existing_docs]
+        task_ids = [task_id for task_id in task_ids if task_id in existing_docs]
+        task_refs = [tasks_ref.document(task_id) for task_id in task_ids]
+        analytics_by_id = {}
+        if not is_privacy_mode_enabled(uid):
+            analytics_by_id = {task_id: build_task_deletion_record(task_id, existing_docs[task_id].to_dict())
+                               for task_id in task_ids}
+        
+        # Each task's delete, analytics entry, tombstone and reminder cleanup commit together
+        tombstone_writes = build_task_tombstone_writes(uid, task_ids)
+        write_groups = []
+        for task_ref, tombstone_write in zip(task_refs, tombstone_writes):
+            group = [('delete', task_ref, None), tombstone_write]
+            if task_ref.id in analytics_by_id:
+                group.append(('set', learning_ref.document(), analytics_by_id[task_ref.id]))
+            group.extend(build_reminder_delete_writes(uid, [task_ref.id], user_data))
+            write_groups.append(group)
+        
+        committed = commit_write_groups(write_groups)
+        deleted_count = sum(committed)
+        failed_ids = [task_id for task_id, ok in zip(task_ids, committed) if not ok]
+        if deleted_count:
+            bump_resource_versions(uid, 'tasks')
+        
+        print(f"✅ Bulk deleted {deleted_count}/{len(task_ids)} tasks from Firestore for user {uid}"
+              f" ({len(analytics_by_id)} analytics entries, {len(failed_ids)} failed,"
+              f" {len(not_found_ids)} not found)")
         
         return jsonify({
             "status": "success",
             "message": f"Deleted {deleted_count} tasks successfully",
-            "deleted_count": deleted_count
+            "deleted_count": deleted_count,
+            "failed_ids": failed_ids,
+            "not_found_ids": not_found_ids
         })
     
     except Exception as e:
@@ -3457,12 +6475,17 @@ def get_class_schedule():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if not db:
             return {"error": "Database not available"}, 500
         
+        etag = resource_etag(uid, 'class_schedule')
+        not_modified = not_modified_response(etag)
+        if not_modified:
+            return not_modified
+        
         # Get user's class schedule document
         doc_ref = db.collection('class_schedules').document(uid)
         doc = doc_ref.get()
@@ -3470,7 +6493,7 @@ def get_class_schedule():
         if doc.exists:
             schedule_data = doc.to_dict()
             print(f"✅ Retrieved class schedule for user {uid}")
-            return jsonify(schedule_data)
+            return with_etag(jsonify(schedule_data), etag)
         else:
             # Return default structure if no schedule exists
             default_schedule = {
@@ -3483,7 +6506,7 @@ def get_class_schedule():
                 "classes": []
             }
             print(f"📝 No class schedule found for user {uid}, returning default")
-            return jsonify(default_schedule)
+            return with_etag(jsonify(default_schedule), etag)
     
     except Exception as e:
         print(f"❌ Get class schedule error: {e}")
@@ -3497,7 +6520,7 @@ def save_class_schedule():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if not db:
@@ -3515,6 +6538,7 @@ def save_class_schedule():
         # Save to Firestore
         doc_ref = db.collection('class_schedules').document(uid)
         doc_ref.set(schedule_data, merge=True)
+        bump_resource_versions(uid, 'class_schedule')
         
         print(f"✅ Saved class schedule for user {uid}")
         return jsonify({
@@ -3534,7 +6558,7 @@ def get_weather():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         
         # Get coordinates from request
         data = request.get_json()
@@ -3561,7 +6585,7 @@ def get_weather_for_city(city):
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         
         # Check if input is a zipcode (5 digits) or city name
         if city.isdigit() and len(city) == 5:
@@ -3585,7 +6609,7 @@ def search_cities_api():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         
         # Get search query from URL parameters
         query = request.args.get('q', '').strip()
@@ -3615,7 +6639,7 @@ def get_weather_by_coordinates_api():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         
         # Get coordinates from request
         data = request.get_json()
@@ -3642,12 +6666,17 @@ def user_settings():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if request.method == "GET":
             # Get user settings from Firestore
             try:
+                etag = resource_etag(uid, 'settings', 'user-settings')
+                not_modified = not_modified_response(etag)
+                if not_modified:
+                    return not_modified
+                
                 user_ref = db.collection('users').document(uid)
                 user_doc = user_ref.get()
                 
@@ -3655,12 +6684,12 @@ def user_settings():
                     user_data = user_doc.to_dict()
                     settings = user_data.get('settings', {})
                     print(f"✅ Retrieved settings for user {uid}: {settings}")
-                    return jsonify(settings)
+                    return with_etag(jsonify(settings), etag)
                 else:
                     # Return default settings if no user doc exists
                     default_settings = {"theme": "light"}
                     print(f"📄 No settings found for user {uid}, returning defaults")
-                    return jsonify(default_settings)
+                    return with_etag(jsonify(default_settings), etag)
                     
             except Exception as e:
                 print(f"❌ Error getting user settings: {e}")
@@ -3680,6 +6709,7 @@ def user_settings():
                     'settings': data,
                     'updated_at': firestore.SERVER_TIMESTAMP
                 }, merge=True)
+                bump_resource_versions(uid, 'settings')
                 
                 print(f"✅ Updated settings for user {uid}: {data}")
                 return jsonify({
@@ -3704,7 +6734,7 @@ def push_subscription():
         return {"error": "Not authenticated"}, 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if request.method == "POST":
@@ -3730,9 +6760,12 @@ def push_subscription():
                 
                 # Save subscription to user document
                 user_ref.set({
-                    'push_subscription': subscription,
+                    'push_subscriptions': {
+                        push_subscription_id(subscription['endpoint']): subscription
+                    },
                     'push_subscription_updated_at': firestore.SERVER_TIMESTAMP
                 }, merge=True)
+                invalidate_push_subscription_cache(uid)
                 
                 print(f"✅ Saved push subscription for user {uid}")
                 print(f"   Endpoint: {subscription.get('endpoint', 'N/A')[:50]}...")
@@ -3747,14 +6780,22 @@ def push_subscription():
                 return {"error": f"Failed to save subscription: {str(e)}"}, 500
         
         elif request.method == "DELETE":
-            # Remove push subscription
+            # Remove push subscription (one device if an endpoint is given, otherwise all)
             try:
-                user_ref = db.collection('users').document(uid)
+                data = request.get_json(silent=True) or {}
+                endpoint = data.get('endpoint')
                 
-                # Remove subscription from user document
-                user_ref.update({
-                    'push_subscription': firestore.DELETE_FIELD
-                })
+                if endpoint:
+                    remove_push_subscription(uid, endpoint)
+                else:
+                    user_ref = db.collection('users').document(uid)
+                    
+                    # Remove subscriptions from user document
+                    user_ref.update({
+                        'push_subscriptions': firestore.DELETE_FIELD,
+                        'push_subscription': firestore.DELETE_FIELD
+                    })
+                    invalidate_push_subscription_cache(uid)
                 
                 print(f"✅ Removed push subscription for user {uid}")
                 
@@ -3789,7 +6830,7 @@ def health_check():
         db_status = "healthy" if db else "unhealthy"
         
         # Check if scheduler is running (Railway specific)
-        scheduler_status = "running" if os.getenv('RAILWAY_ENVIRONMENT') and db else "disabled"
+        scheduler_status = get_scheduler_status() if os.getenv('RAILWAY_ENVIRONMENT') and db else "disabled"
         if ENV != 'production' and not os.getenv('RAILWAY_ENVIRONMENT'):
             scheduler_status = "dev_mode"
         
@@ -3813,6 +6854,8 @@ def health_check():
             "environment": ENV,
             "platform": "railway" if os.getenv('RAILWAY_ENVIRONMENT') else "vercel" if os.getenv('VERCEL') else "local",
             "services": services,
+            "weather_cache": get_weather_cache_stats(),
+            "city_search": get_city_search_stats(),
             "version": "2.0.0"
         }), status_code
         
@@ -4041,7 +7084,7 @@ def planning_assistant():
         return {"error": "Assistant service unavailable. Please configure GEMINI_API_KEY."}, 503
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         # Get request data
@@ -4281,7 +7324,7 @@ When user asks about places/restaurants/nearby activities:
         try:
             if db:
                 tasks_ref = db.collection('users').document(uid).collection('tasks')
-                all_tasks_docs = tasks_ref.stream()
+                all_tasks_docs = counted_stream(tasks_ref)
                 for task_doc in all_tasks_docs:
                     task_data = task_doc.to_dict()
                     # Only include non-completed tasks for conflict checking
@@ -4809,6 +7852,9 @@ User Question: {user_message}"""
                             try:
                                 if action_type == "delete":
                                     tasks_ref.document(task_id_to_process).delete()
+                                    record_task_tombstones(uid, [task_id_to_process])
+                                    bump_resource_versions(uid, 'tasks')
+                                    remove_task_reminders(uid, [task_id_to_process])
                                     task_actions_performed.append({
                                         "action": "deleted",
                                         "task": task_data.get('title', 'Unknown task'),
@@ -4819,8 +7865,12 @@ User Question: {user_message}"""
                                 
                                 elif action_type == "edit":
                                     # Update with provided changes
-                                    update_data = {**updates, 'updated_at': datetime.now()}
+                                    update_data = {**updates, 'updated_at': task_timestamp()}
+                                    assistant_user_data = load_user_data(uid)
+                                    update_data.update(build_task_index_fields({**task_data, **update_data}, assistant_user_data))
                                     tasks_ref.document(task_id_to_process).update(update_data)
+                                    bump_resource_versions(uid, 'tasks')
+                                    sync_task_reminders(uid, task_id_to_process, {**task_data, **update_data}, assistant_user_data)
                                     task_actions_performed.append({
                                         "action": "edited",
                                         "task": task_data.get('title', 'Unknown task'),
@@ -4834,8 +7884,10 @@ User Question: {user_message}"""
                                     tasks_ref.document(task_id_to_process).update({
                                         'completed': True,
                                         'completedAt': datetime.now().isoformat(),
-                                        'updated_at': datetime.now()
+                                        'updated_at': task_timestamp()
                                     })
+                                    bump_resource_versions(uid, 'tasks')
+                                    remove_task_reminders(uid, [task_id_to_process])
                                     task_actions_performed.append({
                                         "action": "completed",
                                         "task": task_data.get('title', 'Unknown task'),
@@ -4848,8 +7900,10 @@ User Question: {user_message}"""
                                     tasks_ref.document(task_id_to_process).update({
                                         'completed': False,
                                         'completedAt': None,
-                                        'updated_at': datetime.now()
+                                        'updated_at': task_timestamp()
                                     })
+                                    bump_resource_versions(uid, 'tasks')
+                                    sync_task_reminders(uid, task_id_to_process, {**task_data, 'completed': False})
                                     task_actions_performed.append({
                                         "action": "uncompleted",
                                         "task": task_data.get('title', 'Unknown task'),
@@ -4898,6 +7952,7 @@ def cleanup_old_tasks(user_id, weeks_to_keep=2):
     try:
         cutoff_date = datetime.now() - timedelta(weeks=weeks_to_keep)
         deleted_count = 0
+        deleted_ids = []
         
         # Get user's tasks collection
         tasks_ref = db.collection('users').document(user_id).collection('tasks')
@@ -4925,12 +7980,16 @@ def cleanup_old_tasks(user_id, weeks_to_keep=2):
                 
                 if task_date < cutoff_date:
                     task_doc.reference.delete()
+                    deleted_ids.append(task_doc.id)
                     deleted_count += 1
                     
             except (ValueError, TypeError) as e:
                 print(f"Could not parse date for task {task_doc.id}: {task_date_str}, error: {e}")
                 continue
         
+        record_task_tombstones(user_id, deleted_ids)
+        if deleted_ids:
+            bump_resource_versions(user_id, 'tasks')
         return deleted_count
         
     except Exception as e:
@@ -4958,7 +8017,7 @@ def api_cleanup_tasks():
         return jsonify({'error': 'Not authenticated'}), 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         user_id = decoded_claims['uid']
         data = request.get_json() or {}
         weeks_to_keep = data.get('weeks', 2)
@@ -4999,7 +8058,7 @@ def user_preferences():
         return jsonify({'error': 'Not authenticated'}), 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if request.method == "GET":
@@ -5153,7 +8212,7 @@ def autofill_preferences():
         return jsonify({'error': 'Not authenticated'}), 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         if not db:
@@ -5288,7 +8347,7 @@ def analyze_behavior():
         return jsonify({'error': 'Not authenticated'}), 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         # Get all user tasks from the last 8 weeks
@@ -5431,7 +8490,7 @@ def geocode_location(location_string):
         api_key = os.getenv('OPENWEATHER_API_KEY')
         if api_key:
             url = f"http://api.openweathermap.org/geo/1.0/direct?q={quote_plus(location_string)}&limit=1&appid={api_key}"
-            response = requests.get(url, timeout=5)
+            response = http_session.get(url, timeout=5)
             
             if response.status_code == 200:
                 data = response.json()
@@ -5447,7 +8506,7 @@ def geocode_location(location_string):
         headers = {
             'User-Agent': 'DailyPlannerApp/1.0 (Event Recommendations)'
         }
-        response = requests.get(url, headers=headers, timeout=5)
+        response = http_session.get(url, headers=headers, timeout=5)
         
         if response.status_code == 200:
             data = response.json()
@@ -5555,7 +8614,7 @@ def scrape_specific_events(location, radius_miles=10, max_events=10):
             }
             
             try:
-                response = requests.get(search_url, headers=headers, timeout=8)
+                response = http_session.get(search_url, headers=headers, timeout=8)
                 
                 if response.status_code == 200:
                     soup = BeautifulSoup(response.content, 'html.parser')
@@ -5674,7 +8733,7 @@ def scrape_google_events(location, radius_miles=10, max_events=5):
             'Accept-Language': 'en-US,en;q=0.5'
         }
         
-        response = requests.get(search_url, headers=headers, timeout=8)
+        response = http_session.get(search_url, headers=headers, timeout=8)
         
         if response.status_code == 200:
             soup = BeautifulSoup(response.content, 'html.parser')
@@ -5786,7 +8845,7 @@ def scrape_local_venue_events(location, radius_miles=10, max_events=5):
             }
             
             try:
-                response = requests.get(search_url, headers=headers, timeout=8)
+                response = http_session.get(search_url, headers=headers, timeout=8)
                 
                 if response.status_code == 200:
                     soup = BeautifulSoup(response.content, 'html.parser')
@@ -6062,7 +9121,7 @@ def get_overpass_places_nearby(location, radius_miles=10, max_results=20, user_p
         out center {max_results};
         """
         
-        response = requests.get(overpass_url, params={'data': query}, timeout=15)
+        response = http_session.get(overpass_url, params={'data': query}, timeout=15)
         
         if response.status_code == 200:
             data = response.json()
@@ -6346,7 +9405,7 @@ def get_google_places_nearby(location, radius_miles=10, max_results=20, user_pre
             }
             
             try:
-                response = requests.post(base_url, headers=headers, json=payload, timeout=10)
+                response = http_session.post(base_url, headers=headers, json=payload, timeout=10)
                 
                 if response.status_code == 200:
                     data = response.json()
@@ -6518,7 +9577,7 @@ def get_ticketmaster_events(location, radius_miles=10, max_results=10):
             'sort': 'date,asc'
         }
         
-        response = requests.get(base_url, params=params, timeout=10)
+        response = http_session.get(base_url, params=params, timeout=10)
         
         if response.status_code == 200:
             data = response.json()
@@ -6764,7 +9823,7 @@ def get_recommendations():
         return jsonify({'error': 'Not authenticated'}), 401
     
     try:
-        decoded_claims = auth.verify_session_cookie(session_cookie, check_revoked=True)
+        decoded_claims = verify_session(session_cookie)
         uid = decoded_claims['uid']
         
         # Get user preferences
@@ -7032,6 +10091,11 @@ def logout():
     Returns:
         Response: Logout page with Firebase sign-out script, or direct redirect
     """
+    # Forget the cached verification so the cookie can't be reused on this worker
+    session_cookie = request.cookies.get(SESSION_COOKIE_NAME)
+    if session_cookie:
+        invalidate_session(session_cookie)
+    
     # Create response that clears the session cookie
     resp = make_response(render_template("logout.html"))
     resp.delete_cookie(SESSION_COOKIE_NAME, path="/")
@@ -7042,6 +10106,15 @@ def logout():
 # These endpoints are designed to be triggered by Vercel Cron Jobs or external cron services
 # Background threads don't work on Vercel's serverless architecture
 
+def get_cron_shard_params():
+    """
+    Read ?shard=N&shards=M from a cron request.
+    
+    shards alone runs every shard concurrently in this process (one report each);
+    shard and shards together run a single shard; neither runs unsharded.
+    """
+    return parse_shard(request.args.get('shard'), request.args.get('shards'))
+
 @app.route("/api/cron/check-notifications", methods=['GET', 'POST'])
 def cron_check_notifications():
     """
@@ -7051,6 +10124,9 @@ def cron_check_notifications():
     - Vercel Cron Jobs (configured in vercel.json), OR
     - External cron service like cron-job.org
     
+    Query params (optional): shard=N&shards=M to handle only users in shard N of M,
+    or shards=M to run all M shards concurrently. The response has a report per shard.
+    
     Security: In production, verify the request comes from authorized source
     
     Returns:
@@ -7070,13 +10146,23 @@ def cron_check_notifications():
                 'error': 'Database not available'
             }), 500
         
+        try:
+            shard_index, shard_count = get_cron_shard_params()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
         # Run the notification check
-        notifications_sent = check_and_send_notifications()
+        notifications_sent, shard_reports = run_notification_job_shards(check_and_send_notifications, 'task_reminders', shard_index, shard_count)
         
         return jsonify({
             'success': True,
             'message': 'Notification check completed',
             'notifications_sent': notifications_sent,
+            'delivery': shard_reports[0]['delivery'] if len(shard_reports) == 1 else None,
+            'shards': shard_reports,
             'timestamp': datetime.now().isoformat()
         }), 200
         
@@ -7118,13 +10204,23 @@ def cron_daily_summary():
                 'error': 'Database not available'
             }), 500
         
+        try:
+            shard_index, shard_count = get_cron_shard_params()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
         # Run the daily summary
-        summaries_sent = send_daily_summary()
+        summaries_sent, shard_reports = run_notification_job_shards(send_daily_summary, 'daily_summary', shard_index, shard_count)
         
         return jsonify({
             'success': True,
             'message': 'Daily summary check completed',
             'summaries_sent': summaries_sent,
+            'delivery': shard_reports[0]['delivery'] if len(shard_reports) == 1 else None,
+            'shards': shard_reports,
             'timestamp': datetime.now().isoformat()
         }), 200
         
@@ -7166,13 +10262,23 @@ def cron_sporadic_inspiration():
                 'error': 'Database not available'
             }), 500
         
+        try:
+            shard_index, shard_count = get_cron_shard_params()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
         # Run the sporadic inspiration
-        inspirations_sent = send_sporadic_inspiration()
+        inspirations_sent, shard_reports = run_notification_job_shards(send_sporadic_inspiration, 'sporadic_inspiration', shard_index, shard_count)
         
         return jsonify({
             'success': True,
             'message': 'Sporadic inspiration check completed',
             'inspirations_sent': inspirations_sent,
+            'delivery': shard_reports[0]['delivery'] if len(shard_reports) == 1 else None,
+            'shards': shard_reports,
             'timestamp': datetime.now().isoformat()
         }), 200
         
@@ -7186,6 +10292,102 @@ def cron_sporadic_inspiration():
         }), 500
 
 
+@app.route("/api/cron/sweep-expired", methods=['GET', 'POST'])
+def cron_sweep_expired():
+    """
+    Cron endpoint to delete expired notification tracking and reminder index entries.
+    
+    This endpoint should be triggered hourly. It is low priority and kept separate
+    from the notification crons so they never do cleanup I/O.
+    
+    Returns:
+        JSON response with the number of entries removed per store
+    """
+    # Optional: Add authorization check for production
+    # auth_header = request.headers.get('Authorization')
+    # if auth_header != f"Bearer {os.getenv('CRON_SECRET')}":
+    #     return jsonify({'error': 'Unauthorized'}), 401
+    
+    try:
+        print("🧹 Cron job triggered: sweeping expired notification tracking")
+        
+        if not db:
+            return jsonify({
+                'success': False,
+                'error': 'Database not available'
+            }), 500
+        
+        swept = sweep_expired_notification_tracking()
+        
+        return jsonify({
+            'success': True,
+            'message': 'Expired tracking sweep completed',
+            'swept': swept,
+            'timestamp': datetime.now().isoformat()
+        }), 200
+        
+    except Exception as e:
+        print(f"❌ Cron error in sweep-expired: {e}")
+        import traceback
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
+@app.route("/api/cron/rebuild-indexes", methods=['GET', 'POST'])
+def cron_rebuild_indexes():
+    """
+    Cron endpoint to rebuild the precomputed notification indexes from scratch.
+
+    Run once after deploying a new index (backfill) or manually if an index
+    gets out of sync. Not part of the regular schedule.
+
+    Returns:
+        JSON response with the number of entries written per index
+    """
+    # Scans every user's tasks, so unlike the regular cron routes this always requires
+    # the secret (Authorization: Bearer $CRON_SECRET) and is disabled without one
+    cron_secret = os.getenv('CRON_SECRET')
+    auth_header = request.headers.get('Authorization', '')
+    if not cron_secret or not hmac.compare_digest(auth_header.encode('utf-8'), f"Bearer {cron_secret}".encode('utf-8')):
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    try:
+        print("🗂️ Cron job triggered: rebuilding notification indexes")
+
+        if not db:
+            return jsonify({
+                'success': False,
+                'error': 'Database not available'
+            }), 500
+
+        tasks_backfilled = backfill_task_fields()
+        users_backfilled = backfill_user_shard_slots()
+        reminder_entries = rebuild_reminder_index()
+        summary_schedule_entries = rebuild_summary_schedule()
+
+        return jsonify({
+            'success': True,
+            'message': 'Index rebuild completed',
+            'tasks_backfilled': tasks_backfilled,
+            'users_backfilled': users_backfilled,
+            'reminder_entries': reminder_entries,
+            'summary_schedule_entries': summary_schedule_entries,
+            'timestamp': datetime.now().isoformat()
+        }), 200
+
+    except Exception as e:
+        print(f"❌ Cron error in rebuild-indexes: {e}")
+        import traceback
+        print(traceback.format_exc())
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+
 if __name__ == "__main__":
     print("Starting Daily Planner server...")
     print(f"Environment: {ENV}")
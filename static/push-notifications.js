@@ -172,11 +172,13 @@ const PushNotifications = {
     }
     
     try {
+      const endpoint = this.subscription.endpoint;
+      
       // Unsubscribe from push manager
       await this.subscription.unsubscribe();
       
-      // Remove subscription from server
-      await this.removeSubscriptionFromServer();
+      // Remove this device's subscription from server
+      await this.removeSubscriptionFromServer(endpoint);
       
       this.subscription = null;
       this.isSubscribed = false;
@@ -220,10 +222,16 @@ const PushNotifications = {
   /**
    * Remove subscription from server
    */
-  async removeSubscriptionFromServer() {
+  async removeSubscriptionFromServer(endpoint) {
     try {
       const response = await fetch('/api/push-subscription', {
-        method: 'DELETE'
+        method: 'DELETE',
+        headers: {
+          'Content-Type': 'application/json'
+        },
+        body: JSON.stringify({
+          endpoint: endpoint
+        })
       });
       
       if (!response.ok) {
@@ -7,6 +7,7 @@ const state = {
     return days[today.getDay()];
   })(),
   weekOffset: 0,
+  taskSyncToken: null, // Delta sync token from GET /api/tasks
   draggedTask: null,
   editingTask: null,
   userSettings: {
@@ -226,25 +227,11 @@ const utils = {
     try {
       console.log('🔄 Refreshing tasks from Firebase...');
       
-      // Use makeApiCall for proper authentication and error handling
-      const response = await this.makeApiCall('/api/tasks', 'GET');
-      
-      // Extract tasks from the response format: {"status": "success", "tasks": [...]}
-      const firebaseTasks = response.tasks || [];
-      console.log('📦 Loaded tasks from Firebase for refresh:', firebaseTasks.length);
-      
-      // Clear existing tasks and organize by week offset
-      state.tasks = {};
-      
-      firebaseTasks.forEach(task => {
-        const weekKey = task.weekOffset || 0;
-        if (!state.tasks[weekKey]) {
-          state.tasks[weekKey] = [];
-        }
-        state.tasks[weekKey].push(task);
-      });
-      
-      this.saveToLocalStorage();
+      // Only fetches what changed since the last sync when a sync token is available
+      const loaded = await this.loadTasksFromFirebase();
+      if (!loaded) {
+        return false;
+      }
       console.log('✅ Tasks refreshed and saved to local storage');
       
       // Update UI
@@ -259,10 +246,80 @@ const utils = {
     }
   },
 
+  // Week key ("YYYY-MM-DD-Day" of the week's Sunday) a task from Firebase belongs under
+  getTaskWeekKey(task) {
+    // Use weekOffset if available, otherwise calculate from current week
+    if (task.weekOffset !== undefined) {
+      // For tasks with weekOffset, calculate week key based on current week + offset
+      const today = new Date();
+      const dayIndex = today.getDay();
+      const sundayOffset = -dayIndex;
+      const weekStart = new Date(today);
+      weekStart.setDate(today.getDate() + sundayOffset + (task.weekOffset * 7));
+      
+      const year = weekStart.getFullYear();
+      const month = (weekStart.getMonth() + 1).toString().padStart(2, '0');
+      const date = weekStart.getDate().toString().padStart(2, '0');
+      return `${year}-${month}-${date}-${task.day}`;
+    } else if (task.preserveWeekPosition && task.absoluteDate) {
+      // For class tasks with absolute dates, calculate week key from the actual date
+      const taskDate = new Date(task.absoluteDate);
+      const dayOfWeek = taskDate.getDay(); // 0=Sunday, 1=Monday, etc.
+      const weekStart = new Date(taskDate);
+      weekStart.setDate(taskDate.getDate() - dayOfWeek); // Go back to Sunday
+      
+      const year = weekStart.getFullYear();
+      const month = (weekStart.getMonth() + 1).toString().padStart(2, '0');
+      const date = weekStart.getDate().toString().padStart(2, '0');
+      return `${year}-${month}-${date}-${task.day}`;
+    }
+    // For tasks without weekOffset or absolute positioning, use current week calculation
+    return this.getWeekKey(task.day);
+  },
+
+  // Add a task from Firebase to state under its week key
+  addFirebaseTaskToState(task) {
+    try {
+      const weekKey = this.getTaskWeekKey(task);
+      
+      if (!state.tasks[weekKey]) {
+        state.tasks[weekKey] = [];
+      }
+      
+      // Ensure task has required properties
+      const processedTask = {
+        ...task,
+        id: task.id || this.generateId(),
+        completed: task.completed || false,
+        priority: task.priority || 'medium',
+        color: task.color || '#4ECDC4'
+      };
+      
+      state.tasks[weekKey].push(processedTask);
+    } catch (error) {
+      console.error('⚠️ Error processing task from Firebase:', task, error);
+    }
+  },
+
+  // Remove tasks from every week in state by id
+  removeTasksFromState(taskIds) {
+    const ids = new Set(taskIds);
+    Object.keys(state.tasks).forEach(weekKey => {
+      state.tasks[weekKey] = state.tasks[weekKey].filter(task => !ids.has(task.id));
+      if (state.tasks[weekKey].length === 0) {
+        delete state.tasks[weekKey];
+      }
+    });
+  },
+
   async loadTasksFromFirebase() {
     try {
+      // After the first load only ask for tasks changed since the last sync
+      const url = state.taskSyncToken
+        ? `/api/tasks?since=${encodeURIComponent(state.taskSyncToken)}`
+        : '/api/tasks';
       console.log('📥 Loading tasks from Firebase (primary storage)...');
-      const response = await fetch('/api/tasks', {
+      const response = await fetch(url, {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json'
@@ -275,63 +332,21 @@ const utils = {
       }
       
       const data = await response.json();
-      console.log(`✅ Loaded ${data.tasks ? data.tasks.length : 0} tasks from Firebase`);
       
       if (data.tasks && Array.isArray(data.tasks)) {
-        // Clear existing tasks and rebuild from Firebase data
-        state.tasks = {};
+        if (data.full === false) {
+          // Delta: drop deleted and changed tasks, then add the changed versions
+          console.log(`✅ Synced ${data.tasks.length} changed and ${(data.deleted || []).length} deleted tasks from Firebase`);
+          this.removeTasksFromState([...(data.deleted || []), ...data.tasks.map(task => task.id)]);
+        } else {
+          console.log(`✅ Loaded ${data.tasks.length} tasks from Firebase`);
+          // Clear existing tasks and rebuild from Firebase data
+          state.tasks = {};
+        }
         
         // Organize tasks by week key
-        data.tasks.forEach(task => {
-          try {
-            // Use weekOffset if available, otherwise calculate from current week
-            let weekKey;
-            if (task.weekOffset !== undefined) {
-              // For tasks with weekOffset, calculate week key based on current week + offset
-              const today = new Date();
-              const dayIndex = today.getDay();
-              const sundayOffset = -dayIndex;
-              const weekStart = new Date(today);
-              weekStart.setDate(today.getDate() + sundayOffset + (task.weekOffset * 7));
-              
-              const year = weekStart.getFullYear();
-              const month = (weekStart.getMonth() + 1).toString().padStart(2, '0');
-              const date = weekStart.getDate().toString().padStart(2, '0');
-              weekKey = `${year}-${month}-${date}-${task.day}`;
-            } else if (task.preserveWeekPosition && task.absoluteDate) {
-              // For class tasks with absolute dates, calculate week key from the actual date
-              const taskDate = new Date(task.absoluteDate);
-              const dayOfWeek = taskDate.getDay(); // 0=Sunday, 1=Monday, etc.
-              const weekStart = new Date(taskDate);
-              weekStart.setDate(taskDate.getDate() - dayOfWeek); // Go back to Sunday
-              
-              const year = weekStart.getFullYear();
-              const month = (weekStart.getMonth() + 1).toString().padStart(2, '0');
-              const date = weekStart.getDate().toString().padStart(2, '0');
-              weekKey = `${year}-${month}-${date}-${task.day}`;
-            } else {
-              // For tasks without weekOffset or absolute positioning, use current week calculation
-              weekKey = this.getWeekKey(task.day);
-            }
-            
-            if (!state.tasks[weekKey]) {
-              state.tasks[weekKey] = [];
-            }
-            
-            // Ensure task has required properties
-            const processedTask = {
-              ...task,
-              id: task.id || this.generateId(),
-              completed: task.completed || false,
-              priority: task.priority || 'medium',
-              color: task.color || '#4ECDC4'
-            };
-            
-            state.tasks[weekKey].push(processedTask);
-          } catch (error) {
-            console.error('⚠️ Error processing task from Firebase:', task, error);
-          }
-        });
+        data.tasks.forEach(task => this.addFirebaseTaskToState(task));
+        state.taskSyncToken = data.sync_token || null;
         
         // Backup to local storage after successful Firebase load
         this.saveToLocalStorage();
@@ -1585,6 +1600,37 @@ const tasks = {
     return task;
   },
 
+  // Save several tasks (e.g. from the assistant) with one conflict check and one write
+  async createBatch(taskList) {
+    console.log(`📤 Sending batch of ${taskList.length} tasks to Firebase`);
+    const result = await utils.makeApiCall('/api/tasks/batch', 'POST', { tasks: taskList });
+    
+    const created = [];
+    (result.saved || []).forEach(({ index, id }) => {
+      const task = { ...taskList[index], id: id || taskList[index].id };
+      const weekKey = pattern.getWeekKeyWithOffset(task.day, task.weekOffset || 0);
+      if (!state.tasks[weekKey]) {
+        state.tasks[weekKey] = [];
+      }
+      state.tasks[weekKey].push(task);
+      created.push(task);
+    });
+    if (created.length > 0) {
+      utils.saveToLocalStorage();
+      console.log(`✅ ${created.length} batch tasks backed up to local storage`);
+    }
+    
+    const skipped = result.conflicts || [];
+    skipped.forEach(conflict => {
+      const conflictInfo = conflict.conflicts && conflict.conflicts.length > 0
+        ? ` (conflicts with "${conflict.conflicts[0].title}")`
+        : '';
+      ui.showNotification(`⚠️ Skipped "${conflict.title}" - time slot ${conflict.time} is already occupied${conflictInfo}`, 'warning');
+    });
+    
+    return { created, skipped };
+  },
+
   async update(taskId, updates) {
     try {
       // Update in Firebase FIRST (primary storage)
@@ -4449,70 +4495,46 @@ const assistant = {
     element.classList.remove('typing');
   },
   
+  // Convert a task from the assistant's task block into the planner's task format
+  formatAssistantTask(task) {
+    let dayName = task.day || state.currentDay;
+    if (dayName === 'Today') {
+      dayName = state.currentDay;
+    }
+    
+    return {
+      id: task.id || utils.generateId(),
+      title: task.title,
+      description: task.description || '',
+      day: dayName,
+      weekOffset: task.weekOffset || 0,
+      time: task.startTime && task.endTime ? `${task.startTime}-${task.endTime}` : task.startTime || '09:00',
+      startTime: task.startTime,
+      endTime: task.endTime,
+      priority: task.priority || 'medium',
+      color: task.color || '#4ECDC4',
+      completed: false,
+      createdBy: 'assistant'
+    };
+  },
+  
   async processTasks(taskList) {
     console.log(`🎯 Processing ${taskList.length} tasks from assistant...`);
     console.log(`📅 Current context: currentDay=${state.currentDay}, currentWeekOffset=${state.currentWeekOffset}`);
     
     try {
-      const taskPromises = taskList.map(async (task, index) => {
-        console.log(`🔄 Processing task ${index + 1}:`, task);
-        
-        try {
-          let dayName = task.day || state.currentDay;
-          if (dayName === 'Today') {
-            dayName = state.currentDay;
-          }
-          
-          console.log(`   Original day: ${task.day}, Resolved day: ${dayName}`);
-          
-          const taskWeekOffset = task.weekOffset || 0;
-          
-          const formattedTask = {
-            id: task.id || utils.generateId(),
-            title: task.title,
-            description: task.description || '',
-            day: dayName,
-            weekOffset: taskWeekOffset,
-            time: task.startTime && task.endTime ? `${task.startTime}-${task.endTime}` : task.startTime || '09:00',
-            startTime: task.startTime,
-            endTime: task.endTime,
-            priority: task.priority || 'medium',
-            color: task.color || '#4ECDC4',
-            completed: false,
-            createdBy: 'assistant'
-          };
-          
-          console.log(`➕ Adding task: ${formattedTask.title} on ${formattedTask.day} (week offset: ${taskWeekOffset}) (${formattedTask.time})`);
-          console.log(`   Full task data:`, JSON.stringify(formattedTask, null, 2));
-          
-          const result = await window.tasks.createWithWeekOffset(formattedTask);
-          
-          console.log(`   Result from createWithWeekOffset:`, result);
-          
-          if (result === null) {
-            console.log(`⚠️ Task "${formattedTask.title}" was skipped (likely due to conflict)`);
-            return { success: false, skipped: true, title: formattedTask.title };
-          }
-          
-          console.log(`✅ Task "${formattedTask.title}" created successfully!`);
-          return { success: true, title: formattedTask.title };
-        } catch (taskError) {
-          console.error(`❌ Error creating task ${index + 1}:`, taskError);
-          console.error(`   Error stack:`, taskError.stack);
-          return { success: false, error: taskError.message, title: task.title };
-        }
+      const formattedTasks = taskList.map(task => this.formatAssistantTask(task));
+      formattedTasks.forEach(task => {
+        console.log(`➕ Adding task: ${task.title} on ${task.day} (week offset: ${task.weekOffset}) (${task.time})`);
       });
       
-      const results = await Promise.all(taskPromises);
-      
-      console.log(`📊 Task processing results:`, results);
+      // One request checks conflicts for the whole set and saves the rest in a single write
+      const { created, skipped: skippedTasks } = await window.tasks.createBatch(formattedTasks);
       
-      // Count successes and failures
-      const successful = results.filter(r => r && r.success).length;
-      const skipped = results.filter(r => r && r.skipped).length;
-      const failed = results.filter(r => r && r.error).length;
+      const successful = created.length;
+      const skipped = skippedTasks.length;
       
-      console.log(`✅ Task processing complete: ${successful} created, ${skipped} skipped, ${failed} failed`);
+      console.log(`✅ Task processing complete: ${successful} created, ${skipped} skipped`);
       
       if (successful > 0) {
         const taskWord = successful === 1 ? 'task' : 'tasks';
@@ -4523,10 +4545,6 @@ const assistant = {
         console.log(`⚠️ ${skipped} task(s) skipped due to conflicts`);
       }
       
-      if (failed > 0) {
-        console.error(`❌ ${failed} task(s) failed to create`);
-      }
-      
       try {
         window.tasks.render();
         window.calendar.renderTasks();
@@ -4633,48 +4651,16 @@ const assistant = {
         console.log(`🎯 Processing ${data.tasks.length} tasks from assistant...`);
         
         try {
-          // Add each task to localStorage and Firebase - use Promise.all to wait for all saves
-          const taskPromises = data.tasks.map(async (task, index) => {
-            console.log(`🔄 Processing task ${index + 1}:`, task);
-            
-            // Use the day directly from the assistant (it should already be in the correct format)
-            let dayName = task.day || state.currentDay;
-            
-            // Handle "Today" case
-            if (dayName === 'Today') {
-              dayName = state.currentDay;
-            }
-            
-            // Handle weekOffset for future week tasks
-            const taskWeekOffset = task.weekOffset || 0;
-            
-            // Create task in the expected format with Firebase ID
-            const formattedTask = {
-              id: task.id || utils.generateId(), // Use Firebase ID if available, or generate new one
-              title: task.title,
-              description: task.description || '',
-              day: dayName,
-              weekOffset: taskWeekOffset,
-              time: task.startTime && task.endTime ? `${task.startTime}-${task.endTime}` : task.startTime || '09:00',
-              startTime: task.startTime,
-              endTime: task.endTime,
-              priority: task.priority || 'medium',
-              color: task.color || '#4ECDC4',
-              completed: false,
-              createdBy: 'assistant'
-            };
-            
-            console.log(`➕ Adding task: ${formattedTask.title} on ${formattedTask.day} (week offset: ${taskWeekOffset}) (${formattedTask.time})`);
-            return await window.tasks.createWithWeekOffset(formattedTask);
-          });
-          
-          // Wait for all tasks to be saved to Firebase
-          await Promise.all(taskPromises);
+          // Save all tasks with one conflict check and one Firebase write
+          const formattedTasks = data.tasks.map(task => this.formatAssistantTask(task));
+          const { created } = await window.tasks.createBatch(formattedTasks);
           console.log('✅ All assistant tasks saved to Firebase successfully');
           
           // Show success notification
-          const taskWord = data.tasks.length === 1 ? 'task' : 'tasks';
-          ui.showNotification(`✅ Created ${data.tasks.length} ${taskWord} for you!`, 'success');
+          if (created.length > 0) {
+            const taskWord = created.length === 1 ? 'task' : 'tasks';
+            ui.showNotification(`✅ Created ${created.length} ${taskWord} for you!`, 'success');
+          }
           
           // Refresh the UI immediately with error handling
           try {
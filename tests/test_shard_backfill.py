@@ -0,0 +1,93 @@
+"""
+User shard slot backfill over user documents written before shard_slot existed.
+
+The users collection is an in-memory stand-in, but it yields real Firestore
+DocumentSnapshots, so a missing field behaves as in production (snapshot.get
+raises KeyError).
+
+Run with: python -m unittest discover tests
+"""
+import contextlib
+import io
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import planner
+
+from google.cloud.firestore_v1.base_document import DocumentSnapshot
+
+
+class StandInUserRef:
+    def __init__(self, uid):
+        self.id = uid
+
+
+class StandInBatch:
+    def __init__(self, db):
+        self.db = db
+        self.pending = []
+
+    def update(self, doc_ref, data):
+        self.pending.append((doc_ref.id, data))
+
+    def commit(self):
+        for uid, data in self.pending:
+            self.db.users[uid].update(data)
+        self.db.updates.extend(self.pending)
+
+
+class StandInUsers:
+    def __init__(self, db):
+        self.db = db
+
+    def stream(self):
+        for uid, data in self.db.users.items():
+            yield DocumentSnapshot(StandInUserRef(uid), dict(data), True, None, None, None)
+
+
+class StandInDB:
+    def __init__(self, users):
+        self.users = users
+        self.updates = []
+
+    def collection(self, name):
+        assert name == 'users'
+        return StandInUsers(self)
+
+    def batch(self):
+        return StandInBatch(self)
+
+
+class ShardSlotBackfillTests(unittest.TestCase):
+
+    def setUp(self):
+        self.saved_db = planner.db
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))
+
+    def tearDown(self):
+        planner.db = self.saved_db
+
+    def test_backfills_users_without_shard_slot(self):
+        planner.db = StandInDB({
+            'legacy-user': {'email': 'legacy@example.com'},
+            'current-user': {'email': 'current@example.com', 'shard_slot': planner.user_shard_slot('current-user')},
+        })
+
+        self.assertEqual(planner.backfill_user_shard_slots(), 1)
+        self.assertEqual(planner.db.updates, [('legacy-user', {'shard_slot': planner.user_shard_slot('legacy-user')})])
+        self.assertEqual(planner.db.users['legacy-user']['shard_slot'], planner.user_shard_slot('legacy-user'))
+
+    def test_second_run_is_a_no_op(self):
+        planner.db = StandInDB({'legacy-user': {'email': 'legacy@example.com'}})
+
+        planner.backfill_user_shard_slots()
+        self.assertEqual(planner.backfill_user_shard_slots(), 0)
+        self.assertEqual(len(planner.db.updates), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
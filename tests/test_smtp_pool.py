@@ -0,0 +1,240 @@
+"""
+Pooled SMTP delivery against an in-process stand-in server.
+
+The stand-in speaks just enough ESMTP for smtplib (EHLO, STARTTLS, AUTH, MAIL,
+RCPT, DATA, RSET, QUIT) and counts connections, logins, delivered messages and refused recipients,
+so the tests can check that send_email_batch reuses pooled sessions, recovers
+from dropped sessions, keeps going past rejected recipients and fails fast on
+rejected logins.
+
+Run with: python -m unittest discover tests
+"""
+import contextlib
+import datetime
+import io
+import os
+import socketserver
+import ssl
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+with contextlib.redirect_stdout(io.StringIO()):
+    import planner
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+except ImportError:  # pragma: no cover - only needed to mint the stand-in's TLS certificate
+    x509 = None
+
+
+def build_tls_context(directory):
+    """Server-side TLS context with a throwaway self-signed certificate (smtplib doesn't verify it)"""
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'localhost')])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (x509.CertificateBuilder()
+                   .subject_name(name)
+                   .issuer_name(name)
+                   .public_key(key.public_key())
+                   .serial_number(x509.random_serial_number())
+                   .not_valid_before(now - datetime.timedelta(minutes=5))
+                   .not_valid_after(now + datetime.timedelta(days=1))
+                   .sign(key, hashes.SHA256()))
+
+    cert_path = os.path.join(directory, 'stand-in.pem')
+    key_path = os.path.join(directory, 'stand-in.key')
+    with open(cert_path, 'wb') as file:
+        file.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, 'wb') as file:
+        file.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8,
+                                     serialization.NoEncryption()))
+
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+class StandInSMTPHandler(socketserver.StreamRequestHandler):
+    """One SMTP session on the stand-in server"""
+
+    def handle(self):
+        stand_in = self.server
+        stand_in.count('connections')
+        sock = self.request
+        reader = sock.makefile('rb')
+        session_messages = 0
+
+        def reply(line):
+            sock.sendall(line.encode('ascii') + b'\r\n')
+
+        try:
+            reply('220 stand-in ESMTP')
+            while True:
+                line = reader.readline()
+                if not line:
+                    return
+                verb = line.decode('ascii', 'replace').strip().split(' ', 1)[0].upper()
+
+                if verb in ('EHLO', 'HELO'):
+                    reply('250-stand-in')
+                    reply('250-STARTTLS')
+                    reply('250 AUTH PLAIN')  # One mechanism, so a rejected login isn't retried with another
+                elif verb == 'STARTTLS':
+                    reply('220 Ready to start TLS')
+                    sock = stand_in.tls_context.wrap_socket(sock, server_side=True)
+                    reader = sock.makefile('rb')
+                elif verb == 'AUTH':
+                    stand_in.count('logins')
+                    reply('535 Authentication failed' if stand_in.reject_logins else '235 Authentication successful')
+                elif verb == 'DATA':
+                    reply('354 End data with <CR><LF>.<CR><LF>')
+                    while reader.readline() not in (b'.\r\n', b''):
+                        pass
+                    stand_in.count('messages')
+                    reply('250 Queued')
+                    session_messages += 1
+                    if stand_in.drop_after and session_messages >= stand_in.drop_after:
+                        return  # Drop the session without QUIT, like an idle-timeout on the provider side
+                elif verb == 'QUIT':
+                    reply('221 Bye')
+                    return
+                elif verb == 'RCPT' and any(recipient in line.decode('ascii', 'replace')
+                                            for recipient in stand_in.reject_recipients):
+                    stand_in.count('rejected')
+                    reply('550 No such user')
+                elif verb in ('MAIL', 'RCPT', 'RSET', 'NOOP'):
+                    reply('250 OK')
+                else:
+                    reply('502 Command not implemented')
+        finally:
+            sock.close()
+
+
+class StandInSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, tls_context):
+        super().__init__(('127.0.0.1', 0), StandInSMTPHandler)
+        self.tls_context = tls_context
+        self.reject_logins = False
+        self.drop_after = 0
+        self.reject_recipients = set()
+        self.counts_lock = threading.Lock()
+        self.counts = {'connections': 0, 'logins': 0, 'messages': 0, 'rejected': 0}
+
+    def count(self, name):
+        with self.counts_lock:
+            self.counts[name] += 1
+
+
+def reset_smtp_pool():
+    """Close any pooled sessions so each test starts from an empty pool"""
+    with planner.smtp_pool_lock:
+        idle = [server for server, _ in planner.smtp_idle_connections]
+        planner.smtp_idle_connections.clear()
+    for server in idle:
+        planner.close_smtp_connection(server)
+
+
+@unittest.skipIf(x509 is None, 'cryptography is needed to mint the stand-in TLS certificate')
+class SMTPPoolTests(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cert_dir = tempfile.TemporaryDirectory()
+        cls.tls_context = build_tls_context(cls.cert_dir.name)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.cert_dir.cleanup()
+
+    def setUp(self):
+        self.stand_in = StandInSMTPServer(self.tls_context)
+        threading.Thread(target=self.stand_in.serve_forever, daemon=True).start()
+
+        self.saved_settings = {name: getattr(planner, name) for name in
+                               ('SMTP_SERVER', 'SMTP_PORT', 'SMTP_USERNAME', 'SMTP_PASSWORD')}
+        planner.SMTP_SERVER, planner.SMTP_PORT = self.stand_in.server_address
+        planner.SMTP_USERNAME = 'planner@example.com'
+        planner.SMTP_PASSWORD = 'app-password'
+        reset_smtp_pool()
+        self.enterContext(contextlib.redirect_stdout(io.StringIO()))  # Per-message delivery logs
+
+    def tearDown(self):
+        reset_smtp_pool()
+        for name, value in self.saved_settings.items():
+            setattr(planner, name, value)
+        self.stand_in.shutdown()
+        self.stand_in.server_close()
+
+    def send_batch(self, count, prefix='user'):
+        messages = [(f'{prefix}{i}@example.com', 'Reminder', f'Task {i}') for i in range(count)]
+        return planner.send_email_batch(messages, timeout=5)
+
+    def test_batch_reuses_one_session(self):
+        started = time.perf_counter()
+        results = self.send_batch(200)
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(results, [True] * 200)
+        self.assertEqual(self.stand_in.counts, {'connections': 1, 'logins': 1, 'messages': 200, 'rejected': 0})
+        print(f"\nPooled SMTP throughput: {200 / elapsed:.0f} messages/second", file=sys.stderr)
+
+        # The next batch picks the idle session back up instead of logging in again
+        self.assertEqual(self.send_batch(10), [True] * 10)
+        self.assertEqual(self.stand_in.counts['connections'], 1)
+        self.assertEqual(self.stand_in.counts['logins'], 1)
+
+    def test_concurrent_batches_stay_within_pool_size(self):
+        batches = planner.SMTP_POOL_SIZE * 3
+        results = []
+        threads = [threading.Thread(target=lambda number=number: results.append(self.send_batch(20, f'b{number}-')))
+                   for number in range(batches)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, [[True] * 20] * batches)
+        self.assertEqual(self.stand_in.counts['messages'], 20 * batches)
+        self.assertLessEqual(self.stand_in.counts['connections'], planner.SMTP_POOL_SIZE)
+        self.assertEqual(self.stand_in.counts['logins'], self.stand_in.counts['connections'])
+
+    def test_reconnects_when_server_drops_session(self):
+        self.stand_in.drop_after = 5
+
+        results = self.send_batch(12)
+
+        self.assertEqual(results, [True] * 12)
+        self.assertEqual(self.stand_in.counts, {'connections': 3, 'logins': 3, 'messages': 12, 'rejected': 0})
+
+    def test_rejected_recipient_only_fails_its_message(self):
+        self.stand_in.reject_recipients = {'<user3@example.com>'}
+
+        results = self.send_batch(10)
+
+        self.assertEqual(results, [True] * 3 + [False] + [True] * 6)
+        self.assertEqual(self.stand_in.counts, {'connections': 1, 'logins': 1, 'messages': 9, 'rejected': 1})
+
+    def test_rejected_login_fails_rest_of_batch_fast(self):
+        self.stand_in.reject_logins = True
+
+        results = self.send_batch(10)
+
+        self.assertEqual(results, [False] * 10)
+        self.assertEqual(self.stand_in.counts['connections'], 1)
+        self.assertEqual(self.stand_in.counts['logins'], 1)
+        self.assertEqual(self.stand_in.counts['messages'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()